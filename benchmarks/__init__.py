@@ -0,0 +1,7 @@
+"""
+Benchmarks for sync_google_spreadsheet, run against the in-memory
+FakeWorksheet so they need no network::
+
+    python -m benchmarks --schema schwab --rows 1000,10000 --output run.json
+    python -m benchmarks --rows 1000,10000 --compare run.json
+"""
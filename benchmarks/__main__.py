@@ -0,0 +1,70 @@
+"""
+Run the SheetAdapter cycle benchmark and write the results as JSON.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.cycle import compare
+from benchmarks.cycle import environment
+from benchmarks.cycle import run_cycle
+from benchmarks.schemas import SCHEMAS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description=__doc__.strip())
+    parser.add_argument('--schema', action='append', choices=sorted(SCHEMAS),
+                        help='schema to run; repeat for several '
+                             '(default: all)')
+    parser.add_argument('--rows', default='1000,10000,100000',
+                        help='comma separated sheet sizes, up to 1000000')
+    parser.add_argument('--append-fraction', type=float, default=0.01)
+    parser.add_argument('--update-fraction', type=float, default=0.01)
+    parser.add_argument('--probes', type=int, default=1000,
+                        help='has() lookups, half of them misses')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also record peak traced allocations per '
+                             'phase (slows the run down)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', metavar='JSON',
+                        help='exit non-zero if slower than this earlier run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown for --compare, as a fraction')
+    args = parser.parse_args(argv)
+
+    run = {'environment': environment(), 'results': []}
+    for name in args.schema or sorted(SCHEMAS):
+        for rows in [int(n) for n in args.rows.split(',')]:
+            results = run_cycle(SCHEMAS[name], rows,
+                                append_fraction=args.append_fraction,
+                                update_fraction=args.update_fraction,
+                                probes=args.probes,
+                                trace_memory=args.trace_memory)
+            for r in results:
+                print('%-8s %8d %-11s %9.4fs %6d calls %9d cells read '
+                      '%8d written %9.1f MB RSS' %
+                      (r['schema'], r['rows'], r['phase'], r['seconds'],
+                       r['api_calls'], r['cells_read'], r['cells_written'],
+                       r['peak_rss_kb'] / 1024.0))
+            run['results'].extend(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = compare(old, run, threshold=args.threshold)
+        for r in regressions:
+            print('REGRESSION %s %d %s: %.4fs -> %.4fs' %
+                  (r['schema'], r['rows'], r['phase'],
+                   r['baseline_seconds'], r['seconds']))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Compare memory and load time of the old flat list of Cell objects against
+ColumnStore.
+
+Each layout is built in its own subprocess so peak RSS is measured in
+isolation.  The synthetic sheet repeats values the way a transaction sheet
+does (dates, categories, blank cells)::
+
+    python benchmarks/bench_store.py --rows 100000 --columns 30
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import time
+
+from sync_google_spreadsheet.store import ColumnStore
+
+
+class GspreadLikeCell(object):
+    """Same shape as gspread's Cell: a plain object with a __dict__"""
+
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+def synthetic_value(row, col):
+    kind = col % 5
+    if kind == 0:
+        return '%02d/%02d/%d' % (row // 800 % 12 + 1, row // 30 % 28 + 1,
+                                 2010 + row // 9600)
+    elif kind == 1:
+        return '%d.%02d' % (row * 7 % 5000, row % 100)
+    elif kind == 2:
+        return 'Category %d' % (row % 40)
+    elif kind == 3:
+        return ''
+    return 'Description %d' % (row * 31 % 20000)
+
+
+def response(rows, columns):
+    """Cells as a range() call would return them, row-major."""
+    for row in range(rows):
+        for col in range(columns):
+            yield GspreadLikeCell(row + 1, col + 1, synthetic_value(row, col))
+
+
+def build_flat(rows, columns):
+    return list(response(rows, columns))
+
+
+def build_columns(rows, columns):
+    store = ColumnStore(rows, columns)
+    # fetch a column at a time, as fetch_columns does for projected loads
+    for col in range(columns):
+        store.load_column(col, [synthetic_value(row, col)
+                                for row in range(rows)])
+    return store
+
+
+def measure(layout, rows, columns):
+    start = time.time()
+    built = {'flat': build_flat, 'columns': build_columns}[layout](rows,
+                                                                  columns)
+    elapsed = time.time() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    assert built is not None
+    print('%s %.3f %d' % (layout, elapsed, peak_kb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=30)
+    parser.add_argument('--layout', choices=['flat', 'columns'])
+    args = parser.parse_args()
+
+    if args.layout:
+        measure(args.layout, args.rows, args.columns)
+        return
+
+    print('%d rows x %d columns' % (args.rows, args.columns))
+    print('%-8s %10s %14s' % ('layout', 'load (s)', 'peak RSS (MB)'))
+    for layout in ('flat', 'columns'):
+        out = subprocess.check_output([sys.executable, __file__,
+                                       '--layout', layout,
+                                       '--rows', str(args.rows),
+                                       '--columns', str(args.columns)])
+        name, elapsed, peak_kb = out.decode().split()
+        print('%-8s %10s %14.1f' % (name, elapsed, int(peak_kb) / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Time the load -> has/append/update_row -> sync cycle of SheetAdapter against
+a FakeWorksheet filled with a synthetic schema.
+
+Every phase records wall time, peak RSS of the process so far, optionally
+the peak of traced Python allocations during the phase, and the API calls,
+cells and bytes the phase caused on the fake worksheet.
+"""
+import os
+import platform
+import resource
+import sys
+import time
+
+from sync_google_spreadsheet import __version__
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.sheet_adapter import SheetAdapter
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class _Quiet(object):
+    """Swallow the per-row output of append() while it is being timed."""
+
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *exc):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def build_sheet(schema, rows, spare):
+    # type: (Schema, int, int) -> FakeWorksheet
+    values = [list(schema.headers)]
+    for i in range(rows):
+        record = schema.row(i)
+        values.append([record[name] for name in schema.headers])
+    return FakeWorksheet(values, rows=rows + 1 + spare)
+
+
+class Recorder(object):
+    def __init__(self, schema, rows, sheet, trace_memory):
+        self.schema = schema
+        self.rows = rows
+        self.sheet = sheet
+        self.trace_memory = trace_memory and tracemalloc is not None
+        self.results = []
+
+    def run(self, phase, func, *args):
+        before = dict(self.sheet.stats)
+        calls = len(self.sheet.calls)
+        if self.trace_memory:
+            tracemalloc.start()
+        start = timer()
+        func(*args)
+        seconds = timer() - start
+        result = {
+            'schema': self.schema.name,
+            'rows': self.rows,
+            'phase': phase,
+            'seconds': seconds,
+            'peak_rss_kb': resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss,
+            'api_calls': len(self.sheet.calls) - calls,
+        }
+        for stat in ('cells_read', 'cells_written', 'bytes_written'):
+            result[stat] = self.sheet.stats[stat] - before[stat]
+        if self.trace_memory:
+            result['peak_traced_kb'] = \
+                tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+        self.results.append(result)
+
+
+def run_cycle(schema, rows, append_fraction=0.01, update_fraction=0.01,
+              probes=1000, trace_memory=False):
+    # type: (Schema, int, float, float, int, bool) -> List[Dict[str,Any]]
+    appends = max(1, int(rows * append_fraction))
+    updates = max(1, int(rows * update_fraction))
+    sheet = build_sheet(schema, rows, appends)
+    adapter = SheetAdapter(sheet, 1, schema.row_to_key,
+                           non_empty_column=schema.non_empty_column,
+                           key_columns=schema.key_columns)
+    # inputs are built up front so generating them isn't timed
+    probe_records = [schema.row(i * 2 % (rows * 2)) for i in range(probes)]
+    new_records = [schema.row(i) for i in range(rows, rows + appends)]
+    step = max(1, rows // updates)
+    update_rows = list(range(1, rows + 1, step))[:updates]
+
+    recorder = Recorder(schema, rows, sheet, trace_memory)
+    recorder.run('load', adapter.load)
+    recorder.run('key_index', adapter._scan, None)
+
+    def has():
+        for record in probe_records:
+            adapter.has(record)
+
+    def append():
+        with _Quiet():
+            for record in new_records:
+                adapter.append(record)
+
+    column = schema.update_column
+
+    def update_row():
+        for idx in update_rows:
+            adapter.update_row(idx, {column: 'Updated'}, [column])
+
+    recorder.run('has', has)
+    recorder.run('append', append)
+    recorder.run('update_row', update_row)
+    recorder.run('sync', adapter.sync)
+    return recorder.results
+
+
+def environment():
+    # type: () -> Dict[str,str]
+    return {
+        'package_version': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(old, new, threshold=0.2, min_seconds=0.001):
+    # type: (Dict, Dict, float, float) -> List[Dict[str,Any]]
+    """
+    Results of new that are slower than the same schema/rows/phase in old by
+    more than threshold (a fraction) and by at least min_seconds.
+    """
+    baseline = dict(((r['schema'], r['rows'], r['phase']), r)
+                    for r in old['results'])
+    regressions = []
+    for result in new['results']:
+        before = baseline.get((result['schema'], result['rows'],
+                               result['phase']))
+        if before is None:
+            continue
+        if result['seconds'] > before['seconds'] * (1 + threshold) and \
+                result['seconds'] - before['seconds'] >= min_seconds:
+            regressions.append(dict(result, baseline_seconds=before['seconds']))
+    return regressions
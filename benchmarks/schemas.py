@@ -0,0 +1,142 @@
+"""
+Synthetic sheets shaped like the ones the example scripts sync.
+
+Each schema has the headers, non_empty_column and key function of the
+matching adapter in examples/ (SchwabSheet, ChaseSheet, WorkoutSheet), and
+generates deterministic rows so runs are comparable.  The workout key parses
+with datetime rather than pandas so the benchmarks have no extra
+dependencies.
+"""
+import datetime
+import re
+
+
+def mdy_dt(string):
+    return datetime.datetime.strptime(string, "%m/%d/%Y")
+
+
+def dollar_str_to_val(x):
+    match = re.match(r"\$?([\d\.,]+)", x)
+    if match:
+        val = match.group(1)
+        val = val.replace(',', '')
+    else:
+        val = ''
+    return val
+
+
+def _date(i, per_day):
+    day = datetime.date(2010, 1, 1) + datetime.timedelta(days=i // per_day)
+    return day.strftime('%m/%d/%Y')
+
+
+class Schema(object):
+    name = None
+    headers = []
+    non_empty_column = None
+    key_columns = []
+    # column update_row() rewrites in the benchmark
+    update_column = None
+
+    def row_to_key(self, row):
+        raise NotImplementedError
+
+    def row(self, i):
+        # type: (int) -> Dict[str,str]
+        """The i-th synthetic record; keys are unique per i."""
+        raise NotImplementedError
+
+
+class SchwabSchema(Schema):
+    name = 'schwab'
+    headers = ['Date', 'Type', 'Check #', 'Description', 'Withdrawal (-)',
+               'Deposit (+)', 'RunningBalance', 'Category', 'Frequency']
+    non_empty_column = 'Date'
+    key_columns = ['Date', 'Withdrawal (-)', 'Deposit (+)', 'Description']
+    update_column = 'Category'
+
+    def row_to_key(self, row):
+        withdrawal = dollar_str_to_val(row['Withdrawal (-)'])
+        deposit = dollar_str_to_val(row['Deposit (+)'])
+        return "%s-%s-%s-%s" % (mdy_dt(row['Date']), withdrawal, deposit,
+                                row['Description'])
+
+    def row(self, i):
+        deposit = i % 7 == 0
+        amount = '$%d.%02d' % (i * 37 % 900 + 1, i % 100)
+        return {
+            'Date': _date(i, 5),
+            'Type': 'DEPOSIT' if deposit else 'VISA',
+            'Check #': '',
+            'Description': 'Merchant %d #%d' % (i % 300, i),
+            'Withdrawal (-)': '' if deposit else amount,
+            'Deposit (+)': amount if deposit else '',
+            'RunningBalance': '$%d.00' % (i * 13 % 50000),
+            'Category': 'Category %d' % (i % 40),
+            'Frequency': 'monthly' if i % 3 == 0 else '',
+        }
+
+
+class ChaseSchema(Schema):
+    name = 'chase'
+    headers = ['Type', 'Trans Date', 'Post Date', 'Description', 'Amount',
+               'Category', 'Frequency']
+    non_empty_column = 'Trans Date'
+    key_columns = ['Trans Date', 'Post Date', 'Amount', 'Description']
+    update_column = 'Category'
+
+    def row_to_key(self, row):
+        return "%s-%s-%f-%s" % (mdy_dt(row['Trans Date']),
+                                mdy_dt(row['Post Date']),
+                                float(row['Amount']), row['Description'])
+
+    def row(self, i):
+        return {
+            'Type': 'Sale',
+            'Trans Date': _date(i, 4),
+            'Post Date': _date(i + 8, 4),
+            'Description': 'Store %d #%d' % (i % 500, i),
+            'Amount': '-%d.%02d' % (i * 53 % 700 + 1, i % 100),
+            'Category': 'Category %d' % (i % 40),
+            'Frequency': '',
+        }
+
+
+class WorkoutSchema(Schema):
+    name = 'workout'
+    headers = ['Workout Timestamp (PST)', 'Live/On-Demand', 'Instructor Name',
+               'Length (minutes)', 'Fitness Discipline', 'Type', 'Title',
+               'Total Output', 'Avg. Watts', 'Avg. Resistance',
+               'Avg. Cadence (RPM)', 'Avg. Speed (mph)', 'Distance (mi)',
+               'Calories Burned', 'Avg. Heartrate']
+    non_empty_column = 'Workout Timestamp (PST)'
+    key_columns = ['Workout Timestamp (PST)']
+    update_column = 'Avg. Heartrate'
+
+    def row_to_key(self, row):
+        return datetime.datetime.strptime(row['Workout Timestamp (PST)'],
+                                          '%Y-%m-%d %H:%M')
+
+    def row(self, i):
+        start = datetime.datetime(2015, 1, 1) + datetime.timedelta(hours=i)
+        return {
+            'Workout Timestamp (PST)': start.strftime('%Y-%m-%d %H:%M'),
+            'Live/On-Demand': 'On Demand' if i % 4 else 'Live',
+            'Instructor Name': 'Instructor %d' % (i % 25),
+            'Length (minutes)': str((i % 4 + 1) * 15),
+            'Fitness Discipline': 'Cycling',
+            'Type': 'Music',
+            'Title': '%d min Ride' % ((i % 4 + 1) * 15),
+            'Total Output': str(i * 7 % 600),
+            'Avg. Watts': str(i * 3 % 250),
+            'Avg. Resistance': '%d%%' % (i % 60),
+            'Avg. Cadence (RPM)': str(70 + i % 30),
+            'Avg. Speed (mph)': '%.2f' % (15 + i % 10 / 3.0),
+            'Distance (mi)': '%.2f' % (i % 20 + 1.5),
+            'Calories Burned': str(i * 11 % 900),
+            'Avg. Heartrate': '',
+        }
+
+
+SCHEMAS = dict((schema.name, schema)
+               for schema in (SchwabSchema(), ChaseSchema(), WorkoutSchema()))
@@ -0,0 +1,108 @@
+"""
+Time how long the sync-google-spreadsheet CLI takes to start.
+
+Each command runs in a fresh interpreter, so imports are paid for every
+time, as they are from cron.  The budget is for the time a command takes on
+top of an interpreter that does nothing, so it holds on slow and fast
+machines alike.  The run also checks that none of the heavy dependencies
+jobs use were imported::
+
+    python benchmarks/startup.py --repeat 20 --budget 0.1
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+timer = getattr(time, 'perf_counter', time.time)
+
+COMMANDS = [
+    ['--help'],
+    ['jobs'],
+]
+
+# imported only by the jobs that need them
+HEAVY_MODULES = ['pandas', 'numpy', 'gspread', 'oauth2client', 'selenium',
+                 'beddit', 'yaml', 'pkg_resources']
+
+# runs the CLI in-process and reports the heavy modules it imported
+_CHECK = '''
+import json
+import sys
+from sync_google_spreadsheet.cli import main
+try:
+    main(sys.argv[1:], prog_name='sync-google-spreadsheet')
+except SystemExit:
+    pass
+heavy = %r
+sys.stderr.write(json.dumps(sorted(m for m in heavy if m in sys.modules)))
+'''
+
+
+def time_command(args, repeat):
+    # type: (List[str], int) -> List[float]
+    command = [sys.executable, '-m', 'sync_google_spreadsheet'] + args
+    times = []
+    for _ in range(repeat):
+        start = timer()
+        subprocess.check_call(command, stdout=subprocess.PIPE)
+        times.append(timer() - start)
+    return times
+
+
+def heavy_imports(args):
+    # type: (List[str]) -> List[str]
+    process = subprocess.Popen(
+        [sys.executable, '-c', _CHECK % (HEAVY_MODULES,)] + args,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, err = process.communicate()
+    return json.loads(err.decode('utf-8').strip().splitlines()[-1])
+
+
+def baseline(repeat):
+    # type: (int) -> float
+    """Best time of an interpreter that does nothing, for reference."""
+    times = []
+    for _ in range(repeat):
+        start = timer()
+        subprocess.check_call([sys.executable, '-c', 'pass'])
+        times.append(timer() - start)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=0.1,
+                        help='seconds the median run of each command may '
+                             'take beyond a bare interpreter')
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = {'python': baseline(args.repeat), 'commands': []}
+    print('%-12s %8.1f ms' % ('python', results['python'] * 1000))
+    failed = False
+    for command in COMMANDS:
+        times = sorted(time_command(command, args.repeat))
+        median = times[len(times) // 2]
+        heavy = heavy_imports(command)
+        name = ' '.join(command)
+        overhead = median - results['python']
+        print('%-12s %8.1f ms  best %.1f ms  +%.1f ms%s' % (
+            name, median * 1000, times[0] * 1000, overhead * 1000,
+            '  imported ' + ', '.join(heavy) if heavy else ''))
+        results['commands'].append({'command': command, 'median': median,
+                                    'best': times[0], 'overhead': overhead,
+                                    'heavy': heavy})
+        if overhead > args.budget or heavy:
+            failed = True
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
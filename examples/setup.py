@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+"""
+The example jobs, installable as plugins of the sync-google-spreadsheet
+command::
+
+    pip install -e examples
+    sync-google-spreadsheet finance update-chase
+"""
+from setuptools import setup
+
+setup(
+    name='sync-google-spreadsheet-examples',
+    version='0.0.1',
+    license='MIT license',
+    description='Example sync-google-spreadsheet jobs',
+    author='Case Larsen',
+    author_email='clarsen@gmail.com',
+    url='https://github.com/clarsen/python-sync-google-spreadsheet',
+    py_modules=['update_finance', 'update_peloton', 'update_sleep'],
+    zip_safe=False,
+    install_requires=[
+        'sync-google-spreadsheet',
+        'click',
+        'gspread',
+        'oauth2client',
+        'PyYAML',
+    ],
+    extras_require={
+        'peloton': ['selenium'],
+        'sleep': ['pandas', 'selenium'],
+    },
+    entry_points={
+        'sync_google_spreadsheet.jobs': [
+            'finance = update_finance:main',
+            'peloton = update_peloton:main',
+            'sleep = update_sleep:main',
+        ],
+    },
+)
@@ -1,29 +1,27 @@
-import yaml
 import click
-import gspread
-import os
-import csv
 import glob
-import datetime
-import re
-
-from oauth2client.service_account import ServiceAccountCredentials
 
 import sync_google_spreadsheet.sheet_adapter
-
-
-def mdy_dt(string):
-    return datetime.datetime.strptime(string, "%m/%d/%Y")
-
-
-def dollar_str_to_val(x):
-    match = re.match(r"\$?([\d\.,]+)", x)
-    if match:
-        val = match.group(1)
-        val = val.replace(',', '')
-    else:
-        val = ''
-    return val
+from sync_google_spreadsheet import normalize
+from sync_google_spreadsheet.ingest import ingest
+from sync_google_spreadsheet.merge import merge
+from sync_google_spreadsheet.parallel import parallel_map
+from sync_google_spreadsheet.pipeline import Pipeline
+from sync_google_spreadsheet.rules import Rule
+from sync_google_spreadsheet.rules import RuleSet
+from sync_google_spreadsheet.scheduler import quota_scheduler
+from sync_google_spreadsheet.session import load_secrets
+from sync_google_spreadsheet.session import shared_session
+from sync_google_spreadsheet.snapshot import snapshot_cache
+from sync_google_spreadsheet.watermark import Watermark
+from sync_google_spreadsheet.watermark import WatermarkFile
+from sync_google_spreadsheet.watermark import dump_datetime
+from sync_google_spreadsheet.watermark import load_datetime
+
+
+# memoized: the same dates and amounts repeat across transactions
+mdy_dt = normalize.mdy_date
+dollar_str_to_val = normalize.dollars
 
 
 class CategorizerSheet(object):
@@ -31,7 +29,7 @@ class CategorizerSheet(object):
     Transaction pattern matcher using spreadsheet as pattern input
     """
     def __init__(self, sheet):
-        self.patmatch = []
+        rules = []
         rows = sheet.row_count
         columns = sheet.col_count
         cell_list = sheet.range(1, 1, rows, columns)
@@ -50,8 +48,6 @@ class CategorizerSheet(object):
                cell_list[row * columns + transtype_col].value == '':
                 break
             transtype = cell_list[row * columns + transtype_col].value
-            if transtype == '':
-                transtype = None
             cat = cell_list[row * columns + cat_col].value
             freq = cell_list[row * columns + freq_col].value
             if freq == '':
@@ -61,81 +57,52 @@ class CategorizerSheet(object):
             amount = cell_list[row * columns + amount_col].value
             if amount == '':
                 amount = None
+            else:
+                amount = float(amount)
 
-            self.patmatch.append((transtype, desc_pat, desc_exact,
-                                  cat, freq, amount))
+            rules.append(Rule(transtype=transtype, exact=desc_exact,
+                              pattern=desc_pat, value=(cat, freq, amount)))
+        self.rules = RuleSet(rules)
 
     def categorize_schwab(self, row):
-        categorized = False
-
-        for transtype, pat, exact, cat, freq, amount in self.patmatch:
-            if transtype:
-                if transtype != row['Type']:
-                    continue
-            elif exact:
-                if row['Description'] != exact:
-                    continue
-            elif pat:
-                if not re.search(pat, row['Description']):
-                    continue
-            else:
-                assert "not expected"
-
+        def amount_matches(rule):
+            amount = rule.value[2]
             if amount is not None:
-                if float(amount) < 0:
-                    if dollar_str_to_val(row['Withdrawal (-)']) == '':
-                        continue
-                    if -float(amount)\
-                       != float(dollar_str_to_val(row['Withdrawal (-)'])):
-                        continue
+                if amount < 0:
+                    withdrawal = dollar_str_to_val(row['Withdrawal (-)'])
+                    if withdrawal == '':
+                        return False
+                    if -amount != float(withdrawal):
+                        return False
                 else:
                     assert "only matching on withdrawals"
-            # found a match
-            row['Category'] = cat
-            assert cat != 'null' and cat != ''
-            if freq:
-                row['Frequency'] = freq
-            print("===>", row['Category'],
-                  row.get('Frequency', "no frequency"))
-            categorized = True
-            break
+            return True
 
-        if not categorized:
-            print("Uncategorized", row)
-
-        return categorized
+        rule = self.rules.match(row['Description'], row['Type'],
+                                accept=amount_matches)
+        return self._apply(row, rule)
 
     def categorize(self, row):
-        categorized = False
-
-        for transtype, pat, exact, cat, freq, amount in self.patmatch:
-            if transtype:
-                # not considering for credit card
-                continue
-            elif exact:
-                if row['Description'] != exact:
-                    continue
-            elif pat:
-                if not re.search(pat, row['Description']):
-                    continue
-            else:
-                assert "not expected"
-
-            # found a match
-            assert not amount   # not matching on amount for now
-            row['Category'] = cat
-            assert cat != 'null' and cat != ''
-            if freq:
-                row['Frequency'] = freq
-            print("===>", row['Category'],
-                  row.get('Frequency', "no frequency"))
-            categorized = True
-            break
-
-        if not categorized:
+        # rules by transaction type are not considered for credit card
+        rule = self.rules.match(row['Description'])
+        if rule is not None:
+            assert rule.value[2] is None  # not matching on amount for now
+        return self._apply(row, rule)
+
+    def _apply(self, row, rule):
+        if rule is None:
             print("Uncategorized", row)
+            return False
 
-        return categorized
+        # found a match
+        cat, freq, amount = rule.value
+        row['Category'] = cat
+        assert cat != 'null' and cat != ''
+        if freq:
+            row['Frequency'] = freq
+        print("===>", row['Category'],
+              row.get('Frequency', "no frequency"))
+        return True
 
 
 class SchwabSheet(sync_google_spreadsheet.sheet_adapter.SheetAdapter):
@@ -145,22 +112,19 @@ class SchwabSheet(sync_google_spreadsheet.sheet_adapter.SheetAdapter):
     """
 
     def __init__(self, sheet_adapter,
-                 start_row_for_merging
+                 start_row_for_merging,
+                 snapshot=None
                  ):
-        def rowkey(row):
-            withdrawal = dollar_str_to_val(row['Withdrawal (-)'])
-            deposit = dollar_str_to_val(row['Deposit (+)'])
-
-            key = "%s-%s-%s-%s" % (
-                mdy_dt(row['Date']),
-                withdrawal,
-                deposit,
-                row['Description'])
-            return key
+        rowkey = normalize.Key([('Date', mdy_dt),
+                                ('Withdrawal (-)', dollar_str_to_val),
+                                ('Deposit (+)', dollar_str_to_val),
+                                ('Description', normalize.text)],
+                               format="%s-%s-%s-%s")
 
         super(SchwabSheet, self).__init__(sheet_adapter,
                                           start_row_for_merging,
-                                          rowkey, non_empty_column='Date')
+                                          rowkey, non_empty_column='Date',
+                                          snapshot=snapshot)
 
 
 class ChaseSheet(sync_google_spreadsheet.sheet_adapter.SheetAdapter):
@@ -170,113 +134,97 @@ class ChaseSheet(sync_google_spreadsheet.sheet_adapter.SheetAdapter):
     """
 
     def __init__(self, sheet_adapter,
-                 start_row_for_merging
+                 start_row_for_merging,
+                 snapshot=None
                  ):
-        def rowkey(rowdict):
-            key = "%s-%s-%f-%s" % (
-                mdy_dt(rowdict['Trans Date']),
-                mdy_dt(rowdict['Post Date']),
-                float(rowdict['Amount']),
-                rowdict['Description']
-                )
-            return key
+        rowkey = normalize.Key([('Trans Date', mdy_dt),
+                                ('Post Date', mdy_dt),
+                                ('Amount', normalize.amount),
+                                ('Description', normalize.text)],
+                               format="%s-%s-%f-%s")
 
         super(ChaseSheet, self).__init__(sheet_adapter,
                                          start_row_for_merging,
-                                         rowkey, non_empty_column='Trans Date')
+                                         rowkey, non_empty_column='Trans Date',
+                                         snapshot=snapshot)
 
 
 @click.group()
 def main():
     pass
 
-# TODO: sort_by_* could be merged/generalized
 
+def init_common(sync_config):
+    secrets = load_secrets("~/.secrets-finance.yaml")
+    # one quota shared with the other jobs
+    scheduler = quota_scheduler(secrets['sheet'].get('requests_per_minute',
+                                                     60))
+    session = shared_session(secrets['sheet']['secrets_file'],
+                             scheduler=scheduler)
+    name = secrets['sheet']['name']
+    sheet = session.worksheet(name, secrets[sync_config]['worksheet_name'])
+    categorizer_sheet = session.worksheet(
+        name, secrets[sync_config]['categorization_sheet'])
+    categorizer = CategorizerSheet(categorizer_sheet)
 
-def sort_by_date(x, y):
-    return cmp(mdy_dt(x['Date']), mdy_dt(y['Date']))
+    return secrets, sheet, categorizer
 
 
-def sort_by_trans_date(x, y):
-    try:
-        return cmp(mdy_dt(x['Trans Date']), mdy_dt(y['Trans Date']))
-    except Exception as e:
-        print("couldn't parse out", x)
-        print("couldn't parse out", y)
-        raise e
+# the categorizer annotate() uses, set in each parallel_map worker
+_categorizer = None
 
 
-def csv_streamer(fn, row_sort, skip_before_header, skip_after_header):
-    new_rows = []
-    with open(fn, "r") as f:
-        if skip_before_header:
-            f.readline()
-        reader = csv.DictReader(f)
+def use_categorizer(categorizer):
+    global _categorizer
+    _categorizer = categorizer
 
-        for row in reader:
-            # this can be elevated to a parameter.
-            if skip_after_header:
-                skip_after_header = False
-                continue
-            for k in row:
-                if row[k] == 'null':
-                    row[k] = ''
-            new_rows.append(row)
-    new_rows = sorted(new_rows, cmp=row_sort)
-    for row in new_rows:
-        yield row
 
+def annotate(row):
+    """categorize row in place; returns it and whether a rule matched"""
+    return row, _categorizer.categorize_schwab(row)
 
-def init_common(sync_config):
-    with open(os.path.expanduser("~/.secrets-finance.yaml"), "r") as f:
-        secrets = yaml.load(f)
-    SCOPE = ["https://spreadsheets.google.com/feeds"]
-    SECRETS_FILE = os.path.expanduser(secrets['sheet']['secrets_file'])
-    SPREADSHEET = secrets['sheet']['name']
-    credentials = ServiceAccountCredentials \
-        .from_json_keyfile_name(SECRETS_FILE, SCOPE)
-    # Authenticate using the signed key
-    gss_client = gspread.authorize(credentials)
-    gss = gss_client.open(SPREADSHEET)
-    sheet = gss.worksheet(secrets[sync_config]['worksheet_name'])
-    categorizer_sheet = \
-        gss.worksheet(secrets[sync_config]['categorization_sheet'])
-    categorizer = CategorizerSheet(categorizer_sheet)
 
-    return secrets, sheet, categorizer
+def watermark(secrets, sync_config, date_column):
+    """the date up to which sync_config's input has been synced"""
+    state = WatermarkFile(secrets.get('state_file',
+                                      '~/.sync-finance-state.json'))
+    return Watermark(state, secrets[sync_config]['worksheet_name'],
+                     sync_config, key=lambda row: mdy_dt(row[date_column]),
+                     dump=dump_datetime, load=load_datetime)
 
 
-def update_schwab(sync_config):
+def update_schwab(sync_config, processes):
     secrets, gss, categorizer = init_common(sync_config)
 
-    sheet = SchwabSheet(gss, secrets[sync_config]['start_row'])
+    sheet = SchwabSheet(gss, secrets[sync_config]['start_row'],
+                        snapshot=snapshot_cache(sync_config))
     sheet.load()
     ignore_before = mdy_dt(secrets[sync_config]['ignore_merge_dates_before'])
+    mark = watermark(secrets, sync_config, 'Date')
 
-    # TODO: below could be generalized/parameterized
-    # this is the generic logic
-    s = None
-    for fn in glob.glob(secrets[sync_config]['csvfile_pattern']):
-        if s is not None:
-            raise Exception("can't handle multiple files")
-        s = csv_streamer(fn, sort_by_date,
-                         skip_before_header=True, skip_after_header=True)
+    s = ingest(sorted(glob.glob(secrets[sync_config]['csvfile_pattern'])),
+               sort_key=lambda row: mdy_dt(row['Date']), select=mark.skip,
+               skip_before_header=True, skip_after_header=True)
 
     uncategorized = []
 
-    def annotate(row):
-        if not categorizer.categorize_schwab(row):
+    def report(annotated):
+        row, categorized = annotated
+        print(row)
+        if not categorized:
             uncategorized.append(row)
         return row
 
-    for row in s:
-        if mdy_dt(row['Date']) < ignore_before:
-            continue
+    records = Pipeline(s)
+    records.filter(lambda row: mdy_dt(row['Date']) >= ignore_before,
+                   'recent')
+    records.apply(lambda rows: parallel_map(annotate, rows, processes,
+                                            initializer=use_categorizer,
+                                            initargs=(categorizer,)),
+                  'annotate')
+    records.map(report, 'report')
 
-        print(row)
-        row = annotate(row)
-        if not sheet.has(row):
-            sheet.append(row)
+    stats = merge(sheet, records, sync=False)
 
     if len(uncategorized) > 0:
         print("========= Uncategorized =====")
@@ -284,53 +232,74 @@ def update_schwab(sync_config):
             print(row)
 
     sheet.sync()
+    mark.commit()
+    print(stats)
+    print(records.stats())
+    print(normalize.cache_stats())
+
+
+processes_option = click.option(
+    '--processes', default=1,
+    help='worker processes for categorizing rows (0: one per CPU)')
 
 
 @main.command()
-def update_schwab_business():
-    update_schwab('schwab_business')
+@processes_option
+def update_schwab_business(processes):
+    update_schwab('schwab_business', processes or None)
 
 
 @main.command()
-def update_schwab_personal():
-    update_schwab('schwab_personal')
+@processes_option
+def update_schwab_personal(processes):
+    update_schwab('schwab_personal', processes or None)
 
 
 @main.command()
-def update_chase():
+@processes_option
+def update_chase(processes):
     secrets, gss, categorizer = init_common('chase')
     sync_config = 'chase'
 
-    sheet = ChaseSheet(gss, secrets[sync_config]['start_row'])
+    sheet = ChaseSheet(gss, secrets[sync_config]['start_row'],
+                       snapshot=snapshot_cache(sync_config))
     sheet.load()
 
     uncategorized = []
 
-    def annotate(row):
-        if not categorizer.categorize_schwab(row):
+    # card transactions post days after their transaction date, and show up
+    # in an export only then: a row's Trans Date can be below the watermark
+    # when it is first seen, its Post Date can't
+    mark = watermark(secrets, sync_config, 'Post Date')
+    s = ingest(sorted(glob.glob(secrets[sync_config]['csvfile_pattern'])),
+               sort_key=lambda row: mdy_dt(row['Trans Date']),
+               select=mark.skip)
+
+    def report(annotated):
+        row, categorized = annotated
+        print(row)
+        if not categorized:
             uncategorized.append(row)
         return row
 
-    # TODO: below could be generalized/parameterized
-    # This is the generic logic
-    s = None
-    for fn in glob.glob(secrets[sync_config]['csvfile_pattern']):
-        if s is not None:
-            raise Exception("can't handle multiple files")
-        s = csv_streamer(fn, sort_by_trans_date,
-                         skip_before_header=False, skip_after_header=False)
+    records = Pipeline(s)
+    records.apply(lambda rows: parallel_map(annotate, rows, processes or None,
+                                            initializer=use_categorizer,
+                                            initargs=(categorizer,)),
+                  'annotate')
+    records.map(report, 'report')
 
-    for row in s:
-        print(row)
-        row = annotate(row)
-        if not sheet.has(row):
-            sheet.append(row)
+    stats = merge(sheet, records, sync=False)
 
     print("========= Uncategorized =====")
     for row in uncategorized:
         print(row)
 
     sheet.sync()
+    mark.commit()
+    print(stats)
+    print(records.stats())
+    print(normalize.cache_stats())
 
 
 if __name__ == "__main__":
@@ -1,35 +1,40 @@
-import os
 import time
 import glob
 import csv
 
 import click
-import gspread
-import pandas as pd
-import yaml
-
-from oauth2client.service_account import ServiceAccountCredentials
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.action_chains import ActionChains
 
 import sync_google_spreadsheet.sheet_adapter
+from sync_google_spreadsheet import normalize
+from sync_google_spreadsheet.daemon import Daemon
+from sync_google_spreadsheet.daemon import Job
+from sync_google_spreadsheet.merge import merge
+from sync_google_spreadsheet.scheduler import quota_scheduler
+from sync_google_spreadsheet.session import load_secrets
+from sync_google_spreadsheet.session import shared_session
+from sync_google_spreadsheet.snapshot import snapshot_cache
+
+
+pacific = normalize.timestamp('America/Los_Angeles')
 
 
 class WorkoutSheet(sync_google_spreadsheet.sheet_adapter.SheetAdapter):
-    def __init__(self, sheet_adapter):
+    def __init__(self, sheet_adapter, snapshot=None):
 
-        def rowkey(row):
-            key = pd.Timestamp(row['Workout Timestamp (PST)'],
-                               tz='America/Los_Angeles')
-            return key
+        rowkey = normalize.Key([('Workout Timestamp (PST)', pacific)])
 
         super(WorkoutSheet, self).__init__(sheet_adapter, 1,
                                            rowkey,
-                                           non_empty_column='Workout Timestamp (PST)')
+                                           non_empty_column='Workout Timestamp (PST)',
+                                           snapshot=snapshot)
 
 
 def update_peloton(secrets):
+    # imported here so the other commands start without them
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.action_chains import ActionChains
+
     username = secrets['peloton']['user']
     password = secrets['peloton']['password']
     page_delay = 25
@@ -102,15 +107,17 @@ def csv_streamer(fn):
 
 
 def update_peloton2(secrets, sheet):
-    pw = WorkoutSheet(sheet)
+    pw = WorkoutSheet(sheet, snapshot=snapshot_cache('peloton'))
     pw.load()
 
     files = glob.glob("./tmp/*.csv")
-    for row in csv_streamer(files[0]):
-        print(row['Workout Timestamp (PST)'], row['Total Output'])
-        if not pw.has(row):
-            pw.append(row)
-    pw.sync()
+
+    def records():
+        for row in csv_streamer(files[0]):
+            print(row['Workout Timestamp (PST)'], row['Total Output'])
+            yield row
+
+    print(merge(pw, records()))
 
 
 @click.group()
@@ -124,17 +131,14 @@ def test():
 
 
 def init_common():
-    with open(os.path.expanduser("~/.secrets-peloton.yaml"), "r") as f:
-        secrets = yaml.load(f)
-    SCOPE = ["https://spreadsheets.google.com/feeds"]
-    SECRETS_FILE = os.path.expanduser(secrets['sheet']['secrets_file'])
-    SPREADSHEET = secrets['sheet']['name']
-    credentials = ServiceAccountCredentials \
-        .from_json_keyfile_name(SECRETS_FILE, SCOPE)
-    # Authenticate using the signed key
-    gss_client = gspread.authorize(credentials)
-    gss = gss_client.open(SPREADSHEET)
-    sheet = gss.worksheet(secrets['sheet']['worksheet_name'])
+    secrets = load_secrets("~/.secrets-peloton.yaml")
+    # one quota shared with the other jobs
+    scheduler = quota_scheduler(secrets['sheet'].get('requests_per_minute',
+                                                     60))
+    session = shared_session(secrets['sheet']['secrets_file'],
+                             scheduler=scheduler)
+    sheet = session.worksheet(secrets['sheet']['name'],
+                              secrets['sheet']['worksheet_name'])
 
     return secrets, sheet
 
@@ -154,5 +158,21 @@ def peloton2():
     update_peloton2(secrets, sheet)
 
 
+@main.command()
+@click.option('--debounce', default=2.0,
+              help='seconds without new files before syncing them')
+def watch(debounce):
+    """keep the sheet loaded and sync csv files as they land in ./tmp"""
+    secrets, sheet = init_common()
+
+    def process(pw, paths):
+        for path in paths:
+            print(path, merge(pw, csv_streamer(path)))
+
+    pw = WorkoutSheet(sheet, snapshot=snapshot_cache('peloton'))
+    Daemon([Job('peloton', pw, process, ['./tmp'])],
+           debounce=debounce).run()
+
+
 if __name__ == "__main__":
     main()
@@ -1,53 +1,53 @@
-import os
 import time
 from datetime import datetime
 
 import click
-import gspread
-import pandas as pd
-import yaml
-from beddit.client import BedditClient
-from oauth2client.service_account import ServiceAccountCredentials
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.action_chains import ActionChains
 
 import sync_google_spreadsheet.sheet_adapter
+from sync_google_spreadsheet import normalize
+from sync_google_spreadsheet.merge import merge
+from sync_google_spreadsheet.scheduler import quota_scheduler
+from sync_google_spreadsheet.session import load_secrets
+from sync_google_spreadsheet.session import shared_session
+from sync_google_spreadsheet.snapshot import snapshot_cache
+from sync_google_spreadsheet.watermark import Watermark
+from sync_google_spreadsheet.watermark import WatermarkFile
 
 
-class SleepSheet_resmed(sync_google_spreadsheet.sheet_adapter.SheetAdapter):
-    def __init__(self, sheet):
+pacific = normalize.timestamp('America/Los_Angeles')
 
-        def rowkey(row):
-            datestr = row['Going to sleep at']
-            ts = pd.Timestamp(datestr,
-                              tz='America/Los_Angeles')
 
-            return ts
+class SleepSheet_resmed(sync_google_spreadsheet.sheet_adapter.SheetAdapter):
+    def __init__(self, sheet, snapshot=None):
+
+        rowkey = normalize.Key([('Going to sleep at', pacific)])
 
         super(SleepSheet_resmed, self).__init__(sheet, 1,
                                                 rowkey,
                                                 non_empty_column='Going to sleep at',
+                                                snapshot=snapshot,
                                                 )
 
 
 class SleepSheet_beddit(sync_google_spreadsheet.sheet_adapter.SheetAdapter):
-    def __init__(self, sheet):
-
-        def rowkey(row):
-            datestr = row['Waking up']
-            ts = pd.Timestamp(datestr,
-                              tz='America/Los_Angeles')
+    def __init__(self, sheet, snapshot=None):
 
-            return ts
+        rowkey = normalize.Key([('Waking up', pacific)])
 
         super(SleepSheet_beddit, self).__init__(sheet, 1,
                                                 rowkey,
-                                                non_empty_column='Waking up'
+                                                non_empty_column='Waking up',
+                                                snapshot=snapshot,
                                                 )
 
 
 def update_resmed(secrets, sheet):
+    # imported here so the other commands start without them
+    import pandas as pd
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.action_chains import ActionChains
+
     username = secrets['resmed']['user']
     password = secrets['resmed']['password']
     page_delay = 25
@@ -137,27 +137,29 @@ def update_resmed(secrets, sheet):
                 'myAir duration': resmed_dur,
                 }
 
-    rs = SleepSheet_resmed(sheet)
-    rs.load()
-
-    for row in sleep_streamer():
-        if rs.has(row):
-            idx = rs.row_for_kvhash(row)
-            if rs.row(idx)['myAir duration'] != row['myAir duration']:
-                rs.update_row(idx, row, ['myAir duration'])
-            else:
-                print("already matches")
-        else:
-            print("not found")
+    rs = SleepSheet_resmed(sheet, snapshot=snapshot_cache('sleep_resmed'))
+    rs.load(columns=['myAir duration'])
 
-    rs.sync()
+    print(merge(rs, sleep_streamer(), update_columns=['myAir duration'],
+                insert=False))
 
 
 def update_beddit(secrets, sheet):
+    import pandas as pd
+    from beddit.client import BedditClient
+
     client = BedditClient(secrets['beddit']['user'],
                           secrets['beddit']['password'])
     start_date = datetime.strptime(secrets['beddit']['start_date'], "%m/%d/%Y")
     end_date = datetime.strptime(secrets['beddit']['end_date'], "%m/%d/%Y")
+    state = WatermarkFile(secrets.get('state_file', '~/.sync-state.json'))
+    mark = Watermark(state, secrets['sheet']['worksheet_name'], 'beddit',
+                     key=lambda row: row['Waking up'],
+                     dump=lambda ts: ts.isoformat(), load=pd.Timestamp)
+    if mark.value is not None:
+        # only fetch what is past the last synced night
+        start_date = max(start_date, mark.value.tz_localize(None)
+                         .to_pydatetime())
     sleeps = client.get_sleeps(start=start_date, end=end_date)
 
     def sleep_streamer():
@@ -174,19 +176,18 @@ def update_beddit(secrets, sheet):
             print(row)
             yield row
 
-    bs = SleepSheet_beddit(sheet)
-    bs.load()
+    bs = SleepSheet_beddit(sheet, snapshot=snapshot_cache('sleep_beddit'))
+    bs.load(columns=['beddit duration'])
 
-    for row in sleep_streamer():
-        if bs.has(row):
-            idx = bs.row_for_kvhash(row)
-            if bs.row(idx)['beddit duration'] != row['beddit duration']:
-                bs.update_row(idx, row, ['beddit duration'])
-            else:
-                print("already matches")
-        else:
-            print("not found")
-    bs.sync()
+    rows = [row for row in sleep_streamer() if mark.passes(row['Waking up'])]
+    print(merge(bs, rows, update_columns=['beddit duration'], insert=False))
+    # nights without a row in the sheet aren't written (insert=False), so
+    # the watermark stops before the first of them and they are retried
+    for row in sorted(rows, key=lambda row: row['Waking up']):
+        if not bs.has(row):
+            break
+        mark.advance(row['Waking up'])
+    mark.commit()
 
 
 @click.group()
@@ -200,17 +201,14 @@ def test():
 
 
 def init_common():
-    with open(os.path.expanduser("~/.secrets.yaml"), "r") as f:
-        secrets = yaml.load(f)
-    SCOPE = ["https://spreadsheets.google.com/feeds"]
-    SECRETS_FILE = os.path.expanduser(secrets['sheet']['secrets_file'])
-    SPREADSHEET = secrets['sheet']['name']
-    credentials = ServiceAccountCredentials \
-        .from_json_keyfile_name(SECRETS_FILE, SCOPE)
-    # Authenticate using the signed key
-    gss_client = gspread.authorize(credentials)
-    gss = gss_client.open(SPREADSHEET)
-    sheet = gss.worksheet(secrets['sheet']['worksheet_name'])
+    secrets = load_secrets("~/.secrets.yaml")
+    # one quota shared with the other jobs
+    scheduler = quota_scheduler(secrets['sheet'].get('requests_per_minute',
+                                                     60))
+    session = shared_session(secrets['sheet']['secrets_file'],
+                             scheduler=scheduler)
+    sheet = session.worksheet(secrets['sheet']['name'],
+                              secrets['sheet']['worksheet_name'])
 
     return secrets, sheet
 
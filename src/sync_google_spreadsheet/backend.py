@@ -0,0 +1,208 @@
+"""
+The worksheet interface SheetAdapter works against, and an in-memory
+implementation of it for tests and benchmarks.
+
+A gspread Worksheet (>= 3.4) already provides this interface, so it is
+passed to SheetAdapter as is.  FakeWorksheet keeps its cells in memory and
+can simulate the parts of the real API that matter for performance: call
+latency, a per-minute request quota and a maximum request size.
+"""
+import time
+
+from sync_google_spreadsheet.batch import cell_size
+from sync_google_spreadsheet.ranges import a1_to_range
+from sync_google_spreadsheet.store import Cell
+
+
+class Backend(object):
+    """
+    What SheetAdapter needs from a worksheet.  row_count and col_count are
+    plain attributes; batch_update and revision are optional, and are used
+    when present.  add_rows is only needed to append past row_count.
+    """
+    row_count = 0
+    col_count = 0
+
+    def range(self, first_row, first_col, last_row, last_col):
+        # type: (int, int, int, int) -> List[Cell]
+        """Cells of the inclusive 1-based rectangle, row by row."""
+        raise NotImplementedError
+
+    def update_cells(self, cells):
+        # type: (List[Cell]) -> None
+        """Write cells, each with 1-based row and col and a value."""
+        raise NotImplementedError
+
+    def add_rows(self, rows):
+        # type: (int) -> None
+        """Add rows empty rows at the bottom, for appends past row_count."""
+        raise NotImplementedError
+
+
+class BackendError(Exception):
+    """An error the fake raises the way the API would fail a request."""
+    status_code = 500
+
+
+class QuotaExceeded(BackendError):
+    """Too many requests in the last minute (HTTP 429)."""
+    status_code = 429
+
+
+class PayloadTooLarge(BackendError):
+    """Request bigger than the configured limit (HTTP 413)."""
+    status_code = 413
+
+
+class FakeWorksheet(Backend):
+    """
+    In-memory worksheet.
+
+    values is a list of rows, padded with '' to rows x cols.  latency
+    seconds are spent on every call plus latency_per_cell for every cell
+    read or written.  quota_per_minute limits calls in any 60 second
+    window, max_payload_bytes limits the estimated size of a write; both
+    raise the exceptions above instead of doing the call.  clock and sleep
+    can be replaced to simulate time.
+
+    Every call is appended to calls as (method, detail), and counted in
+    stats.
+    """
+
+    def __init__(self, values=None, rows=None, cols=None, latency=0.0,
+                 latency_per_cell=0.0, quota_per_minute=None,
+                 max_payload_bytes=None, clock=time.time, sleep=time.sleep,
+                 title='Sheet1'):
+        values = [list(row) for row in (values or [])]
+        self.row_count = max(rows or 0, len(values))
+        self.col_count = max([cols or 0] + [len(row) for row in values])
+        self.values = [row + [''] * (self.col_count - len(row))
+                       for row in values]
+        self.values += [[''] * self.col_count
+                        for _ in range(self.row_count - len(values))]
+        self.title = title
+        self.latency = latency
+        self.latency_per_cell = latency_per_cell
+        self.quota_per_minute = quota_per_minute
+        self.max_payload_bytes = max_payload_bytes
+        self.clock = clock
+        self.sleep = sleep
+        self.version = 1
+        self.calls = []
+        self.stats = {'calls': 0, 'cells_read': 0, 'cells_written': 0,
+                      'bytes_written': 0, 'rejected': 0}
+        self._failures = []
+        self._recent = []
+
+    def fail_next(self, count=1, error=QuotaExceeded):
+        # type: (int, type) -> None
+        """Make the next count calls raise error."""
+        self._failures.extend([error] * count)
+
+    def _request(self, method, detail, cells=0, payload=0):
+        self.calls.append((method, detail))
+        if self._failures:
+            self.stats['rejected'] += 1
+            raise self._failures.pop(0)("%s failed (injected)" % method)
+        now = self.clock()
+        if self.quota_per_minute is not None:
+            self._recent = [t for t in self._recent if t > now - 60]
+            if len(self._recent) >= self.quota_per_minute:
+                self.stats['rejected'] += 1
+                raise QuotaExceeded("quota of %d requests per minute "
+                                    "exceeded" % self.quota_per_minute)
+            self._recent.append(now)
+        if self.max_payload_bytes is not None and \
+                payload > self.max_payload_bytes:
+            self.stats['rejected'] += 1
+            raise PayloadTooLarge("request of %d bytes exceeds %d" %
+                                  (payload, self.max_payload_bytes))
+        self.stats['calls'] += 1
+        self.stats['bytes_written'] += payload
+        delay = self.latency + self.latency_per_cell * cells
+        if delay:
+            self.sleep(delay)
+
+    def revision(self):
+        # type: () -> int
+        return self.version
+
+    def range(self, first_row, first_col, last_row, last_col):
+        # type: (int, int, int, int) -> List[Cell]
+        cells = (last_row - first_row + 1) * (last_col - first_col + 1)
+        self._request('range', (first_row, first_col, last_row, last_col),
+                      cells=cells)
+        self.stats['cells_read'] += cells
+        return [Cell(row, col, self.values[row - 1][col - 1])
+                for row in range(first_row, last_row + 1)
+                for col in range(first_col, last_col + 1)]
+
+    def update_cells(self, cells):
+        # type: (List[Cell]) -> None
+        cells = list(cells)
+        self._request('update_cells',
+                      [(cell.row, cell.col, cell.value) for cell in cells],
+                      cells=len(cells),
+                      payload=sum(cell_size(cell) for cell in cells))
+        self._write((cell.row, cell.col, cell.value) for cell in cells)
+
+    def batch_update(self, data):
+        # type: (List[Dict[str,Any]]) -> None
+        """Multi-range values update, as gspread's Worksheet.batch_update"""
+        writes = []
+        for item in data:
+            first_row, first_col, _, _ = a1_to_range(item['range'])
+            for row_offset, row in enumerate(item['values']):
+                for col_offset, value in enumerate(row):
+                    writes.append(Cell(first_row + row_offset,
+                                       first_col + col_offset, value))
+        self._request('batch_update', [item['range'] for item in data],
+                      cells=len(writes),
+                      payload=sum(cell_size(cell) for cell in writes))
+        self._write((cell.row, cell.col, cell.value) for cell in writes)
+
+    def add_rows(self, rows):
+        # type: (int) -> None
+        self._request('add_rows', rows)
+        self.values += [[''] * self.col_count for _ in range(rows)]
+        self.row_count += rows
+        self.version += 1
+
+    def _write(self, writes):
+        count = 0
+        for row, col, value in writes:
+            if row > self.row_count or col > self.col_count:
+                raise BackendError("R%sC%s is outside the sheet" % (row, col))
+            self.values[row - 1][col - 1] = value
+            count += 1
+        self.stats['cells_written'] += count
+        self.version += 1
+
+
+class FakeSpreadsheet(object):
+    """
+    In-memory spreadsheet of FakeWorksheets, with the parts of gspread's
+    Spreadsheet that sharding uses.  kwargs are passed to every worksheet
+    add_worksheet() creates.
+    """
+
+    def __init__(self, worksheets=None, **kwargs):
+        self.sheets = list(worksheets or [])
+        self.kwargs = kwargs
+
+    def worksheets(self):
+        # type: () -> List[FakeWorksheet]
+        return list(self.sheets)
+
+    def worksheet(self, title):
+        # type: (str) -> FakeWorksheet
+        for sheet in self.sheets:
+            if sheet.title == title:
+                return sheet
+        raise BackendError("No worksheet %s" % title)
+
+    def add_worksheet(self, title, rows, cols):
+        # type: (str, int, int) -> FakeWorksheet
+        sheet = FakeWorksheet(rows=rows, cols=cols, title=title, **self.kwargs)
+        self.sheets.append(sheet)
+        return sheet
@@ -0,0 +1,136 @@
+"""
+Size-bounded writer used by SheetAdapter.sync().
+
+Pending writes arrive as blocks: rectangles of cells given as a list of rows,
+each row a list of cells with ``row``, ``col`` and ``value`` attributes.  The
+blocks are packed into batches that stay under a cell count and an estimated
+payload size, splitting a block between rows when it is too big on its own.
+Each batch is one request, and a batch that fails with a quota or server
+error is retried by itself.
+"""
+import time
+
+from sync_google_spreadsheet.ranges import range_to_a1
+from sync_google_spreadsheet.scheduler import is_retryable
+
+DEFAULT_MAX_CELLS = 5000
+DEFAULT_MAX_BYTES = 1000000
+DEFAULT_RETRIES = 3
+
+# rough per-cell JSON overhead: quotes, comma, brackets
+CELL_OVERHEAD = 4
+# rough per-range overhead: range label and the surrounding object
+RANGE_OVERHEAD = 40
+
+
+def value_size(value):
+    # type: (Any) -> int
+    """Estimated number of bytes a cell value adds to a request."""
+    if value is None:
+        return CELL_OVERHEAD
+    return len((u'%s' % value).encode('utf-8')) + CELL_OVERHEAD
+
+
+def cell_size(cell):
+    # type: (Any) -> int
+    return value_size(cell.value)
+
+
+class BatchWriter(object):
+    """
+    Pack blocks of cells into bounded batches and write them to a worksheet.
+
+    If the worksheet has ``batch_update`` (gspread >= 3.4) each batch is sent
+    as one multi-range values update, otherwise the cells of a batch are
+    passed to ``update_cells`` together.
+    """
+
+    def __init__(self, sheet, max_cells=DEFAULT_MAX_CELLS,
+                 max_bytes=DEFAULT_MAX_BYTES, retries=DEFAULT_RETRIES,
+                 retry_delay=1.0):
+        # type: (gspread.Worksheet, int, int, int, float) -> None
+        self.sheet = sheet
+        self.max_cells = max_cells
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def batches(self, blocks):
+        # type: (Iterable[List[List[Cell]]]) -> List[List[List[List[Cell]]]]
+        """
+        Group blocks into batches; a batch is a list of blocks.  A single row
+        larger than the limits is still sent, alone in its batch.
+        """
+        batches = []
+        batch = []
+        cells = 0
+        size = 0
+        for block in blocks:
+            piece = []
+            for row in block:
+                row_cells = len(row)
+                row_size = sum(cell_size(cell) for cell in row)
+                extra = 0 if piece else RANGE_OVERHEAD
+                if (batch or piece) and \
+                        (cells + row_cells > self.max_cells or
+                         size + row_size + extra > self.max_bytes):
+                    if piece:
+                        batch.append(piece)
+                    batches.append(batch)
+                    batch, piece, cells, size = [], [], 0, 0
+                    extra = RANGE_OVERHEAD
+                piece.append(row)
+                cells += row_cells
+                size += row_size + extra
+            if piece:
+                batch.append(piece)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def write(self, blocks, on_written=None):
+        # type: (Iterable[List[List[Cell]]], Callable) -> int
+        """
+        Write all blocks, calling on_written(batch) after each batch succeeds.
+        Returns the number of batches sent.
+        """
+        batches = self.batches(blocks)
+        for batch in batches:
+            self.write_batch(batch)
+            if on_written is not None:
+                on_written(batch)
+        return len(batches)
+
+    def write_batch(self, batch):
+        # type: (List[List[List[Cell]]]) -> None
+        """
+        Send one batch, retrying it with exponential backoff while it fails
+        with a quota or server error.  Other errors are raised at once.
+        """
+        attempt = 0
+        while True:
+            try:
+                self._send(batch)
+                return
+            except Exception as e:
+                if attempt >= self.retries or not is_retryable(e):
+                    raise
+                time.sleep(self.retry_delay * (2 ** attempt))
+                attempt += 1
+
+    def _send(self, batch):
+        if hasattr(self.sheet, 'batch_update'):
+            data = []
+            for block in batch:
+                first, last = block[0][0], block[-1][-1]
+                data.append({
+                    'range': range_to_a1(first.row, first.col,
+                                         last.row, last.col),
+                    'values': [[cell.value for cell in row] for row in block],
+                })
+            self.sheet.batch_update(data)
+        else:
+            self.sheet.update_cells([cell
+                                     for block in batch
+                                     for row in block
+                                     for cell in row])
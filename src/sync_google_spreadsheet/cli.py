@@ -13,11 +13,121 @@ Why does this file exist, and why not put this in __main__?
     there's no ``sync_google_spreadsheet.__main__`` in ``sys.modules``.
 
   Also see (1) from http://click.pocoo.org/5/setuptools/#setuptools-integration
+
+Sync jobs are plugins: a package registers its click command (or group) under
+the ``sync_google_spreadsheet.jobs`` entry point group::
+
+    entry_points={
+        'sync_google_spreadsheet.jobs': [
+            'finance = my_sync.finance:main',
+        ],
+    }
+
+and it becomes ``sync-google-spreadsheet finance``.  A plugin's module is
+imported only when its subcommand runs, so ``--help`` and the other jobs
+don't pay for its imports (pandas, selenium, gspread, ...).  Keep this module
+free of imports beyond click for the same reason.
 """
+import importlib
+
 import click
 
+JOBS_GROUP = 'sync_google_spreadsheet.jobs'
+
+
+def job_entry_points(group=JOBS_GROUP):
+    # type: (str) -> Dict[str,str]
+    """name -> 'module:attribute' of the installed job plugins."""
+    try:
+        from importlib import metadata
+    except ImportError:  # before python 3.8
+        metadata = None
+    if metadata is not None:
+        entry_points = metadata.entry_points()
+        if hasattr(entry_points, 'select'):
+            entry_points = entry_points.select(group=group)
+        else:
+            entry_points = entry_points.get(group, ())
+        return dict((ep.name, ep.value) for ep in entry_points)
+    # pkg_resources is slow to import, only use it when there's nothing else
+    import pkg_resources
+    return dict((ep.name, '%s:%s' % (ep.module_name, '.'.join(ep.attrs)))
+                for ep in pkg_resources.iter_entry_points(group))
+
+
+def load_job(spec):
+    # type: (str) -> click.Command
+    """The object a 'module:attribute' spec names, importing its module."""
+    module_name, _, attribute = spec.partition(':')
+    obj = importlib.import_module(module_name)
+    for name in attribute.split('.') if attribute else ():
+        obj = getattr(obj, name)
+    return obj
+
+
+class JobGroup(click.Group):
+    """
+    A click group whose commands besides its own are the job plugins, loaded
+    when one is run.  jobs (name -> 'module:attribute') defaults to the
+    installed entry points of group, looked up on first use.
+    """
+
+    def __init__(self, name=None, commands=None, jobs=None, group=JOBS_GROUP,
+                 **attrs):
+        super(JobGroup, self).__init__(name, commands, **attrs)
+        self.group = group
+        self._jobs = jobs
+
+    @property
+    def jobs(self):
+        # type: () -> Dict[str,str]
+        if self._jobs is None:
+            self._jobs = job_entry_points(self.group)
+        return self._jobs
+
+    def list_commands(self, ctx):
+        return sorted(set(self.commands) | set(self.jobs))
+
+    def get_command(self, ctx, name):
+        command = self.commands.get(name)
+        if command is None and name in self.jobs:
+            spec = self.jobs[name]
+            try:
+                command = load_job(spec)
+            except ImportError as e:
+                raise click.ClickException(
+                    "Can't load job %s (%s): %s" % (name, spec, e))
+            if not isinstance(command, click.Command):
+                raise click.ClickException(
+                    "Job %s (%s) is not a click command" % (name, spec))
+            self.add_command(command, name)
+        return command
+
+    def format_commands(self, ctx, formatter):
+        # describe jobs by where they come from instead of importing them for
+        # their help text
+        rows = []
+        for name in self.list_commands(ctx):
+            command = self.commands.get(name)
+            if command is not None:
+                if command.hidden:
+                    continue
+                rows.append((name, command.get_short_help_str()))
+            else:
+                rows.append((name, 'job from %s' % self.jobs[name]))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=JobGroup)
+def main():
+    """Sync data into Google spreadsheets with the installed jobs."""
+
 
-@click.command()
-@click.argument('names', nargs=-1)
-def main(names):
-    click.echo(repr(names))
+@main.command()
+def jobs():
+    """List the installed jobs."""
+    group = click.get_current_context().find_root().command
+    for name, spec in sorted(group.jobs.items()):
+        click.echo('%s = %s' % (name, spec))
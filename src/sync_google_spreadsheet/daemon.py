@@ -0,0 +1,392 @@
+"""
+Keep sheets loaded and sync input files into them as they arrive.
+
+A one-shot run authenticates, loads the whole sheet and reads the input
+directory once.  A Daemon loads each Job's SheetAdapter once and then waits
+for files to appear in the job's directories.  Files that arrive close
+together are synced as one micro-batch, once no new file has arrived for
+debounce seconds (or max_delay after the first one, if they keep coming)::
+
+    def process(adapter, paths):
+        for path in paths:
+            merge(adapter, mark.skip(read_csv(path)), sync=False)
+        adapter.sync()
+        mark.commit()
+
+    Daemon([Job('checking', SchwabSheet(worksheet, 1), process, ['./tmp'])],
+           debounce=2).run()
+
+New files are seen through inotify when the inotify_simple package is
+installed (Linux), and by polling the directories otherwise.
+
+The sheet can still be edited by hand while the daemon runs.  Before syncing
+a batch, and every revision_interval seconds, the daemon compares the
+worksheet's revision (see snapshot.sheet_revision) with the one it last saw
+and reloads the adapter if it changed.  After a batch it keeps the revision
+read right after the batch was written, so its own writes don't make it
+reload; an edit made by hand while a batch is being written can be missed
+until the next one.  A worksheet without a revision is never reloaded.
+
+A batch that fails to sync is tried again after retry_delay seconds, then
+after twice that and so on, together with any new files of the same job.
+After max_attempts failures its files are given up on (parked) and logged,
+until they change again.
+"""
+import fnmatch
+import glob
+import logging
+import os
+import time
+
+try:
+    import inotify_simple
+except ImportError:  # not installed, or not on Linux; fall back to polling
+    inotify_simple = None
+
+from sync_google_spreadsheet.metrics import NULL_METRICS
+from sync_google_spreadsheet.snapshot import sheet_revision
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_REVISION_INTERVAL = 60.0
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_RETRY_DELAY = 30.0
+DEFAULT_MAX_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+
+class PollingWatcher(object):
+    """
+    Finds new and changed files by listing the watched directories every
+    interval seconds.  Files already there when a directory is watched are
+    not reported.
+    """
+
+    def __init__(self, interval=DEFAULT_POLL_INTERVAL, clock=time.time,
+                 sleep=time.sleep):
+        # type: (float, Callable, Callable) -> None
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.directories = []
+        # path -> (mtime, size) when last seen
+        self.seen = {}
+
+    def watch(self, directory):
+        # type: (str) -> None
+        self.directories.append(directory)
+        self._scan()
+
+    def _scan(self):
+        changed = []
+        for directory in self.directories:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                state = (st.st_mtime, st.st_size)
+                if self.seen.get(path) != state:
+                    self.seen[path] = state
+                    changed.append(path)
+        return changed
+
+    def wait(self, timeout):
+        # type: (float) -> List[str]
+        """Paths changed since the last call, waiting up to timeout."""
+        deadline = self.clock() + timeout
+        while True:
+            changed = self._scan()
+            if changed:
+                return changed
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return []
+            self.sleep(min(self.interval, remaining))
+
+
+class InotifyWatcher(object):
+    """
+    Finds files written or moved into the watched directories through
+    inotify.  Needs inotify_simple.
+    """
+
+    def __init__(self):
+        if inotify_simple is None:
+            raise Exception("InotifyWatcher needs inotify_simple")
+        self.inotify = inotify_simple.INotify()
+        # watch descriptor -> directory
+        self.directories = {}
+
+    def watch(self, directory):
+        # type: (str) -> None
+        flags = inotify_simple.flags
+        wd = self.inotify.add_watch(directory,
+                                    flags.CLOSE_WRITE | flags.MOVED_TO)
+        self.directories[wd] = directory
+
+    def wait(self, timeout):
+        # type: (float) -> List[str]
+        events = self.inotify.read(timeout=int(max(timeout, 0) * 1000))
+        return [os.path.join(self.directories[event.wd], event.name)
+                for event in events
+                if event.wd in self.directories and event.name]
+
+
+def make_watcher(poll_interval=DEFAULT_POLL_INTERVAL):
+    # type: (float) -> Any
+    """An InotifyWatcher if inotify is available, else a PollingWatcher."""
+    if inotify_simple is not None:
+        try:
+            return InotifyWatcher()
+        except (OSError, IOError):
+            pass
+    return PollingWatcher(poll_interval)
+
+
+class Job(object):
+    """
+    A SheetAdapter and the input files that feed it.
+
+    process(adapter, paths) syncs the files at paths, which match pattern in
+    one of directories, into the loaded adapter; it is expected to call
+    adapter.sync() (merge() does by default).  columns is passed to
+    adapter.load().
+    """
+
+    def __init__(self, name, adapter, process, directories, pattern='*.csv',
+                 columns=None):
+        # type: (str, SheetAdapter, Callable, List[str], str, List[str]) -> None
+        self.name = name
+        self.adapter = adapter
+        self.process = process
+        self.directories = [os.path.abspath(os.path.expanduser(directory))
+                            for directory in directories]
+        self.pattern = pattern
+        self.columns = columns
+        # worksheet revision the adapter is known to be current with
+        self.revision = None
+
+    def matches(self, path):
+        # type: (str) -> bool
+        directory, name = os.path.split(os.path.abspath(path))
+        return directory in self.directories and \
+            fnmatch.fnmatch(name, self.pattern)
+
+    def existing(self):
+        # type: () -> List[str]
+        """The matching files already in the directories."""
+        return sorted(path for directory in self.directories
+                      for path in glob.glob(os.path.join(directory,
+                                                         self.pattern)))
+
+    def load(self):
+        # type: () -> None
+        self.adapter.load(self.columns)
+        self.revision = sheet_revision(self.adapter.sheet)
+
+    def stale(self):
+        # type: () -> bool
+        """whether the sheet changed since it was loaded or last synced"""
+        if self.revision is None:
+            return False
+        return sheet_revision(self.adapter.sheet) != self.revision
+
+    def refresh(self):
+        # type: () -> bool
+        """Reload the adapter if the sheet is stale; True if it was."""
+        stale = self.stale()
+        if self.adapter.dirty:
+            # left over from a batch that failed to sync; a load would lose it
+            self.adapter.sync()
+            if not stale:
+                self.revision = sheet_revision(self.adapter.sheet)
+        if stale:
+            self.load()
+        return stale
+
+    def sync(self, paths):
+        # type: (List[str]) -> None
+        self.refresh()
+        self.process(self.adapter, paths)
+        # our own writes moved the revision on
+        self.revision = sheet_revision(self.adapter.sheet)
+
+
+class _Retry(object):
+    """Failed paths of a job, and when to try them again."""
+    __slots__ = ('paths', 'attempts', 'due')
+
+    def __init__(self, paths, attempts, due):
+        self.paths = paths
+        self.attempts = attempts
+        self.due = due
+
+
+class Daemon(object):
+    """
+    Runs jobs as their files arrive.  watcher defaults to make_watcher().
+    With catch_up, files already in the directories are synced at start.
+    A failed batch is retried after retry_delay seconds, doubling, up to
+    max_attempts tries in all.
+    """
+
+    def __init__(self, jobs, watcher=None, debounce=DEFAULT_DEBOUNCE,
+                 max_delay=DEFAULT_MAX_DELAY,
+                 revision_interval=DEFAULT_REVISION_INTERVAL, catch_up=True,
+                 retry_delay=DEFAULT_RETRY_DELAY,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, metrics=None,
+                 clock=time.time):
+        # type: (List[Job], Any, float, float, float, bool, float, int, metrics.Metrics, Callable) -> None
+        self.jobs = list(jobs)
+        self.watcher = watcher if watcher is not None else make_watcher()
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.revision_interval = revision_interval
+        self.catch_up = catch_up
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.metrics = metrics or NULL_METRICS
+        self.clock = clock
+        # job name -> set of paths waiting to be synced
+        self.pending = {}
+        self.first_event = None
+        self.last_event = None
+        # job name -> _Retry of its failed batch
+        self.retrying = {}
+        # job name -> set of paths given up on
+        self.parked = {}
+        self.next_revision_check = None
+        self.started = False
+
+    def start(self):
+        # type: () -> None
+        """Load the jobs and start watching their directories."""
+        watched = set()
+        for job in self.jobs:
+            with self.metrics.timer('daemon.load'):
+                job.load()
+            for directory in job.directories:
+                if directory not in watched:
+                    self.watcher.watch(directory)
+                    watched.add(directory)
+            if self.catch_up:
+                self.add(job.existing())
+        self.next_revision_check = self.clock() + self.revision_interval
+        self.started = True
+
+    def add(self, paths):
+        # type: (Iterable[str]) -> None
+        """Queue paths for the jobs they match."""
+        now = self.clock()
+        for path in paths:
+            for job in self.jobs:
+                if job.matches(path):
+                    self.pending.setdefault(job.name, set()).add(path)
+                    self.parked.get(job.name, set()).discard(path)
+                    if self.first_event is None:
+                        self.first_event = now
+                    self.last_event = now
+
+    def _due(self):
+        # when the pending batch or a retry should be synced, None if
+        # nothing is pending
+        due = None
+        if self.first_event is not None:
+            due = min(self.last_event + self.debounce,
+                      self.first_event + self.max_delay)
+        for retry in self.retrying.values():
+            if due is None or retry.due < due:
+                due = retry.due
+        return due
+
+    def run_once(self):
+        # type: () -> None
+        """Wait for files or the next deadline, then do what is due."""
+        if not self.started:
+            self.start()
+        now = self.clock()
+        deadline = self.next_revision_check
+        due = self._due()
+        if due is not None:
+            deadline = min(deadline, due)
+        self.add(self.watcher.wait(max(0.0, deadline - now)))
+        now = self.clock()
+        due = self._due()
+        if due is not None and now >= due:
+            self.flush()
+        if now >= self.next_revision_check:
+            self.check_revisions()
+            self.next_revision_check = now + self.revision_interval
+
+    def run(self, should_stop=lambda: False):
+        # type: (Callable) -> None
+        """Run until should_stop() is true (forever by default)."""
+        while not should_stop():
+            self.run_once()
+
+    def flush(self):
+        # type: () -> None
+        """
+        Sync all pending files now, except those of jobs waiting to retry a
+        failed batch, which join the retry.
+        """
+        pending = self.pending
+        self.pending = {}
+        self.first_event = self.last_event = None
+        now = self.clock()
+        for job in self.jobs:
+            paths = pending.get(job.name, set())
+            retry = self.retrying.get(job.name)
+            if retry is not None:
+                retry.paths.update(paths)
+                if now < retry.due:
+                    continue
+                paths = retry.paths
+            if not paths:
+                continue
+            paths = sorted(paths)
+            self.metrics.count('daemon.batches')
+            self.metrics.count('daemon.files', len(paths))
+            try:
+                with self.metrics.timer('daemon.sync'):
+                    job.sync(paths)
+            except Exception:
+                # keep running, and try the files again later
+                self.metrics.count('daemon.errors')
+                logger.exception("%s: syncing %s failed", job.name,
+                                 ', '.join(paths))
+                self._failed(job, paths, retry)
+            else:
+                self.retrying.pop(job.name, None)
+
+    def _failed(self, job, paths, retry):
+        attempts = retry.attempts + 1 if retry is not None else 1
+        if attempts >= self.max_attempts:
+            self.retrying.pop(job.name, None)
+            self.parked.setdefault(job.name, set()).update(paths)
+            self.metrics.count('daemon.parked', len(paths))
+            logger.error("%s: giving up on %s after %d attempts", job.name,
+                         ', '.join(paths), attempts)
+            return
+        delay = self.retry_delay * (2 ** (attempts - 1))
+        self.retrying[job.name] = _Retry(set(paths), attempts,
+                                         self.clock() + delay)
+
+    def check_revisions(self):
+        # type: () -> None
+        """Reload the jobs whose sheet was changed by someone else."""
+        for job in self.jobs:
+            try:
+                with self.metrics.timer('daemon.refresh'):
+                    if job.refresh():
+                        self.metrics.count('daemon.reloads')
+            except Exception:
+                self.metrics.count('daemon.errors')
+                logger.exception("%s: reloading failed", job.name)
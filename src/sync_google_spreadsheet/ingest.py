@@ -0,0 +1,174 @@
+"""
+Streaming ingestion of CSV exports into one ordered stream of records.
+
+Each file is read a row at a time and sorted once by a key computed once per
+row.  Sorting holds at most max_rows rows in memory; beyond that sorted runs
+are spilled to temporary files and merged back.  The sorted files are then
+merged into one stream, and rows that appear in more than one export (for
+example statements downloaded for overlapping date ranges) are passed on
+once::
+
+    rows = ingest(glob.glob('~/Downloads/Checking*.csv'),
+                  sort_key=lambda row: mdy_dt(row['Date']),
+                  skip_before_header=True)
+"""
+import csv
+import heapq
+import pickle
+import tempfile
+from operator import itemgetter
+
+DEFAULT_MAX_ROWS = 100000
+
+
+def read_csv(path, skip_before_header=False, skip_after_header=False,
+             null_values=('null',)):
+    # type: (str, bool, bool, Tuple[str]) -> Iterator[Dict[str,str]]
+    """
+    Rows of a CSV file as dicts, read lazily.  skip_before_header skips a
+    line before the header, skip_after_header the first row after it;
+    values in null_values are read as ''.
+    """
+    with open(path, "r") as f:
+        if skip_before_header:
+            f.readline()
+        reader = csv.DictReader(f)
+        for row in reader:
+            if skip_after_header:
+                skip_after_header = False
+                continue
+            for name in row:
+                if row[name] in null_values:
+                    row[name] = ''
+            yield row
+
+
+def _spill(items):
+    f = tempfile.TemporaryFile()
+    for item in items:
+        pickle.dump(item, f, pickle.HIGHEST_PROTOCOL)
+    f.seek(0)
+    return f
+
+
+def _unspill(f):
+    try:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+    finally:
+        f.close()
+
+
+def sort_items(items, max_rows=DEFAULT_MAX_ROWS):
+    # type: (Iterable[Tuple[Any, Any]], int) -> Iterator[Tuple[Any, Any]]
+    """
+    Sort (key, value) pairs by key, keeping the input order of equal keys.
+    Runs of max_rows pairs are sorted in memory and spilled to temporary
+    files when there is more than one; values must then be picklable.
+    """
+    runs = []
+    buf = []
+    for item in items:
+        buf.append(item)
+        if len(buf) >= max_rows:
+            buf.sort(key=itemgetter(0))
+            runs.append(_spill(buf))
+            buf = []
+    buf.sort(key=itemgetter(0))
+    if not runs:
+        return iter(buf)
+    if buf:
+        runs.append(_spill(buf))
+    return merge_sorted([_unspill(f) for f in runs])
+
+
+def merge_sorted(streams):
+    # type: (List[Iterable[Tuple[Any, Any]]]) -> Iterator[Tuple[Any, Any]]
+    """
+    k-way merge of streams of (key, value) pairs each sorted by key.  Equal
+    keys come out in stream order, and values are never compared.
+    """
+    heap = []
+    iters = [iter(stream) for stream in streams]
+    for index, it in enumerate(iters):
+        for key, value in it:
+            heap.append((key, index, value))
+            break
+    heapq.heapify(heap)
+    while heap:
+        key, index, value = heap[0]
+        yield key, value
+        for key, value in iters[index]:
+            heapq.heapreplace(heap, (key, index, value))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+def _row_identity(row):
+    return tuple(sorted(row.items()))
+
+
+def dedupe(items, identity=_row_identity):
+    # type: (Iterable[Tuple[Any, Tuple[Any, Any]]], Callable) -> Iterator[Any]
+    """
+    Rows of (key, (source, row)) pairs sorted by key, with rows repeated
+    across sources dropped.  A row that occurs n times in one source is a
+    real repeat (two identical purchases on a day) and is kept n times;
+    across sources each row is passed on as many times as the source with
+    the most of it has it.  Rows with equal identity must have equal keys.
+    """
+    group_key = None
+    group = []
+
+    def flush():
+        kept = {}  # identity -> times passed on
+        seen = {}  # (source, identity) -> occurrences
+        for source, row in group:
+            ident = identity(row)
+            count = seen[source, ident] = seen.get((source, ident), 0) + 1
+            if count > kept.get(ident, 0):
+                kept[ident] = count
+                yield row
+
+    for key, (source, row) in items:
+        if group and key != group_key:
+            for kept_row in flush():
+                yield kept_row
+            group = []
+        group_key = key
+        group.append((source, row))
+    for kept_row in flush():
+        yield kept_row
+
+
+def ingest(paths, sort_key, identity=_row_identity,
+           max_rows=DEFAULT_MAX_ROWS, select=None, **read_options):
+    # type: (List[str], Callable, Callable, int, Callable, **Any) -> Iterator[Dict[str,str]]
+    """
+    Rows of all CSV files in paths, ordered by sort_key(row), with rows
+    repeated across files passed on once (see dedupe).  read_options go to
+    read_csv.  The files share max_rows: at most that many rows are held in
+    memory, the rest are sorted in runs on disk.
+
+    select(rows), if given, filters each file's rows as they are read,
+    before they are sorted; e.g. watermark.Watermark.skip.
+
+    Nothing is read until the first row is asked for.  Then every file is
+    read and sorted (sorting needs all of a file's rows), and the merged
+    rows are produced one at a time.
+    """
+    paths = list(paths)
+    per_file = max(1, max_rows // max(1, len(paths)))
+    streams = []
+    for source, path in enumerate(paths):
+        rows = read_csv(path, **read_options)
+        if select is not None:
+            rows = select(rows)
+        streams.append(sort_items(((sort_key(row), (source, row))
+                                   for row in rows), per_file))
+    for row in dedupe(merge_sorted(streams), identity):
+        yield row
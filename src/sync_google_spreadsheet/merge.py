@@ -0,0 +1,128 @@
+"""
+The merge from design.rst: fold a stream of records into a SheetAdapter,
+appending records whose key isn't in the sheet and updating chosen columns of
+the ones that are.
+
+Records are taken in batches.  For each batch every key is computed once, the
+batch is split into inserts, updates that change something and no-ops, and
+then the changes are applied together.
+"""
+from itertools import islice
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class MergeStats(object):
+    """What a merge did."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        # records not in the sheet that were not inserted (insert=False)
+        self.missing = 0
+        # records folded into an earlier record of their batch with the same
+        # key, which was not in the sheet
+        self.merged_duplicates = 0
+        self.batches = 0
+        # column name -> number of rows where it changed
+        self.changed_columns = {}
+
+    def as_dict(self):
+        # type: () -> Dict[str,Any]
+        return {'inserted': self.inserted, 'updated': self.updated,
+                'unchanged': self.unchanged, 'missing': self.missing,
+                'merged_duplicates': self.merged_duplicates,
+                'batches': self.batches,
+                'changed_columns': dict(self.changed_columns)}
+
+    def __repr__(self):
+        return ('<MergeStats inserted=%d updated=%d unchanged=%d missing=%d>'
+                % (self.inserted, self.updated, self.unchanged, self.missing))
+
+
+def _batches(records, size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def plan_batch(destination, batch, update_columns):
+    # type: (SheetAdapter, List[Dict[str,Any]], List[str]) -> Tuple
+    """
+    Split a batch into (inserts, updates, unchanged, duplicates).  inserts
+    is a list of (key, record); updates a list of (row, record, changed
+    column names); unchanged a list of (row, record).  A key repeated within
+    the batch is inserted once and its later records are folded into it as
+    updates; duplicates is the number of records folded that way.
+    """
+    keys = destination.keys_for(batch)
+    row_for_key = destination.row_for_key
+    inserts = []
+    pending = {}  # key -> index in inserts, for keys repeated in the batch
+    updates = []
+    unchanged = []
+    duplicates = 0
+    for key, record in zip(keys, batch):
+        row = row_for_key.get(key)
+        if row is None:
+            if key in pending:
+                # compare with the record that will be inserted
+                first = inserts[pending[key]][1]
+                changed = [name for name in update_columns
+                           if name in record and
+                           first.get(name) != record[name]]
+                for name in changed:
+                    first[name] = record[name]
+                duplicates += 1
+                continue
+            pending[key] = len(inserts)
+            inserts.append((key, dict(record)))
+            continue
+        changed = destination.changed_columns(row, record, update_columns)
+        if changed:
+            updates.append((row, record, changed))
+        else:
+            unchanged.append((row, record))
+    return inserts, updates, unchanged, duplicates
+
+
+def merge(destination, records, update_columns=None, insert=True,
+          batch_size=DEFAULT_BATCH_SIZE, sync=True):
+    # type: (SheetAdapter, Iterable[Dict[str,Any]], List[str], bool, int, bool) -> MergeStats
+    """
+    Merge records into a loaded destination adapter.
+
+    Records whose key is not in the sheet are appended (or only counted as
+    missing if insert is False).  For records already in the sheet, the
+    update_columns they carry are compared with the sheet and rewritten if
+    different.  Every record is counted once in the returned MergeStats, as
+    inserted (or missing), updated, unchanged or merged_duplicates.  With
+    sync, destination.sync() is called at the end.
+    """
+    update_columns = list(update_columns or [])
+    stats = MergeStats()
+    for batch in _batches(records, batch_size):
+        stats.batches += 1
+        inserts, updates, unchanged, duplicates = plan_batch(
+            destination, batch, update_columns)
+        if insert:
+            for key, record in inserts:
+                destination.append(record, key=key)
+            stats.inserted += len(inserts)
+        else:
+            stats.missing += len(inserts)
+        for row, record, changed in updates:
+            destination.update_row(row, record, changed)
+            for name in changed:
+                stats.changed_columns[name] = \
+                    stats.changed_columns.get(name, 0) + 1
+        stats.updated += len(updates)
+        stats.unchanged += len(unchanged)
+        stats.merged_duplicates += duplicates
+    if sync:
+        destination.sync()
+    return stats
@@ -0,0 +1,254 @@
+"""
+Timers and counters for SheetAdapter phases and worksheet calls.
+
+SheetAdapter uses NULL_METRICS unless given something else, which records
+nothing and costs a method call per phase.  A MetricsRecorder accumulates
+timers, counters and gauges and hands a summary to its sinks on flush(): a
+logger, a JSON run summary, or a Prometheus textfile-collector file.
+
+::
+
+    metrics = MetricsRecorder([LogSink(), JsonSummarySink('run.json')])
+    sheet = SchwabSheet(worksheet, 1, metrics=metrics)
+    sheet.load()
+    ...
+    sheet.sync()
+    metrics.flush()
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+
+from sync_google_spreadsheet.batch import cell_size
+from sync_google_spreadsheet.batch import value_size
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics(object):
+    """
+    Interface, and the do-nothing implementation.  Code that would do extra
+    work just to produce a value checks enabled first.
+    """
+    enabled = False
+
+    def timer(self, name):
+        # type: (str) -> ContextManager
+        """Context manager timing one occurrence of name."""
+        return _NULL_TIMER
+
+    def add_time(self, name, seconds, occurrences=1):
+        # type: (str, float, int) -> None
+        pass
+
+    def count(self, name, value=1):
+        # type: (str, int) -> None
+        pass
+
+    def gauge(self, name, value):
+        # type: (str, float) -> None
+        pass
+
+    def flush(self):
+        # type: () -> None
+        pass
+
+
+NULL_METRICS = Metrics()
+
+
+class _Timer(object):
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, timer() - self.start)
+        return False
+
+
+class MetricsRecorder(Metrics):
+    """Accumulates metrics in memory and passes a summary to sinks."""
+    enabled = True
+
+    def __init__(self, sinks=None):
+        # type: (List[Any]) -> None
+        self.sinks = list(sinks or [])
+        self.reset()
+
+    def reset(self):
+        # type: () -> None
+        self.timers = {}  # name -> [occurrences, total seconds, max seconds]
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+
+    def timer(self, name):
+        return _Timer(self, name)
+
+    def add_time(self, name, seconds, occurrences=1):
+        entry = self.timers.get(name)
+        if entry is None:
+            entry = self.timers[name] = [0, 0.0, 0.0]
+        entry[0] += occurrences
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def summary(self):
+        # type: () -> Dict[str,Any]
+        return {
+            'started': self.started,
+            'elapsed': time.time() - self.started,
+            'timers': dict((name, {'count': count, 'seconds': total,
+                                   'max_seconds': longest})
+                           for name, (count, total, longest)
+                           in self.timers.items()),
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+        }
+
+    def flush(self):
+        summary = self.summary()
+        for sink in self.sinks:
+            sink.write(summary)
+
+
+class LogSink(object):
+    """One log line per metric."""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('sync_google_spreadsheet')
+        self.level = level
+
+    def write(self, summary):
+        for name, t in sorted(summary['timers'].items()):
+            self.logger.log(self.level, "%s: %.3fs over %d (max %.3fs)",
+                            name, t['seconds'], t['count'], t['max_seconds'])
+        for name, value in sorted(summary['counters'].items()):
+            self.logger.log(self.level, "%s: %s", name, value)
+        for name, value in sorted(summary['gauges'].items()):
+            self.logger.log(self.level, "%s: %s", name, value)
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    getattr(os, 'replace', os.rename)(tmp, path)
+
+
+class JsonSummarySink(object):
+    """The summary of a run as a JSON file."""
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+
+    def write(self, summary):
+        _write_atomic(self.path, json.dumps(summary, indent=2,
+                                            sort_keys=True))
+
+
+class PrometheusTextfileSink(object):
+    """
+    The summary in the Prometheus exposition format, for node_exporter's
+    textfile collector.  labels are added to every sample.
+    """
+
+    def __init__(self, path, prefix='sync_google_spreadsheet', labels=None):
+        self.path = os.path.expanduser(path)
+        self.prefix = prefix
+        self.labels = labels or {}
+
+    def _name(self, name, suffix=''):
+        return re.sub(r'[^a-zA-Z0-9_]', '_',
+                      '%s_%s%s' % (self.prefix, name, suffix))
+
+    def _labels(self):
+        if not self.labels:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (key, value)
+                                 for key, value in sorted(self.labels.items()))
+
+    def write(self, summary):
+        labels = self._labels()
+        lines = []
+        for name, t in sorted(summary['timers'].items()):
+            metric = self._name(name, '_seconds')
+            lines.append('# TYPE %s summary' % metric)
+            lines.append('%s_sum%s %f' % (metric, labels, t['seconds']))
+            lines.append('%s_count%s %d' % (metric, labels, t['count']))
+        for name, value in sorted(summary['counters'].items()):
+            metric = self._name(name, '_total')
+            lines.append('# TYPE %s counter' % metric)
+            lines.append('%s%s %s' % (metric, labels, value))
+        for name, value in sorted(summary['gauges'].items()):
+            metric = self._name(name)
+            lines.append('# TYPE %s gauge' % metric)
+            lines.append('%s%s %s' % (metric, labels, value))
+        _write_atomic(self.path, '\n'.join(lines) + '\n')
+
+
+class InstrumentedSheet(object):
+    """
+    Wraps a worksheet so every method call is timed as backend.<method>.
+    range() also counts cells_fetched, update_cells() and batch_update()
+    count cells_written and bytes_sent.  Attributes and hasattr() behave as
+    on the wrapped worksheet.
+    """
+
+    def __init__(self, sheet, metrics):
+        self._sheet = sheet
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._sheet, name)
+        if not callable(attr):
+            return attr
+        metrics = self._metrics
+
+        def call(*args, **kwargs):
+            with metrics.timer('backend.' + name):
+                result = attr(*args, **kwargs)
+            if name == 'range':
+                metrics.count('cells_fetched', len(result))
+            elif name == 'update_cells':
+                cells = args[0]
+                metrics.count('cells_written', len(cells))
+                metrics.count('bytes_sent',
+                              sum(cell_size(cell) for cell in cells))
+            elif name == 'batch_update':
+                values = [value for item in args[0]
+                          for row in item['values'] for value in row]
+                metrics.count('cells_written', len(values))
+                metrics.count('bytes_sent',
+                              sum(value_size(value) for value in values))
+            return result
+        return call
@@ -0,0 +1,232 @@
+"""
+Memoized parsers for the values keys are made of, and keys declared by type.
+
+A sheet repeats the same strings many times over: a date is shared by every
+transaction of that day, and the records merged into a sheet repeat what is
+already in it.  Each Parser keeps a bounded LRU cache of what it returned for
+a string, with hit and miss counts, so the same date or amount is parsed once
+per run instead of once per row.
+
+Key declares a key as typed columns instead of a hand-written row_to_key::
+
+    key = Key([('Date', mdy_date), ('Withdrawal (-)', dollars),
+               ('Deposit (+)', dollars), ('Description', text)],
+              format="%s-%s-%s-%s")
+    adapter = SheetAdapter(sheet, 1, key, non_empty_column='Date')
+
+A SheetAdapter given a Key takes its key_columns and columns_to_keys from it.
+"""
+import datetime
+import re
+from collections import OrderedDict
+
+DEFAULT_MAXSIZE = 10000
+
+# every Parser created, for cache_stats()
+_parsers = []
+
+
+class LRUCache(object):
+    """Mapping of at most maxsize entries, dropping the least recently used."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        # type: (int) -> None
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, compute):
+        # type: (Any, Callable) -> Any
+        """The value for key, calling compute(key) and storing it on a miss."""
+        data = self.data
+        try:
+            value = data.pop(key)
+        except KeyError:
+            self.misses += 1
+            value = compute(key)
+            if len(data) >= self.maxsize:
+                data.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+        data[key] = value
+        return value
+
+    def clear(self):
+        # type: () -> None
+        self.data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        # type: () -> Dict[str,int]
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self.data),
+                'maxsize': self.maxsize}
+
+
+class Parser(object):
+    """
+    A memoized parse function.  Calling it parses one value; column() parses
+    a list of values, passing the ones not in the cache to many() at once if
+    it was given (a vectorized form of parse), else to parse one by one.
+    """
+
+    def __init__(self, parse, name, maxsize=DEFAULT_MAXSIZE, many=None):
+        # type: (Callable, str, int, Callable) -> None
+        self.parse = parse
+        self.name = name
+        self.many = many
+        self.cache = LRUCache(maxsize)
+        _parsers.append(self)
+
+    def __call__(self, value):
+        return self.cache.get(value, self.parse)
+
+    def column(self, values):
+        # type: (List[Any]) -> List[Any]
+        cache = self.cache
+        parsed = {}
+        missing = []
+        for value in set(values):
+            if value in cache.data:
+                parsed[value] = cache.get(value, self.parse)
+            else:
+                missing.append(value)
+        if missing and self.many is not None:
+            for value, result in zip(missing, self.many(missing)):
+                parsed[value] = cache.get(value, lambda _: result)
+        else:
+            for value in missing:
+                parsed[value] = cache.get(value, self.parse)
+        return [parsed[value] for value in values]
+
+    def stats(self):
+        # type: () -> Dict[str,int]
+        return self.cache.stats()
+
+    def __repr__(self):
+        return '<Parser %s>' % self.name
+
+
+def cache_stats():
+    # type: () -> Dict[str,Dict[str,int]]
+    """
+    Cache statistics of every parser, by parser name; parsers sharing a name
+    are added up.
+    """
+    stats = {}
+    for parser in _parsers:
+        total = stats.get(parser.name)
+        if total is None:
+            stats[parser.name] = parser.stats()
+        else:
+            for name, value in parser.stats().items():
+                total[name] += value
+    return stats
+
+
+def date(fmt, maxsize=DEFAULT_MAXSIZE):
+    # type: (str, int) -> Parser
+    """Parser of strings in strptime format fmt to datetimes."""
+    def parse(value):
+        return datetime.datetime.strptime(value, fmt)
+    return Parser(parse, 'date ' + fmt, maxsize)
+
+
+def _dollars(value):
+    match = re.match(r"\$?([\d\.,]+)", value)
+    if match:
+        return match.group(1).replace(',', '')
+    return ''
+
+
+def _amount(value):
+    return float(value.replace('$', '').replace(',', ''))
+
+
+def timestamp(tz, maxsize=DEFAULT_MAXSIZE, format=None):
+    # type: (str, int, str) -> Parser
+    """
+    Parser of strings (or Timestamps) to pandas Timestamps in timezone tz, as
+    pd.Timestamp(value, tz=tz).  Each distinct value of a column is parsed on
+    its own: pd.to_datetime would guess one format for the whole column and
+    read values in other formats differently.
+
+    With format, the strptime format all values are in, a column is parsed
+    with one pd.to_datetime(values, format=format) call instead, and single
+    values the same way.  Needs pandas.
+    """
+    def parse(value):
+        import pandas as pd
+        return pd.Timestamp(value, tz=tz)
+
+    def many(values):
+        import pandas as pd
+        index = pd.DatetimeIndex(pd.to_datetime(values, format=format))
+        if index.tz is None:
+            index = index.tz_localize(tz)
+        else:
+            index = index.tz_convert(tz)
+        return list(index)
+
+    if format is None:
+        return Parser(parse, 'timestamp ' + tz, maxsize)
+    return Parser(lambda value: many([value])[0],
+                  'timestamp %s %s' % (tz, format), maxsize, many)
+
+
+def text(value):
+    """the value as is"""
+    return value
+
+
+#: 01/31/2018 -> datetime
+mdy_date = date('%m/%d/%Y')
+#: '$1,234.50' -> '1234.50', '' if there is no amount
+dollars = Parser(_dollars, 'dollars')
+#: '-$1,234.50' -> -1234.5
+amount = Parser(_amount, 'amount')
+
+
+class Key(object):
+    """
+    A key made of typed columns: a list of (column name, Parser), where a
+    plain function such as text can stand in for a Parser.  The key of
+    a row is its parsed values formatted with format, or as a tuple without
+    a format; a single column without a format is keyed by its parsed value.
+    A Key is called like row_to_key.
+    """
+
+    def __init__(self, columns, format=None):
+        # type: (List[Tuple[str, Parser]], str) -> None
+        self.types = list(columns)
+        self.columns = [name for name, _ in self.types]
+        self.format = format
+
+    def _make(self, values):
+        if self.format is not None:
+            return self.format % values
+        if len(values) == 1:
+            return values[0]
+        return values
+
+    def __call__(self, row):
+        # type: (Dict[str,Any]) -> Any
+        return self._make(tuple(parse(row[name])
+                                for name, parse in self.types))
+
+    def columns_to_keys(self, columns):
+        # type: (Dict[str,List[Any]]) -> List[Any]
+        """Keys of the rows of columns, for SheetAdapter's columns_to_keys."""
+        parsed = []
+        for name, parse in self.types:
+            if isinstance(parse, Parser):
+                parsed.append(parse.column(columns[name]))
+            elif parse is text:
+                parsed.append(columns[name])
+            else:
+                parsed.append([parse(value) for value in columns[name]])
+        make = self._make
+        return [make(values) for values in zip(*parsed)]
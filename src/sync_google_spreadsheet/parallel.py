@@ -0,0 +1,83 @@
+"""
+Run a CPU-bound per-record function over a process pool, keeping order.
+
+Records are sent to the workers in chunks, to keep the cost of pickling them
+back and forth small next to the work, and results come back in input order
+so they can be fed straight into a single writer such as merge()::
+
+    rows = parallel_map(annotate, ingest(paths, sort_key), processes=8,
+                        initializer=load_rules, initargs=(rule_sheet_rows,))
+    merge(sheet, rows)
+
+func and initializer must be picklable (module-level functions) where
+processes are spawned rather than forked.  initializer(*initargs) runs once
+in each worker, which is where per-worker state such as a compiled RuleSet
+should be built or installed.
+"""
+import multiprocessing
+from collections import deque
+from itertools import islice
+
+DEFAULT_CHUNK_SIZE = 500
+# chunks in flight per process
+DEFAULT_PENDING = 4
+
+# the function being mapped, in a worker
+_func = None
+
+
+def _init_worker(func, initializer, initargs):
+    global _func
+    _func = func
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_chunk(chunk):
+    func = _func
+    return [func(item) for item in chunk]
+
+
+def _chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_map(func, items, processes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 initializer=None, initargs=(), pending=DEFAULT_PENDING):
+    # type: (Callable, Iterable[Any], int, int, Callable, Tuple, int) -> Iterator[Any]
+    """
+    func(item) for each of items, in order, computed by processes workers
+    (one per CPU by default).  items is consumed lazily: at most
+    pending * processes chunks are in flight.  With processes=1 everything
+    runs in this process, initializer included.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield func(item)
+        return
+
+    pool = multiprocessing.Pool(processes, _init_worker,
+                                (func, initializer, initargs))
+    try:
+        in_flight = deque()
+        for chunk in _chunks(items, chunk_size):
+            in_flight.append(pool.apply_async(_run_chunk, (chunk,)))
+            if len(in_flight) >= pending * processes:
+                for result in in_flight.popleft().get():
+                    yield result
+        while in_flight:
+            for result in in_flight.popleft().get():
+                yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,255 @@
+"""
+The stream -> annotate -> merge stages of design.rst as a lazy pipeline.
+
+A Pipeline wraps a source iterable and chains stages onto it.  Nothing runs
+until the pipeline is iterated, normally by merge(), and records flow through
+one at a time.  A stage can run in its own thread, connected to the rest by
+a bounded queue, so a slow source (a web client, a scraper) fetches ahead
+while records are annotated and merged.  concurrent() interleaves several
+sources, each read by its own thread::
+
+    rows = Pipeline(concurrent([ingest(paths, sort_key), beddit_rows()]),
+                    metrics=metrics)
+    rows.map(annotate, 'annotate').filter(is_recent, 'recent')
+    stats = merge(sheet, rows)
+    print(rows.stats())
+
+A consumer that stops early (closes the iterator, or stops on an exception)
+stops the threads feeding it too; they close their sources and exit.
+
+Every stage counts the records that went in and came out and the time spent
+in its function, and reports them to metrics as pipeline.<stage>.in/out
+counters and a pipeline.<stage> timer when the pipeline is exhausted.
+"""
+import threading
+
+try:
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
+from sync_google_spreadsheet.metrics import NULL_METRICS
+from sync_google_spreadsheet.metrics import timer
+
+DEFAULT_QUEUE_SIZE = 1000
+# seconds a blocked thread waits on a full queue before checking if the
+# consumer stopped
+PUT_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class _Failed(object):
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _close(iterable):
+    # close a generator, running its finally blocks
+    close = getattr(iterable, 'close', None)
+    if close is not None:
+        close()
+
+
+def _put(q, item, stop):
+    # put item unless stop is set first; False if it was
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=PUT_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _pump(iterable, q, stop):
+    try:
+        for item in iterable:
+            if not _put(q, item, stop):
+                return
+    except Exception as e:
+        _put(q, _Failed(e), stop)
+    else:
+        _put(q, _DONE, stop)
+    finally:
+        _close(iterable)
+
+
+def _start(iterable, q, stop):
+    thread = threading.Thread(target=_pump, args=(iterable, q, stop))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def threaded(iterable, queue_size=DEFAULT_QUEUE_SIZE):
+    # type: (Iterable[Any], int) -> Iterator[Any]
+    """
+    The items of iterable, produced by a background thread up to queue_size
+    items ahead of the consumer.  An exception in the thread is raised here.
+    """
+    return concurrent([iterable], queue_size)
+
+
+def concurrent(sources, queue_size=DEFAULT_QUEUE_SIZE):
+    # type: (List[Iterable[Any]], int) -> Iterator[Any]
+    """
+    The items of all sources, each read by its own thread, in the order they
+    arrive.  At most queue_size items are buffered.  The threads stop when
+    the returned iterator is exhausted, closed or raises.
+    """
+    q = queue.Queue(queue_size)
+    stop = threading.Event()
+    remaining = 0
+    try:
+        for source in sources:
+            _start(source, q, stop)
+            remaining += 1
+        while remaining:
+            item = q.get()
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, _Failed):
+                raise item.error
+            else:
+                yield item
+    finally:
+        stop.set()
+
+
+class StageStats(object):
+    """Throughput of one stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        # type: () -> Dict[str,Any]
+        return {'in': self.items_in, 'out': self.items_out,
+                'seconds': self.seconds}
+
+    def __repr__(self):
+        return '<StageStats %s in=%d out=%d %.3fs>' % (
+            self.name, self.items_in, self.items_out, self.seconds)
+
+
+def _map(upstream, func, stats):
+    for item in upstream:
+        stats.items_in += 1
+        start = timer()
+        item = func(item)
+        stats.seconds += timer() - start
+        stats.items_out += 1
+        yield item
+
+
+def _filter(upstream, predicate, stats):
+    for item in upstream:
+        stats.items_in += 1
+        start = timer()
+        keep = predicate(item)
+        stats.seconds += timer() - start
+        if keep:
+            stats.items_out += 1
+            yield item
+
+
+def _count_in(upstream, stats):
+    for item in upstream:
+        stats.items_in += 1
+        yield item
+
+
+def _count_out(downstream, stats):
+    for item in downstream:
+        stats.items_out += 1
+        yield item
+
+
+class Pipeline(object):
+    """
+    A source and the stages applied to it; iterating it runs them.  Stage
+    methods return the pipeline so they can be chained.  A pipeline can be
+    iterated once.
+    """
+
+    def __init__(self, source, metrics=None):
+        # type: (Iterable[Any], metrics.Metrics) -> None
+        self.metrics = metrics or NULL_METRICS
+        self.stages = []
+        self._iter = iter(source)
+        self._used = False
+
+    def _add(self, name, default):
+        stats = StageStats(name or '%s%d' % (default, len(self.stages)))
+        self.stages.append(stats)
+        return stats
+
+    def _threaded(self, thread, queue_size):
+        if thread:
+            self._iter = threaded(self._iter, queue_size)
+
+    def map(self, func, name=None, thread=False,
+            queue_size=DEFAULT_QUEUE_SIZE):
+        # type: (Callable, str, bool, int) -> Pipeline
+        """
+        Replace each record with func(record).  With thread, this stage and
+        the unthreaded stages before it run in a thread of their own, up to
+        queue_size records ahead of the next stage.
+        """
+        stats = self._add(name, 'map')
+        self._iter = _map(self._iter, func, stats)
+        self._threaded(thread, queue_size)
+        return self
+
+    def filter(self, predicate, name=None, thread=False,
+               queue_size=DEFAULT_QUEUE_SIZE):
+        # type: (Callable, str, bool, int) -> Pipeline
+        """Keep the records for which predicate(record) is true."""
+        stats = self._add(name, 'filter')
+        self._iter = _filter(self._iter, predicate, stats)
+        self._threaded(thread, queue_size)
+        return self
+
+    def apply(self, func, name=None, thread=False,
+              queue_size=DEFAULT_QUEUE_SIZE):
+        # type: (Callable, str, bool, int) -> Pipeline
+        """
+        Replace the stream with func(stream), for stages that work on the
+        whole stream, e.g. parallel_map() or a sort.  Its time isn't
+        separable from the stages before it and is not recorded.
+        """
+        stats = self._add(name, 'apply')
+        self._iter = _count_out(func(_count_in(self._iter, stats)), stats)
+        self._threaded(thread, queue_size)
+        return self
+
+    def __iter__(self):
+        if self._used:
+            raise Exception("Pipeline can only be iterated once")
+        self._used = True
+        try:
+            for item in self._iter:
+                yield item
+        finally:
+            # stops the threaded stages when the consumer stops early
+            _close(self._iter)
+            self._report()
+
+    def _report(self):
+        metrics = self.metrics
+        for stats in self.stages:
+            prefix = 'pipeline.' + stats.name
+            metrics.count(prefix + '.in', stats.items_in)
+            metrics.count(prefix + '.out', stats.items_out)
+            metrics.add_time(prefix, stats.seconds, stats.items_in)
+
+    def stats(self):
+        # type: () -> Dict[str,Dict[str,Any]]
+        """StageStats.as_dict() of each stage, by stage name."""
+        return dict((stats.name, stats.as_dict()) for stats in self.stages)
@@ -0,0 +1,127 @@
+"""
+Helpers for turning a scattered set of cell coordinates into rectangular
+ranges that can be written to the spreadsheet in as few pieces as possible,
+and for converting between coordinates and A1 notation.
+"""
+import re
+
+_A1 = re.compile(r'^\$?([A-Z]+)\$?(\d+)$')
+
+
+def runs(cols):
+    # type: (List[int]) -> List[Tuple[int,int]]
+    """
+    Split sorted column numbers into (first, last) runs of consecutive
+    columns.
+
+    >>> runs([0, 1, 2, 5, 7, 8])
+    [(0, 2), (5, 5), (7, 8)]
+    """
+    if not cols:
+        return []
+    found = []
+    start = prev = cols[0]
+    for col in cols[1:]:
+        if col != prev + 1:
+            found.append((start, prev))
+            start = col
+        prev = col
+    found.append((start, prev))
+    return found
+
+
+def cell_ranges(coords):
+    # type: (Iterable[Tuple[int,int]]) -> List[Tuple[int,int,int,int]]
+    """
+    Merge (row, col) coordinates into contiguous rectangles.
+
+    Each row is split into runs of adjacent columns, and a run is merged with
+    the identical run on the row directly above it.  Rectangles are returned
+    as (first_row, first_col, last_row, last_col), inclusive and sorted.
+
+    >>> cell_ranges([(3, 1), (3, 2), (4, 1), (4, 2), (4, 5)])
+    [(3, 1, 4, 2), (4, 5, 4, 5)]
+    """
+    by_row = {}
+    for row, col in coords:
+        by_row.setdefault(row, set()).add(col)
+
+    ranges = []
+    open_spans = {}  # (first_col, last_col) -> [first_row, last_row]
+    for row in sorted(by_row):
+        next_open = {}
+        for run in runs(sorted(by_row[row])):
+            span = open_spans.pop(run, None)
+            if span is not None and span[1] == row - 1:
+                span[1] = row
+            else:
+                if span is not None:
+                    ranges.append((span[0], run[0], span[1], run[1]))
+                span = [row, row]
+            next_open[run] = span
+        for run, span in open_spans.items():
+            ranges.append((span[0], run[0], span[1], run[1]))
+        open_spans = next_open
+    for run, span in open_spans.items():
+        ranges.append((span[0], run[0], span[1], run[1]))
+    return sorted(ranges)
+
+
+def rowcol_to_a1(row, col):
+    # type: (int, int) -> str
+    """
+    1-based row and column to A1 notation.
+
+    >>> rowcol_to_a1(4, 28)
+    'AB4'
+    """
+    label = ''
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        label = chr(ord('A') + rem) + label
+    return '%s%d' % (label, row)
+
+
+def range_to_a1(first_row, first_col, last_row, last_col):
+    # type: (int, int, int, int) -> str
+    """
+    Inclusive 1-based rectangle to an A1 range.
+
+    >>> range_to_a1(1, 1, 2, 3)
+    'A1:C2'
+    """
+    return '%s:%s' % (rowcol_to_a1(first_row, first_col),
+                      rowcol_to_a1(last_row, last_col))
+
+
+def a1_to_rowcol(label):
+    # type: (str) -> Tuple[int,int]
+    """
+    A1 notation to 1-based (row, col).
+
+    >>> a1_to_rowcol('AB4')
+    (4, 28)
+    """
+    match = _A1.match(label.upper())
+    if match is None:
+        raise Exception("Bad A1 cell %r" % label)
+    col = 0
+    for char in match.group(1):
+        col = col * 26 + ord(char) - ord('A') + 1
+    return int(match.group(2)), col
+
+
+def a1_to_range(label):
+    # type: (str) -> Tuple[int,int,int,int]
+    """
+    A1 range (optionally prefixed with a sheet name) to an inclusive 1-based
+    rectangle.
+
+    >>> a1_to_range("'Sheet 1'!A1:C2")
+    (1, 1, 2, 3)
+    """
+    label = label.rsplit('!', 1)[-1]
+    first, _, last = label.partition(':')
+    first_row, first_col = a1_to_rowcol(first)
+    last_row, last_col = a1_to_rowcol(last or first)
+    return first_row, first_col, last_row, last_col
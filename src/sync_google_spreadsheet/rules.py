@@ -0,0 +1,153 @@
+"""
+First-match-wins rule matching, compiled once.
+
+A rule matches a record by one of: its transaction type, its exact
+description, or a regular expression searched for in the description (the
+first of these the rule has is the one used).  Matching a list of rules one
+by one costs a re.search per rule per record; a RuleSet instead looks up
+exact descriptions and transaction types in dicts and tests all the patterns
+with a few combined regular expressions, then takes the matching rules in
+their original order.  The matching rules of each (description, type) are
+memoized, since the same merchants come back every month.
+
+::
+
+    rules = RuleSet([Rule(pattern='^SAFEWAY', value='Groceries'),
+                     Rule(exact='PAYROLL', value='Salary')])
+    rules.match('SAFEWAY #123').value  # 'Groceries'
+"""
+import re
+
+from sync_google_spreadsheet.normalize import LRUCache
+
+DEFAULT_CACHE_SIZE = 10000
+
+# groups per combined expression; python 2's re allows at most 100
+MAX_GROUPS = 90
+
+# a backreference would point at the wrong group once combined
+_BACKREF = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class Rule(object):
+    """One rule; value is whatever the caller wants back for a match."""
+    __slots__ = ('transtype', 'exact', 'pattern', 'value')
+
+    def __init__(self, transtype=None, exact=None, pattern=None, value=None):
+        self.transtype = transtype or None
+        self.exact = exact or None
+        self.pattern = pattern or None
+        self.value = value
+
+    def __repr__(self):
+        return '<Rule transtype=%r exact=%r pattern=%r>' % (
+            self.transtype, self.exact, self.pattern)
+
+
+class RuleSet(object):
+    """
+    Rules compiled for matching.  match() returns the first rule, in the
+    order given, that matches, as a linear scan with re.search would.
+    """
+
+    def __init__(self, rules, cache_size=DEFAULT_CACHE_SIZE):
+        # type: (Iterable[Rule], int) -> None
+        self.rules = list(rules)
+        self.by_transtype = {}  # type -> rule indexes
+        self.by_exact = {}  # description -> rule indexes
+        # rules matching everything: ones with no condition
+        self.always = []
+        patterns = []  # (rule index, compiled pattern)
+        for index, rule in enumerate(self.rules):
+            if rule.transtype:
+                self.by_transtype.setdefault(rule.transtype, []).append(index)
+            elif rule.exact:
+                self.by_exact.setdefault(rule.exact, []).append(index)
+            elif rule.pattern:
+                patterns.append((index, re.compile(rule.pattern)))
+            else:
+                self.always.append(index)
+        self.combined, self.separate = _combine(patterns)
+        self.cache = LRUCache(cache_size)
+
+    def candidates(self, description, transtype=None):
+        # type: (str, str) -> List[int]
+        """Indexes, in order, of the rules whose condition matches."""
+        return self.cache.get((description, transtype), self._candidates)
+
+    def _candidates(self, key):
+        description, transtype = key
+        found = list(self.always)
+        if transtype is not None:
+            found.extend(self.by_transtype.get(transtype, ()))
+        found.extend(self.by_exact.get(description, ()))
+        for regex, groups in self.combined:
+            match = regex.match(description)
+            for group, index in groups:
+                if match.group(group) is not None:
+                    found.append(index)
+        for index, regex in self.separate:
+            if regex.search(description):
+                found.append(index)
+        found.sort()
+        return found
+
+    def match(self, description, transtype=None, accept=None):
+        # type: (str, str, Callable) -> Optional[Rule]
+        """
+        The first rule matching description (and transtype, for rules by
+        transaction type) for which accept(rule) is true, or None.  Rules by
+        transaction type are only considered when transtype is given.
+        """
+        rules = self.rules
+        for index in self.candidates(description, transtype):
+            rule = rules[index]
+            if accept is None or accept(rule):
+                return rule
+        return None
+
+
+def _combine(patterns):
+    # type: (List[Tuple[int, Pattern]]) -> Tuple[List, List]
+    r"""
+    Group compiled patterns into combined expressions.  Each pattern becomes
+    an optional lookahead ``(?:(?=[\s\S]*?(pattern)))?`` so one match() at the
+    start of a description reports every pattern that occurs in it.  Returns
+    ([(combined regex, [(group, rule index)])], [(rule index, regex)]) where
+    the second list has the patterns that can't be combined.
+    """
+    combined = []
+    separate = []
+    chunk = []
+    used = 0
+
+    def flush():
+        parts = []
+        groups = []
+        group = 1
+        for index, regex in chunk:
+            parts.append(r'(?:(?=[\s\S]*?(%s)))?' % regex.pattern)
+            groups.append((group, index))
+            group += regex.groups + 1
+        try:
+            combined.append((re.compile(''.join(parts)), groups))
+        except (re.error, AssertionError, OverflowError, RuntimeError):
+            separate.extend(chunk)
+
+    for index, regex in patterns:
+        if regex.flags & ~re.UNICODE or \
+                _BACKREF.search(regex.pattern) or \
+                regex.groups + 1 > MAX_GROUPS:
+            # flags, e.g. (?i), apply to the whole combined expression
+            separate.append((index, regex))
+            continue
+        if chunk and used + regex.groups + 1 > MAX_GROUPS:
+            flush()
+            chunk = []
+            used = 0
+        chunk.append((index, regex))
+        used += regex.groups + 1
+    if chunk:
+        flush()
+    separate.sort()
+    return combined, separate
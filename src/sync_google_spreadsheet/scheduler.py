@@ -0,0 +1,316 @@
+"""
+Pacing and retrying of Sheets API calls.
+
+A Scheduler takes a token from a TokenBucket before each call, so calls
+stay under a requests-per-minute quota, and retries a call refused with
+HTTP 429 (or failing with a 5xx) after a jittered exponential backoff.  A
+SharedTokenBucket keeps its state in a lock file, so cron jobs that overlap
+share one quota instead of each assuming they have all of it::
+
+    scheduler = Scheduler(SharedTokenBucket('~/.sheets-quota', 60))
+    gss = scheduler.call(client.open, 'Finances')
+    worksheet = scheduler.wrap(scheduler.call(gss.worksheet, 'Checking'))
+    sheet = SchwabSheet(worksheet, 1)
+
+A wrapped worksheet retries only its reads (READS).  Other calls are paced
+but made once: a write the server may have applied before failing, such as
+add_rows() or add_worksheet(), must not be repeated blindly, and the
+SheetAdapter's BatchWriter already retries the batch writes it sends.
+
+A wrapped worksheet also coalesces reads: range() calls from several
+threads that overlap while waiting for a token are fetched as one request.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; buckets are then per process
+    fcntl = None
+
+DEFAULT_QUOTA_FILE = '~/.sheets-quota'
+DEFAULT_RETRIES = 6
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 64.0
+
+# methods of wrapped worksheets and spreadsheets that only read, and are
+# retried; everything else is called once
+READS = frozenset(['range', 'acell', 'cell', 'row_values', 'col_values',
+                   'get', 'get_all_values', 'get_all_records', 'batch_get',
+                   'fetch_sheet_metadata', 'worksheet', 'worksheets'])
+
+
+def status_code(error):
+    # type: (Exception) -> Optional[int]
+    """HTTP status of an API error, if it has one."""
+    code = getattr(error, 'status_code', None)
+    if code is None:
+        # gspread's APIError carries the requests response
+        response = getattr(error, 'response', None)
+        code = getattr(response, 'status_code', None)
+    return code
+
+
+def is_rate_limited(error):
+    # type: (Exception) -> bool
+    return status_code(error) == 429
+
+
+def is_retryable(error):
+    # type: (Exception) -> bool
+    code = status_code(error)
+    return code is not None and (code == 429 or 500 <= code < 600)
+
+
+class TokenBucket(object):
+    """
+    rate tokens a minute, at most burst (default: rate) saved up.  acquire()
+    takes one, sleeping until one is available.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        # type: (float, float, Callable, Callable) -> None
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _take(self, state, now):
+        # refill state ({'tokens', 'updated'}) to now and take a token if
+        # there is one; returns seconds to wait otherwise
+        elapsed = max(0.0, now - state['updated'])
+        tokens = min(self.burst, state['tokens'] + elapsed * self.rate / 60)
+        state['updated'] = now
+        if tokens >= 1:
+            state['tokens'] = tokens - 1
+            return 0.0
+        state['tokens'] = tokens
+        return (1 - tokens) * 60 / self.rate
+
+    def _update(self, func):
+        with self.lock:
+            state = {'tokens': self.tokens, 'updated': self.updated}
+            result = func(state)
+            self.tokens = state['tokens']
+            self.updated = state['updated']
+        return result
+
+    def acquire(self):
+        # type: () -> None
+        while True:
+            wait = self._update(lambda state: self._take(state, self.clock()))
+            if not wait:
+                return
+            self.sleep(wait)
+
+    def drain(self):
+        # type: () -> None
+        """
+        Empty the bucket, after the server said the quota is used up (by
+        someone else, or by calls this bucket doesn't see).
+        """
+        def empty(state):
+            state['tokens'] = min(state['tokens'], 0.0)
+        self._update(empty)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A TokenBucket whose state is in a file, locked while it is updated, so
+    all processes using the same path share the rate.  Without fcntl it
+    works as a TokenBucket of this process only.
+    """
+
+    def __init__(self, path, rate, burst=None, clock=time.time,
+                 sleep=time.sleep):
+        # type: (str, float, float, Callable, Callable) -> None
+        super(SharedTokenBucket, self).__init__(rate, burst, clock, sleep)
+        self.path = os.path.expanduser(path)
+
+    def _update(self, func):
+        if fcntl is None:
+            return super(SharedTokenBucket, self)._update(func)
+        with self.lock:
+            with open(self.path, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read())
+                        float(state['tokens']), float(state['updated'])
+                    except (ValueError, KeyError, TypeError):
+                        state = {'tokens': self.burst,
+                                 'updated': self.clock()}
+                    result = func(state)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return result
+
+
+class Scheduler(object):
+    """Runs calls at the bucket's pace, retrying throttled and failed ones."""
+
+    def __init__(self, bucket, retries=DEFAULT_RETRIES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 sleep=time.sleep, random=random.random):
+        # type: (TokenBucket, int, float, float, Callable, Callable) -> None
+        self.bucket = bucket
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.random = random
+        self.throttled = 0  # 429s seen
+        self.retried = 0
+
+    def delay(self, attempt):
+        # type: (int) -> float
+        """'Full jitter' backoff: uniform in [0, base * 2 ** attempt)."""
+        return self.random() * min(self.max_delay,
+                                   self.base_delay * (2 ** attempt))
+
+    def call(self, func, *args, **kwargs):
+        # type: (Callable, *Any, **Any) -> Any
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.retries:
+                    raise
+                if is_rate_limited(e):
+                    self.throttled += 1
+                    self.bucket.drain()
+                self.retried += 1
+                self.sleep(self.delay(attempt))
+                attempt += 1
+
+    def pace(self, func, *args, **kwargs):
+        # type: (Callable, *Any, **Any) -> Any
+        """Like call(), but func is called once and not retried."""
+        self.bucket.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if is_rate_limited(e):
+                self.throttled += 1
+                self.bucket.drain()
+            raise
+
+    def wrap(self, sheet):
+        # type: (Any) -> ScheduledSheet
+        return ScheduledSheet(sheet, self)
+
+
+def quota_scheduler(requests_per_minute=60, path=DEFAULT_QUOTA_FILE,
+                    **kwargs):
+    # type: (float, str, **Any) -> Scheduler
+    """
+    A Scheduler whose rate is shared, through the file at path, with every
+    process using the same path.  kwargs go to Scheduler.
+    """
+    return Scheduler(SharedTokenBucket(path, requests_per_minute), **kwargs)
+
+
+def _overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class _Read(object):
+    __slots__ = ('rect', 'done', 'cells', 'error')
+
+    def __init__(self, rect):
+        self.rect = rect
+        self.done = False
+        self.cells = None
+        self.error = None
+
+
+class ScheduledSheet(object):
+    """
+    A worksheet whose method calls go through a Scheduler: reads (READS)
+    with Scheduler.call, other methods with Scheduler.pace.  Attributes and
+    hasattr() behave as on the wrapped worksheet.
+    """
+
+    def __init__(self, sheet, scheduler):
+        self._sheet = sheet
+        self._scheduler = scheduler
+        self._lock = threading.Lock()
+        self._fetching = threading.Lock()
+        self._reads = []
+        self.coalesced = 0  # reads served by another read's request
+
+    def __getattr__(self, name):
+        attr = getattr(self._sheet, name)
+        if not callable(attr):
+            return attr
+        if name in READS:
+            run = self._scheduler.call
+        else:
+            run = self._scheduler.pace
+
+        def call(*args, **kwargs):
+            return run(attr, *args, **kwargs)
+        return call
+
+    def range(self, *args):
+        if len(args) != 4:
+            # an A1 label
+            return self._scheduler.call(self._sheet.range, *args)
+        read = _Read(tuple(args))
+        with self._lock:
+            self._reads.append(read)
+        while not read.done:
+            with self._fetching:
+                if not read.done:
+                    self._fetch(read)
+        if read.error is not None:
+            raise read.error
+        return read.cells
+
+    def _fetch(self, read):
+        # take read and the queued reads overlapping it, and fetch their
+        # bounding box once
+        with self._lock:
+            group = [read]
+            box = read.rect
+            grown = True
+            while grown:
+                grown = False
+                for other in self._reads:
+                    if other not in group and _overlaps(box, other.rect):
+                        group.append(other)
+                        box = (min(box[0], other.rect[0]),
+                               min(box[1], other.rect[1]),
+                               max(box[2], other.rect[2]),
+                               max(box[3], other.rect[3]))
+                        grown = True
+            for member in group:
+                self._reads.remove(member)
+        try:
+            cells = self._scheduler.call(self._sheet.range, *box)
+        except Exception as e:
+            for member in group:
+                member.error = e
+                member.done = True
+            return
+        width = box[3] - box[1] + 1
+        for member in group:
+            r1, c1, r2, c2 = member.rect
+            member.cells = [cells[(row - box[0]) * width + col - box[1]]
+                            for row in range(r1, r2 + 1)
+                            for col in range(c1, c2 + 1)]
+            member.done = True
+        self.coalesced += len(group) - 1
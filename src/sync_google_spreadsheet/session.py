@@ -0,0 +1,255 @@
+"""
+One authorized gspread client per process, with what it learns cached on
+disk between runs.
+
+A command that opens a spreadsheet by name normally loads the service
+account key, fetches an access token, searches Drive for the name and only
+then opens it.  A Session keeps the access token until it expires and the
+name -> spreadsheet key mapping in a cache directory, and hands out one
+client (and so one HTTP connection pool) and one worksheet object per name
+for the whole process::
+
+    session = shared_session(secrets['sheet']['secrets_file'])
+    sheet = session.worksheet(secrets['sheet']['name'], 'Checking')
+
+The token is checked again before every open and every call on a handed-out
+worksheet, and refreshed once it is within EXPIRY_MARGIN of expiring, so a
+long-running process (see daemon.py) keeps working after the first hour.
+
+gspread and oauth2client are imported when a session first needs them.
+"""
+import datetime
+import json
+import os
+import tempfile
+
+from sync_google_spreadsheet.scheduler import status_code
+
+DEFAULT_SCOPES = ("https://spreadsheets.google.com/feeds",)
+DEFAULT_CACHE_DIR = '~/.cache/sync_google_spreadsheet'
+# a cached token this close to expiring is not used
+EXPIRY_MARGIN = datetime.timedelta(minutes=5)
+
+_EXPIRY_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# os.rename can't replace an existing file on Windows
+_replace = getattr(os, 'replace', os.rename)
+
+# (secrets file, scopes) -> Session, see shared_session()
+_sessions = {}
+
+
+def load_secrets(path):
+    # type: (str) -> Dict[str,Any]
+    """The YAML secrets file at path."""
+    import yaml
+    with open(os.path.expanduser(path), "r") as f:
+        return yaml.safe_load(f)
+
+
+def _service_account_credentials(secrets_file, scopes):
+    from oauth2client.service_account import ServiceAccountCredentials
+    return ServiceAccountCredentials.from_json_keyfile_name(secrets_file,
+                                                            list(scopes))
+
+
+def _gspread_authorize(credentials):
+    import gspread
+    return gspread.authorize(credentials)
+
+
+def _gspread_refresh(client, credentials):
+    # gspread clients built on google-auth sessions refresh by themselves;
+    # older ones refresh in login(), which skips a token that is still set
+    login = getattr(client, 'login', None)
+    if login is None:
+        return
+    credentials.access_token = None
+    login()
+
+
+def _not_found(error):
+    # gspread >= 5 raises SpreadsheetNotFound, older versions an APIError
+    return type(error).__name__ == 'SpreadsheetNotFound' or \
+        status_code(error) == 404
+
+
+def _write_private(path, data):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.session-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.chmod(tmp, 0o600)
+    _replace(tmp, path)
+
+
+def _read(path):
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+class _CheckedWorksheet(object):
+    """A worksheet whose method calls first refresh an expiring token."""
+
+    def __init__(self, worksheet, session):
+        self._worksheet = worksheet
+        self._session = session
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr):
+            return attr
+        check_token = self._session.check_token
+
+        def call(*args, **kwargs):
+            check_token()
+            return attr(*args, **kwargs)
+        return call
+
+
+class Session(object):
+    """
+    Client, spreadsheets and worksheets for one service account.  If a
+    scheduler.Scheduler is given, every API call the session makes goes
+    through it and worksheets are returned wrapped by it.
+    """
+
+    def __init__(self, secrets_file, scopes=DEFAULT_SCOPES,
+                 cache_dir=DEFAULT_CACHE_DIR, scheduler=None,
+                 load_credentials=_service_account_credentials,
+                 authorize=_gspread_authorize, refresh=_gspread_refresh,
+                 clock=datetime.datetime.utcnow):
+        # type: (str, Tuple[str], str, scheduler.Scheduler, Callable, Callable, Callable, Callable) -> None
+        self.secrets_file = os.path.expanduser(secrets_file)
+        self.scopes = tuple(scopes)
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.scheduler = scheduler
+        self.load_credentials = load_credentials
+        self.authorize = authorize
+        self.refresh = refresh
+        self.clock = clock
+        name = os.path.splitext(os.path.basename(self.secrets_file))[0]
+        self.token_file = os.path.join(self.cache_dir, name + '.token.json')
+        self.keys_file = os.path.join(self.cache_dir, name + '.keys.json')
+        self._client = None
+        self._credentials = None
+        self._spreadsheets = {}
+        self._worksheets = {}
+
+    def _call(self, func, *args):
+        if self.scheduler is not None:
+            return self.scheduler.call(func, *args)
+        return func(*args)
+
+    def _cached_token(self, credentials):
+        token = _read(self.token_file)
+        if token.get('scopes') != list(self.scopes) or \
+                not token.get('access_token'):
+            return
+        try:
+            expiry = datetime.datetime.strptime(token['token_expiry'],
+                                                _EXPIRY_FORMAT)
+        except (KeyError, TypeError, ValueError):
+            return
+        if expiry - EXPIRY_MARGIN > self.clock():
+            credentials.access_token = token['access_token']
+            credentials.token_expiry = expiry
+
+    def _save_token(self, credentials):
+        expiry = getattr(credentials, 'token_expiry', None)
+        if not getattr(credentials, 'access_token', None) or expiry is None:
+            return
+        _write_private(self.token_file, {
+            'scopes': list(self.scopes),
+            'access_token': credentials.access_token,
+            'token_expiry': expiry.strftime(_EXPIRY_FORMAT),
+        })
+
+    @property
+    def client(self):
+        """The authorized gspread client, created on first use."""
+        if self._client is None:
+            credentials = self.load_credentials(self.secrets_file,
+                                                self.scopes)
+            self._cached_token(credentials)
+            self._client = self._call(self.authorize, credentials)
+            self._credentials = credentials
+            self._save_token(credentials)
+        return self._client
+
+    def check_token(self):
+        # type: () -> None
+        """Refresh the client's token if it expires within EXPIRY_MARGIN."""
+        if self._client is None:
+            return
+        credentials = self._credentials
+        expiry = getattr(credentials, 'token_expiry', None)
+        if expiry is None or expiry - EXPIRY_MARGIN > self.clock():
+            return
+        self._call(self.refresh, self._client, credentials)
+        self._save_token(credentials)
+
+    def open(self, name):
+        # type: (str) -> gspread.Spreadsheet
+        """
+        The spreadsheet called name, opened by its key when the key is
+        cached; a cached key whose spreadsheet is not found is looked up
+        again.  Any other error is raised.
+        """
+        spreadsheet = self._spreadsheets.get(name)
+        if spreadsheet is not None:
+            return spreadsheet
+        client = self.client
+        self.check_token()
+        keys = _read(self.keys_file)
+        key = keys.get(name)
+        spreadsheet = None
+        if key is not None:
+            try:
+                spreadsheet = self._call(client.open_by_key, key)
+            except Exception as e:
+                if not _not_found(e):
+                    raise
+        if spreadsheet is None:
+            spreadsheet = self._call(client.open, name)
+            keys[name] = spreadsheet.id
+            _write_private(self.keys_file, keys)
+        self._spreadsheets[name] = spreadsheet
+        return spreadsheet
+
+    def worksheet(self, spreadsheet_name, worksheet_name):
+        # type: (str, str) -> gspread.Worksheet
+        """
+        A worksheet of the spreadsheet called spreadsheet_name, which checks
+        the token before each call.
+        """
+        key = (spreadsheet_name, worksheet_name)
+        worksheet = self._worksheets.get(key)
+        if worksheet is None:
+            spreadsheet = self.open(spreadsheet_name)
+            self.check_token()
+            worksheet = self._call(spreadsheet.worksheet, worksheet_name)
+            if self.scheduler is not None:
+                worksheet = self.scheduler.wrap(worksheet)
+            worksheet = _CheckedWorksheet(worksheet, self)
+            self._worksheets[key] = worksheet
+        return worksheet
+
+
+def shared_session(secrets_file, scopes=DEFAULT_SCOPES, **kwargs):
+    # type: (str, Tuple[str], **Any) -> Session
+    """
+    The process' Session for a service account key file, created with
+    kwargs the first time it is asked for.
+    """
+    key = (os.path.expanduser(secrets_file), tuple(scopes))
+    session = _sessions.get(key)
+    if session is None:
+        session = _sessions[key] = Session(secrets_file, scopes, **kwargs)
+    return session
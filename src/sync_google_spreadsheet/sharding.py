@@ -0,0 +1,265 @@
+"""
+One logical table spread over several worksheets ("shards") of a
+spreadsheet, so a sheet that keeps growing doesn't have to be loaded and
+indexed whole on every run.
+
+The shards of a table are the worksheets titled "<prefix> <suffix>", each
+with the same header row, each wrapped by a SheetAdapter from make_adapter.
+Rows go to a shard in one of two ways:
+
+- by key: shard_for(key) names the suffix, e.g. the year of a date key::
+
+      table = ShardedAdapter(spreadsheet, lambda ws: SchwabSheet(ws, 1),
+                             'Checking',
+                             shard_for=lambda key: str(key[0].year))
+
+- by size, without shard_for: shards are numbered 1, 2, ... and rows are
+  appended to the last one until it holds max_rows rows, then to a new one.
+  Rows are assumed to be appended in key order, so that each shard holds
+  the keys from its first row's up to the next shard's first row's.
+
+Either way, a missing shard is added to the spreadsheet (add_worksheet)
+with the header row of the others when a row is routed to it.
+
+A ShardedAdapter can be used as merge()'s destination.  Shards are loaded
+when keys_for() (which merge() calls first for every batch) sees a key that
+may be in them, or up front with load(keys=...); row_for_key is the combined
+index of the loaded shards.  A run whose input covers the last month loads
+one shard, however many years the table holds.
+"""
+from sync_google_spreadsheet.metrics import NULL_METRICS
+from sync_google_spreadsheet.store import Cell
+
+DEFAULT_SHARD_ROWS = 1000
+
+
+class ShardedAdapter(object):
+    """
+    The shards of prefix in spreadsheet, a gspread Spreadsheet.
+    make_adapter(worksheet) returns the (not yet loaded) SheetAdapter for a
+    shard.  New shards get rows rows, or room for max_rows rows after the
+    header when sharding by size.  columns is passed to each shard's load().
+    """
+
+    def __init__(self, spreadsheet, make_adapter, prefix, shard_for=None,
+                 max_rows=None, rows=DEFAULT_SHARD_ROWS, columns=None,
+                 metrics=None):
+        # type: (gspread.Spreadsheet, Callable, str, Callable, int, int, List[str], metrics.Metrics) -> None
+        if shard_for is None and max_rows is None:
+            raise Exception("Must specify shard_for or max_rows")
+        self.spreadsheet = spreadsheet
+        self.make_adapter = make_adapter
+        self.prefix = prefix
+        self.shard_for = shard_for
+        self.max_rows = max_rows
+        self.rows = rows
+        self.columns = columns
+        self.metrics = metrics or NULL_METRICS
+        # suffix -> SheetAdapter, of every shard; in order for size shards
+        self.shards = None
+        # suffixes of the shards, in worksheet or number order
+        self.order = []
+        self.loaded = set()
+        # suffix -> key of the shard's first row (None if empty), by size
+        self.first_keys = {}
+        # key -> (suffix, row) for the rows of the loaded shards
+        self.row_for_key = {}
+
+    def title(self, suffix):
+        # type: (str) -> str
+        return '%s %s' % (self.prefix, suffix)
+
+    def _discover(self):
+        if self.shards is not None:
+            return
+        start = self.prefix + ' '
+        shards = [(worksheet.title[len(start):], worksheet)
+                  for worksheet in self.spreadsheet.worksheets()
+                  if worksheet.title.startswith(start)]
+        if self.shard_for is None:
+            shards = [(suffix, worksheet) for suffix, worksheet in shards
+                      if suffix.isdigit()]
+            shards.sort(key=lambda shard: int(shard[0]))
+        self.shards = dict((suffix, self.make_adapter(worksheet))
+                           for suffix, worksheet in shards)
+        self.order = [suffix for suffix, _ in shards]
+
+    def load(self, columns=None, keys=None):
+        # type: (List[str], Iterable[Any]) -> None
+        """
+        Load the shards keys can be in, or all of them if keys is None.
+        When sharding by size the last shard, which rows are appended to,
+        is always loaded.
+        """
+        if columns is not None:
+            self.columns = columns
+        self._discover()
+        if keys is None:
+            suffixes = list(self.order)
+        else:
+            suffixes = self._shards_for(list(keys))
+        if self.shard_for is None and self.order:
+            suffixes.append(self.order[-1])
+        for suffix in suffixes:
+            self._load_shard(suffix)
+
+    def _shards_for(self, keys):
+        # type: (List[Any]) -> List[str]
+        """suffixes of the existing shards keys may be in"""
+        if not keys:
+            return []
+        if self.shard_for is not None:
+            return [suffix for suffix in set(map(self.shard_for, keys))
+                    if suffix in self.shards]
+        low, high = min(keys), max(keys)
+        firsts = [(suffix, self._first_key(suffix)) for suffix in self.order]
+        wanted = []
+        for i, (suffix, first) in enumerate(firsts):
+            if first is None or first > high:
+                continue
+            following = [key for _, key in firsts[i + 1:] if key is not None]
+            if not following or following[0] >= low:
+                wanted.append(suffix)
+        return wanted
+
+    def _first_key(self, suffix):
+        # type: (str) -> Any
+        """key of the first row of a shard, read without loading it"""
+        if suffix not in self.first_keys:
+            adapter = self.shards[suffix]
+            start = adapter.start_row_for_updatable
+            # the header row and the first row after it
+            cells = adapter.sheet.range(1, 1, start + 1, adapter.columns)
+            names = [cell.value for cell in cells[:adapter.columns]]
+            values = [cell.value for cell in cells[-adapter.columns:]]
+            row = dict(zip(names, values))
+            if row.get(adapter.non_empty_column, '') == '':
+                self.first_keys[suffix] = None
+            else:
+                self.first_keys[suffix] = adapter.row_to_key(row)
+        return self.first_keys[suffix]
+
+    def _load_shard(self, suffix):
+        if suffix in self.loaded:
+            return
+        adapter = self.shards[suffix]
+        with self.metrics.timer('shard_load'):
+            adapter.load(self.columns)
+        self.metrics.count('shards_loaded')
+        for key, row in adapter.row_for_key.items():
+            if key in self.row_for_key:
+                raise Exception("Key %s must be unique" % (key,))
+            self.row_for_key[key] = (suffix, row)
+        self.loaded.add(suffix)
+
+    def _template(self):
+        # type: () -> SheetAdapter
+        """the last shard, for keys_for and the header row; not loaded"""
+        self._discover()
+        if not self.order:
+            raise Exception("No worksheet titled %s to start from"
+                            % self.title('...'))
+        return self.shards[self.order[-1]]
+
+    def _headers(self, adapter):
+        # type: (SheetAdapter) -> List[str]
+        """header row of a shard, read on its own if it isn't loaded"""
+        if adapter.column_to_column_name:
+            return [adapter.column_to_column_name[col]
+                    for col in range(adapter.columns)]
+        return [cell.value
+                for cell in adapter.sheet.range(1, 1, 1, adapter.columns)]
+
+    def _add_shard(self, suffix):
+        # type: (str) -> SheetAdapter
+        """Add a worksheet for a new shard, with the header row."""
+        template = self._template()
+        headers = self._headers(template)
+        start = template.start_row_for_updatable
+        if self.max_rows is not None:
+            rows = start + self.max_rows
+        else:
+            rows = max(self.rows, start + 1)
+        worksheet = self.spreadsheet.add_worksheet(title=self.title(suffix),
+                                                   rows=rows,
+                                                   cols=len(headers))
+        worksheet.update_cells([Cell(1, col + 1, name)
+                                for col, name in enumerate(headers)])
+        self.metrics.count('shards_added')
+        self.shards[suffix] = self.make_adapter(worksheet)
+        self.order.append(suffix)
+        self._load_shard(suffix)
+        return self.shards[suffix]
+
+    def _append_shard(self, key):
+        # type: (Any) -> str
+        """suffix of the shard a new row with key goes to"""
+        if self.shard_for is not None:
+            suffix = self.shard_for(key)
+            if suffix not in self.shards:
+                self._add_shard(suffix)
+            self._load_shard(suffix)
+            return suffix
+        self._template()
+        # the shard rows are appended to, loaded to know how full it is
+        suffix = self.order[-1]
+        self._load_shard(suffix)
+        if self.shards[suffix].next_empty_row > self.max_rows:
+            suffix = str(int(suffix) + 1)
+            self._add_shard(suffix)
+        return suffix
+
+    def keys_for(self, kvhashes):
+        # type: (List[Dict[str, Any]]) -> List[Any]
+        """
+        row_to_key of each of kvhashes, after loading the shards they may
+        be in.
+        """
+        keys = self._template().keys_for(kvhashes)
+        for suffix in self._shards_for(keys):
+            self._load_shard(suffix)
+        return keys
+
+    def row_to_key(self, kvhash):
+        # type: (Dict[str, Any]) -> Any
+        return self.keys_for([kvhash])[0]
+
+    def has(self, kvhash):
+        # type: (Dict[str, Any]) -> bool
+        return self.row_to_key(kvhash) in self.row_for_key
+
+    def row_for_kvhash(self, kvhash):
+        # type: (Dict[str, Any]) -> Tuple[str,int]
+        """(shard suffix, row) of kvhash's row"""
+        return self.row_for_key[self.row_to_key(kvhash)]
+
+    def append(self, kvhash, key=None):
+        # type: (Dict[str,Any], Any) -> None
+        """Add a row to the shard its key routes to."""
+        if key is None:
+            key = self.row_to_key(kvhash)
+        suffix = self._append_shard(key)
+        adapter = self.shards[suffix]
+        row = adapter.next_empty_row
+        adapter.append(kvhash, key=key)
+        self.row_for_key.setdefault(key, (suffix, row))
+        if row == 1 and self.shard_for is None:
+            self.first_keys[suffix] = key
+
+    def changed_columns(self, row, kvhash, names):
+        # type: (Tuple[str,int], Dict[str,Any], List[str]) -> List[str]
+        suffix, row = row
+        return self.shards[suffix].changed_columns(row, kvhash, names)
+
+    def update_row(self, row, kvhash, cols_to_update):
+        # type: (Tuple[str,int], Dict[str,Any], List[str]) -> None
+        suffix, row = row
+        self.shards[suffix].update_row(row, kvhash, cols_to_update)
+
+    def sync(self):
+        # type: () -> None
+        """Sync the shards with changes."""
+        for suffix in sorted(self.loaded):
+            adapter = self.shards[suffix]
+            if adapter.dirty:
+                adapter.sync()
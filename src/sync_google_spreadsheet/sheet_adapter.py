@@ -1,3 +1,57 @@
+import bisect
+import logging
+
+from sync_google_spreadsheet import batch
+from sync_google_spreadsheet.metrics import NULL_METRICS
+from sync_google_spreadsheet.metrics import InstrumentedSheet
+from sync_google_spreadsheet.metrics import timer
+from sync_google_spreadsheet.normalize import Key
+from sync_google_spreadsheet.ranges import cell_ranges
+from sync_google_spreadsheet.ranges import runs
+from sync_google_spreadsheet.snapshot import sheet_revision
+from sync_google_spreadsheet.store import Cell
+from sync_google_spreadsheet.store import ColumnStore
+from sync_google_spreadsheet.store import normalized
+
+# fewest rows added to a full sheet at a time; otherwise it doubles
+DEFAULT_MIN_GROWTH = 100
+# rows of non_empty_column in the first block load() reads to find the end
+# of the data; each further block is twice as big
+DEFAULT_PROBE_ROWS = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class CellView(object):
+    """
+    A cell of a SheetAdapter, read and written through the adapter's store.
+    row and col are 1-based sheet coordinates like a gspread Cell; setting
+    value marks the cell for the next sync().
+    """
+    __slots__ = ('_adapter', '_row', '_col')
+
+    def __init__(self, adapter, row, col):
+        self._adapter = adapter
+        self._row = row
+        self._col = col
+
+    @property
+    def row(self):
+        return self._adapter.start_row_for_updatable + self._row
+
+    @property
+    def col(self):
+        return self._col + 1
+
+    @property
+    def value(self):
+        return self._adapter.value_at(self._row, self._col)
+
+    @value.setter
+    def value(self, value):
+        self._adapter.set_value(self._row, self._col, value)
+
+
 class SheetAdapter(object):
     """
     Interface to a particular google spreadsheet that supports the operations
@@ -8,14 +62,68 @@ class SheetAdapter(object):
     """
 
     def __init__(self, sheet, start_row_for_updatable, row_to_key,
-                 non_empty_column=None):
+                 non_empty_column=None, key_columns=None, index_columns=None,
+                 snapshot=None, metrics=None,
+                 max_batch_cells=batch.DEFAULT_MAX_CELLS,
+                 max_batch_bytes=batch.DEFAULT_MAX_BYTES,
+                 sync_retries=batch.DEFAULT_RETRIES, columns_to_keys=None,
+                 min_growth=DEFAULT_MIN_GROWTH,
+                 probe_rows=DEFAULT_PROBE_ROWS):
         # type: (gspread.Spreadsheet) -> None
         """
         If non_empty_column specified, then if the value in that column name is
         empty, that row is considered empty for appending.  Otherwise each
         column in the row must be blank to be considered empty for append.
+
+        key_columns names the columns row_to_key reads.  It is only needed
+        for a projected load(), see there.
+
+        index_columns names columns to keep a value -> rows index for, used
+        by row_for_colval() and rows_for_colval().
+
+        snapshot is an optional snapshot.SnapshotCache that load() restores
+        from when the sheet hasn't changed, and that load() and sync() keep
+        up to date.
+
+        metrics is an optional metrics.Metrics that gets the time spent in
+        each phase, in row_to_key and in each worksheet call, and counts of
+        the cells moved.
+
+        max_batch_cells and max_batch_bytes bound each request sync() makes;
+        a request that fails is retried up to sync_retries times.
+
+        columns_to_keys is an optional batch form of row_to_key.  It is given
+        a dict of key column name -> list of values, one per row, and returns
+        the list of keys of those rows, so a key made from parsed timestamps
+        or amounts can be computed with one vectorized call per column.  It
+        is used by load() and keys_for() and needs key_columns; its keys
+        must equal what row_to_key returns for the same rows, which is still
+        used for single-row lookups.
+
+        row_to_key can also be a normalize.Key, which supplies key_columns
+        and columns_to_keys when they aren't given.
+
+        When append() runs out of rows, the sheet is grown with one add_rows
+        call by as many rows as it has (at least min_growth), so n appends
+        cost O(log n) resizes.
+
+        load() finds the end of the data by reading non_empty_column in
+        blocks of probe_rows, doubling, until the first blank cell, and
+        fetches the other columns only down to there.  Rows below that
+        blank are taken to be empty and are never read.
         """
+        if non_empty_column is None:
+            raise Exception("Must specify non_empty_column")
+
+        if isinstance(row_to_key, Key):
+            if key_columns is None:
+                key_columns = row_to_key.columns
+            if columns_to_keys is None:
+                columns_to_keys = row_to_key.columns_to_keys
 
+        self.metrics = metrics or NULL_METRICS
+        if self.metrics.enabled:
+            sheet = InstrumentedSheet(sheet, self.metrics)
         self.sheet = sheet
         self.columns = sheet.col_count
         self.rows = sheet.row_count
@@ -23,82 +131,491 @@ class SheetAdapter(object):
         self.start_row_for_updatable = start_row_for_updatable
         self.non_empty_column = non_empty_column
         self.row_to_key = row_to_key
+        self.key_columns = key_columns
+        self.columns_to_keys = columns_to_keys
+        self.min_growth = min_growth
+        self.probe_rows = probe_rows
+        # rows of the store read from the sheet; those below are blank
+        self.data_rows = None
 
         self.column_name_to_column = {}
         self.column_to_column_name = {}
         self.row_for_key = {}
-        self.cell_list = None
-        if self.non_empty_column is None:
-            raise Exception("Must specify non_empty_column")
+        # column index -> {value: sorted list of rows}
+        self.column_indexes = {}
+        self.index_columns = list(index_columns or [])
+        self.store = None
+        self.snapshot = snapshot
+        # (row, col) of cells changed since load or the last sync
+        self.dirty = set()
+        # writes dropped because the sheet already had the value
+        self.skipped_writes = 0
+        self.writer = batch.BatchWriter(sheet, max_cells=max_batch_cells,
+                                        max_bytes=max_batch_bytes,
+                                        retries=sync_retries)
+        if columns_to_keys is not None and key_columns is None:
+            raise Exception("Must specify key_columns for columns_to_keys")
+
+    def load(self, columns=None):
+        # type: (List[str]) -> None
+        """
+        load in Spreadsheet
+
+        The non_empty_column is read first, to find where the data ends,
+        and no column is fetched below that.
+
+        By default every column is fetched.  If columns is given (the names
+        of the columns the caller reads or updates), only those, the
+        key_columns and the non_empty_column are fetched; any other column is
+        fetched the first time one of its cells is asked for.
+
+        With a snapshot, an unchanged sheet is restored without fetching
+        anything.  If the sheet changed, the non_empty_column is read again
+        and compared with the snapshot's.  The loaded columns are refetched
+        only from the first row where it differs (or the old end of the
+        data, if it doesn't) down to the new end.  Rows above that are kept
+        from the snapshot, so a hand edit there that leaves the
+        non_empty_column alone is not seen; delete the snapshot file after
+        such edits.
+        """
+        with self.metrics.timer('load'):
+            self._load(columns)
+        self.metrics.gauge('index_size', len(self.row_for_key))
 
-    def load(self):
-        """load in Spreadsheet"""
+    def _load(self, columns):
+        # type: (List[str]) -> None
+        key_names = None
+        if columns is not None:
+            if self.key_columns is None:
+                raise Exception("Must specify key_columns for projected load")
+            key_names = list(self.key_columns)
+        if self.snapshot is not None and \
+                self._load_snapshot(columns, key_names):
+            return
+
+        # read before fetching, so an edit made while fetching makes the
+        # snapshot look outdated instead of current
+        revision = None
+        if self.snapshot is not None:
+            revision = self._revision()
+        self._load_headers()
+
+        # get updatable portion, down to the end of the data
+        self.store = ColumnStore(self._row_span(), self.columns)
+        self.store.load_column(self.non_empty_column_idx, self._find_end())
+        self.fetch_columns(self._wanted_columns(columns))
+        self._scan(key_names)
+        self._save_snapshot(revision)
+
+    def _load_headers(self):
+        # type: () -> None
         # Get headers
         headers = self.sheet.range(1, 1,
                                    2, self.columns)
+        self.column_name_to_column = {}
+        self.column_to_column_name = {}
         for column in range(self.columns):
             self.column_name_to_column[headers[column].value] = column
             self.column_to_column_name[column] = headers[column].value
+        self._find_non_empty_column()
 
-        # get updatable portion
-        self.cell_list = self.sheet.range(self.start_row_for_updatable, 1,
-                                          self.rows,
-                                          self.columns)
-        if self.non_empty_column is not None:
-            self.non_empty_column_idx = \
-                self.column_name_to_column[self.non_empty_column]
-
-        for row in range(1, self.rows):
-            # empty?
-            if self.non_empty_column:
-                if self.cell_at(row, self.non_empty_column_idx).value == '':
-                    self.next_empty_row = row
+    def _find_non_empty_column(self):
+        # type: () -> None
+        if self.non_empty_column is None:
+            raise Exception("Must specify non_empty_column")
+        if self.non_empty_column not in self.column_name_to_column:
+            raise Exception("No column %s in the header row"
+                            % self.non_empty_column)
+        self.non_empty_column_idx = \
+            self.column_name_to_column[self.non_empty_column]
+
+    def _find_end(self):
+        # type: () -> List[Any]
+        """
+        Read non_empty_column in blocks that double in size until a blank
+        cell (below the header row) or the bottom of the sheet, and set
+        data_rows to where the data ends.  Returns the column's values,
+        blank from data_rows down.
+        """
+        col = self.non_empty_column_idx + 1
+        start = self.start_row_for_updatable
+        span = self._row_span()
+        values = []
+        block = self.probe_rows
+        end = None
+        while end is None and len(values) < span:
+            first = len(values)
+            last = min(span, first + block)
+            values.extend(cell.value for cell in
+                          self.sheet.range(start + first, col,
+                                           start + last - 1, col))
+            for row in range(max(first, 1), last):
+                if values[row] == '':
+                    end = row
                     break
-            else:
-                raise Exception("Must specify non_empty_column")
-            key = self.row_to_key(self.row_as_dict(row))
+            block *= 2
+        if end is None:
+            end = span
+        self.data_rows = end
+        return values[:end] + [''] * (span - end)
+
+    def _wanted_columns(self, columns):
+        # type: (List[str]) -> List[int]
+        """column indexes a load(columns) fetches up front"""
+        if columns is None:
+            return list(range(self.columns))
+        wanted = set(columns) | set(self.index_columns)
+        wanted.update(self.key_columns)
+        wanted.add(self.non_empty_column)
+        return sorted(self.column_name_to_column[name] for name in wanted)
+
+    def _scan(self, key_names):
+        # type: (List[str]) -> None
+        """
+        Find the end of the data and build row_for_key and the column
+        indexes from the store.
+        """
+        with self.metrics.timer('key_index'):
+            self._scan_rows(key_names)
+
+    def _scan_rows(self, key_names):
+        # type: (List[str]) -> None
+        row_to_key = self.row_to_key
+        if self.metrics.enabled:
+            row_to_key = self._timed(row_to_key, 'row_to_key')
+        self.column_indexes = dict(
+            (self.column_name_to_column[name], {})
+            for name in self.index_columns)
+        self.row_for_key = {}
+        # the first row blank in non_empty_column, as found by _find_end();
+        # past the last row if the sheet is full, and the next append grows it
+        end = self.next_empty_row = self.data_rows
+        rows = range(1, end)
+        if self.columns_to_keys is not None:
+            keys = self._column_keys(end)
+        else:
+            keys = (row_to_key(self.row_as_dict(row, key_names))
+                    for row in rows)
+        for row, key in zip(rows, keys):
             if key in self.row_for_key:
                 raise Exception("Key %s must be unique" % key)
             self.row_for_key[key] = row
-        if self.next_empty_row is None:
-            self.next_empty_row = self.rows + 1
+            for col, index in self.column_indexes.items():
+                index.setdefault(self.store.get(row, col), []).append(row)
+
+    def _column_keys(self, end):
+        # type: (int) -> List[Any]
+        """keys of rows 1 .. end - 1 from one columns_to_keys call"""
+        columns = {}
+        for name in self.key_columns:
+            col = self.column_name_to_column[name]
+            self.fetch_columns([col])
+            columns[name] = self.store.column_values(col)[1:end]
+        with self.metrics.timer('columns_to_keys'):
+            keys = list(self.columns_to_keys(columns))
+        if len(keys) != end - 1:
+            raise Exception("columns_to_keys returned %d keys for %d rows"
+                            % (len(keys), end - 1))
+        return keys
+
+    def _timed(self, func, name):
+        # type: (Callable, str) -> Callable
+        add_time = self.metrics.add_time
+
+        def timed(*args):
+            start = timer()
+            result = func(*args)
+            add_time(name, timer() - start)
+            return result
+        return timed
+
+    def _layout(self):
+        # type: () -> Tuple
+        """what a snapshot must agree on to be usable"""
+        return (self.start_row_for_updatable, self.rows, self.columns,
+                self.non_empty_column, tuple(self.key_columns or ()),
+                tuple(self.index_columns))
+
+    def _load_snapshot(self, columns, key_names):
+        # type: (List[str], List[str]) -> bool
+        """
+        Restore from the snapshot, refetching the probed columns if the
+        sheet changed.  False if the snapshot can't be used and a full load
+        is needed.
+        """
+        state = self.snapshot.read()
+        revision = None
+        if state is not None and state['layout'] == self._layout():
+            revision = self._revision()
+        if revision is None:
+            self.metrics.count('snapshot_misses')
+            return False
+        self.column_to_column_name = dict(enumerate(state['headers']))
+        self.column_name_to_column = dict(
+            (name, column) for column, name in enumerate(state['headers']))
+        self.store = state['store']
+        self.row_for_key = state['row_for_key']
+        self.column_indexes = state['column_indexes']
+        self.next_empty_row = state['next_empty_row']
+        # snapshots from before data_rows was kept: read whole columns
+        self.data_rows = state.get('data_rows', self._row_span())
+        self._find_non_empty_column()
+        if state['revision'] == revision:
+            self.metrics.count('snapshot_hits')
+            return True
+
+        headers = state['headers']
+        self._load_headers()
+        if self.key_columns is None or \
+                [self.column_to_column_name[column]
+                 for column in range(self.columns)] != headers:
+            self.metrics.count('snapshot_misses')
+            return False
+        self.metrics.count('snapshot_refreshes')
+        self._refresh_rows()
+        self.fetch_columns(self._wanted_columns(columns))
+        self._scan(key_names)
+        self._save_snapshot(revision)
+        return True
+
+    def _refresh_rows(self):
+        # type: () -> None
+        """
+        Bring the store restored from a snapshot up to date: find the new
+        end of the data, and refetch the loaded columns from the first row
+        whose non_empty_column changed down to it.
+        """
+        col = self.non_empty_column_idx
+        # rows appended by the adapter count as read: they were written
+        old_end = max(self.data_rows, self.next_empty_row)
+        held = self.store.column_values(col)
+        values = self._find_end()
+        self.store.load_column(col, values)
+        end = self.data_rows
+        top = min(old_end, end)
+        for row in range(1, top):
+            if normalized(held[row]) != normalized(values[row]):
+                top = row
+                break
+        loaded = [other for other in range(self.columns)
+                  if other != col and self.store.loaded(other)]
+        if top < end:
+            for first, last in runs(loaded):
+                for other, rows in zip(range(first, last + 1),
+                                       self._read_region(first, last,
+                                                         top, end)):
+                    self.store.load_rows(other, top, rows)
+        if end < old_end:
+            blank = [''] * (old_end - end)
+            for other in loaded:
+                self.store.load_rows(other, end, blank)
+        self.metrics.count('snapshot_rows_refetched', max(0, end - top))
+
+    def _save_snapshot(self, revision):
+        # type: (Any) -> None
+        """
+        Write the snapshot as of revision, which must have been read before
+        the store was fetched (or right after it was synced), unless there
+        are unsynced changes.
+        """
+        if self.snapshot is None or self.dirty or revision is None:
+            return
+        self.snapshot.write({
+            'layout': self._layout(),
+            'revision': revision,
+            'headers': [self.column_to_column_name[column]
+                        for column in range(self.columns)],
+            'store': self.store,
+            'row_for_key': self.row_for_key,
+            'column_indexes': self.column_indexes,
+            'next_empty_row': self.next_empty_row,
+            'data_rows': self.data_rows,
+        })
+
+    def _revision(self):
+        # type: () -> Any
+        """the sheet's revision, for the snapshot; None (logged) if none"""
+        revision = sheet_revision(self.sheet)
+        if revision is None:
+            logger.warning("%s has no revision to check a snapshot against;"
+                           " the snapshot is not used",
+                           getattr(self.sheet, 'title', 'the worksheet'))
+        return revision
+
+    def grow(self, needed=1):
+        # type: (int) -> None
+        """
+        Add at least needed rows to the sheet and the store, geometrically:
+        the sheet doubles, by min_growth rows at least.
+        """
+        count = max(needed, self.min_growth, self._row_span())
+        with self.metrics.timer('add_rows'):
+            self.sheet.add_rows(count)
+        self.metrics.count('rows_added', count)
+        self.rows += count
+        self.store.grow(count)
+
+    def _row_span(self):
+        # type: () -> int
+        """number of rows held in the store"""
+        return self.rows - self.start_row_for_updatable + 1
+
+    def _read_columns(self, first, last):
+        # type: (int, int) -> List[List[Any]]
+        """
+        Fetch the updatable portion of columns first..last, per column.
+        Only the first data_rows rows are read; the rest are blank.
+        """
+        blank = [''] * (self._row_span() - self.data_rows)
+        return [values + blank for values in
+                self._read_region(first, last, 0, self.data_rows)]
+
+    def _read_region(self, first, last, top, bottom):
+        # type: (int, int, int, int) -> List[List[Any]]
+        """Fetch rows top..bottom - 1 of columns first..last, per column."""
+        width = last - first + 1
+        start = self.start_row_for_updatable
+        values = [cell.value for cell in
+                  self.sheet.range(start + top, first + 1,
+                                   start + bottom - 1, last + 1)]
+        return [values[offset::width] for offset in range(width)]
+
+    def fetch_columns(self, cols):
+        # type: (Iterable[int]) -> None
+        """
+        Fetch the updatable portion of the given column indexes that are not
+        loaded yet, one range request per run of adjacent columns.
+        """
+        missing = sorted(col for col in set(cols)
+                         if not self.store.loaded(col))
+        for first, last in runs(missing):
+            for col, values in zip(range(first, last + 1),
+                                   self._read_columns(first, last)):
+                self.store.load_column(col, values)
+
+    def value_at(self, row, col):
+        # type: (int, int) -> Any
+        """Value of a cell, fetching its column first if needed"""
+        if not self.store.loaded(col):
+            self.fetch_columns([col])
+        return self.store.get(row, col)
 
     def cell_at(self, row, col):
-        return self.cell_list[self.columns * row + col]
+        # type: (int, int) -> CellView
+        return CellView(self, row, col)
 
-    def row_as_dict(self, row):
-        # type: (int) -> Dict[str,Any]
-        cols = {}
-        for col in range(self.columns):
+    def row_as_dict(self, row, columns=None):
+        # type: (int, List[str]) -> Dict[str,Any]
+        """
+        Values of a row by column name; limited to the named columns if
+        columns is given.
+        """
+        if columns is None:
+            cols = range(self.columns)
+            self.fetch_columns(cols)
+        else:
+            cols = [self.column_name_to_column[name] for name in columns]
+        values = {}
+        for col in cols:
             cname = self.column_to_column_name[col]
-            cols[cname] = self.cell_at(row, col).value
-        return cols
+            values[cname] = self.value_at(row, col)
+        return values
 
     def row(self, idx):
         # type: (int) -> Dict[str,Any]
         """Row for index"""
         return self.row_as_dict(idx)
 
-    def append(self, kvhash):
-        # type: (Dict[str,Any]) -> None
+    def append(self, kvhash, key=None):
+        # type: (Dict[str,Any], Any) -> None
         """
-        Add to sheet a row specified by dictionary
+        Add to sheet a row specified by dictionary.  key is the row_to_key
+        of kvhash, if the caller has already computed it.
         """
         print("would add to row {}".format(self.next_empty_row))
+        self.metrics.count('rows_appended')
         row = self.next_empty_row
-        for key in kvhash.keys():
-            col = self.column_name_to_column[key]
-            self.cell_at(row, col).value = kvhash[key]
+        if row >= self._row_span():
+            self.grow(row - self._row_span() + 1)
+        for name in kvhash.keys():
+            col = self.column_name_to_column[name]
+            self.set_value(row, col, kvhash[name])
+        for col, index in self.column_indexes.items():
+            index.setdefault(self.value_at(row, col), []).append(row)
+        # so has() sees the new row, and so does a snapshot taken at sync()
+        if key is None:
+            key = self.row_to_key(kvhash)
+        self.row_for_key.setdefault(key, row)
         self.next_empty_row += 1
 
     def update_row(self, idx, kvhash, cols_to_update):
         # type: (int, Dict[str,Any], List[str]) -> None
         """
-        Update row using dictionary to fill in updated values
+        Update row using dictionary to fill in updated values.  Values that
+        are already in the row are not written; see changed_columns().
         """
+        self.metrics.count('rows_updated')
         for key in cols_to_update:
+            if key not in kvhash:
+                raise KeyError(key)
+        changed = self.changed_columns(idx, kvhash, cols_to_update)
+        self._skipped(len(cols_to_update) - len(changed))
+        for key in changed:
             col = self.column_name_to_column[key]
-            self.cell_at(idx, col).value = kvhash[key]
+            self.set_value(idx, col, kvhash[key])
+
+    def changed_columns(self, row, kvhash, names):
+        # type: (int, Dict[str,Any], List[str]) -> List[str]
+        """
+        The names, of those in kvhash, whose value differs from what row
+        holds, comparing values as the sheet shows them (store.normalized).
+        The row is compared by its normalized codes (ColumnStore.signature),
+        so an unchanged row costs one comparison of integer lists.
+        """
+        names = [name for name in names if name in kvhash]
+        if not names:
+            return []
+        cols = [self.column_name_to_column[name] for name in names]
+        self.fetch_columns(cols)
+        differs = self.store.differs(row, cols,
+                                     [kvhash[name] for name in names])
+        return [name for name, changed in zip(names, differs) if changed]
+
+    def _skipped(self, count):
+        if count:
+            self.skipped_writes += count
+            self.metrics.count('skipped_writes', count)
+
+    def set_value(self, row, col, value):
+        # type: (int, int, Any) -> None
+        """
+        Set a single cell, remembering it for sync() only if the value
+        actually changes.
+        """
+        old = self.value_at(row, col)
+        if old == value:
+            return
+        if normalized(old) == normalized(value):
+            self._skipped(1)
+            return
+        self.store.set(row, col, value)
+        self.dirty.add((row, col))
+        index = self.column_indexes.get(col)
+        if index is not None and row < self.next_empty_row:
+            self._unindex(index, old, row)
+            bisect.insort(index.setdefault(value, []), row)
+
+    @staticmethod
+    def _unindex(index, value, row):
+        rows = index[value]
+        del rows[bisect.bisect_left(rows, row)]
+        if not rows:
+            del index[value]
+
+    def mark_dirty(self, row, col):
+        # type: (int, int) -> None
+        """Include a cell in the next sync() even if its value is unchanged."""
+        self.dirty.add((row, col))
 
     def has(self, kvhash):
         # type: (Dict[str, Any]) -> bool
@@ -106,6 +623,17 @@ class SheetAdapter(object):
         key = self.row_to_key(kvhash)
         return key in self.row_for_key
 
+    def keys_for(self, kvhashes):
+        # type: (List[Dict[str, Any]]) -> List[Any]
+        """row_to_key of each of kvhashes"""
+        if self.columns_to_keys is not None:
+            keys = self.columns_to_keys(
+                dict((name, [kvhash[name] for kvhash in kvhashes])
+                     for name in self.key_columns))
+            return list(keys)
+        row_to_key = self.row_to_key
+        return [row_to_key(kvhash) for kvhash in kvhashes]
+
     def row_for_kvhash(self, kvhash):
         # type: (Dict[str, Any]) -> int
         """index of row where kvhash mapped with key_for_rowdict matches"""
@@ -115,11 +643,60 @@ class SheetAdapter(object):
     def row_for_colval(self, key, value):
         # type: (str, Any) -> int
         """
-        Row index that has column name 'key' with a particular value.
+        Row index that has column name 'key' with a particular value.  The
+        first such row if there are several; KeyError if there is none.
         """
-        pass
+        return self._column_index(key)[value][0]
+
+    def rows_for_colval(self, key, value):
+        # type: (str, Any) -> List[int]
+        """
+        All row indexes, in order, that have column name 'key' with a
+        particular value.
+        """
+        return list(self._column_index(key).get(value, []))
+
+    def _column_index(self, key):
+        # type: (str) -> Dict[Any,List[int]]
+        index = self.column_indexes.get(self.column_name_to_column[key])
+        if index is None:
+            raise Exception("Column %s is not in index_columns" % key)
+        return index
 
     def sync(self):
         # type: () -> None
-        """Write updated sheet"""
-        self.sheet.update_cells(self.cell_list)
+        """
+        Write changed cells to the sheet as contiguous ranges, packed into
+        size-bounded batch requests.
+
+        Cells are cleared from dirty as their batch succeeds, so if a batch
+        still fails after its retries, calling sync() again sends only what
+        was not written yet.
+        """
+        with self.metrics.timer('sync'):
+            self._sync()
+
+    def _sync(self):
+        # type: () -> None
+        self.metrics.count('cells_synced', len(self.dirty))
+        start = self.start_row_for_updatable
+        blocks = [[[Cell(start + row, col + 1, self.store.get(row, col))
+                    for col in range(first_col, last_col + 1)]
+                   for row in range(first_row, last_row + 1)]
+                  for first_row, first_col, last_row, last_col
+                  in cell_ranges(self.dirty)]
+
+        def written(sent):
+            for block in sent:
+                for cells in block:
+                    for cell in cells:
+                        self.dirty.discard(
+                            (cell.row - start,
+                             cell.col - 1))
+
+        self.metrics.count('sync_batches',
+                           self.writer.write(blocks, on_written=written))
+        if self.snapshot is not None:
+            # the revision our writes made; an edit by someone else made
+            # while writing is taken as part of it and not seen
+            self._save_snapshot(self._revision())
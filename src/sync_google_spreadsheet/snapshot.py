@@ -0,0 +1,102 @@
+"""
+On-disk snapshot of a loaded SheetAdapter, so a run can skip downloading a
+sheet that has not changed since the previous run.
+
+The snapshot is the adapter's column store, key index and column indexes,
+pickled and zlib-compressed, along with the revision of the worksheet it was
+taken at.  Keys are stored as computed, so delete the snapshot file after
+changing an adapter's row_to_key.
+"""
+import os
+import pickle
+import tempfile
+import zlib
+
+FORMAT_VERSION = 1
+DEFAULT_SNAPSHOT_DIR = '~/.cache/sync_google_spreadsheet/snapshots'
+
+# os.rename can't replace an existing file on Windows
+_replace = getattr(os, 'replace', os.rename)
+
+
+def sheet_revision(sheet):
+    # type: (Any) -> Any
+    """
+    Last-modified marker of a worksheet, or None if it can't be had.  Any
+    value works as long as it changes whenever the sheet changes.
+
+    For a gspread worksheet this is the spreadsheet's Drive modifiedTime,
+    which changes with any of its worksheets.  It is read afresh with
+    get_lastUpdateTime() on gspread >= 5.12.  Older versions only have
+    lastUpdateTime, which is read once and then cached, so the cached
+    value is dropped first.  gspread < 3 worksheets carry the feed's
+    updated timestamp instead.
+    """
+    revision = getattr(sheet, 'revision', None)
+    if callable(revision):
+        return revision()
+    updated = getattr(sheet, 'updated', None)
+    if updated is not None:
+        return updated
+    spreadsheet = getattr(sheet, 'spreadsheet', None)
+    if spreadsheet is not None:
+        get_last_update = getattr(spreadsheet, 'get_lastUpdateTime', None)
+        if callable(get_last_update):
+            return get_last_update()
+        properties = getattr(spreadsheet, '_properties', None)
+        if isinstance(properties, dict):
+            properties.pop('modifiedTime', None)
+        return getattr(spreadsheet, 'lastUpdateTime', None)
+    return None
+
+
+class SnapshotCache(object):
+    """A single snapshot file."""
+
+    def __init__(self, path):
+        # type: (str) -> None
+        self.path = os.path.expanduser(path)
+
+    def read(self):
+        # type: () -> Optional[Dict[str,Any]]
+        """The stored state, or None if missing, unreadable or outdated."""
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.loads(zlib.decompress(f.read()))
+        except Exception:
+            return None
+        if not isinstance(state, dict) or \
+                state.get('format') != FORMAT_VERSION:
+            return None
+        return state
+
+    def write(self, state):
+        # type: (Dict[str,Any]) -> None
+        """Replace the snapshot atomically."""
+        state = dict(state, format=FORMAT_VERSION)
+        data = zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+        directory = os.path.dirname(self.path) or '.'
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            _replace(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def clear(self):
+        # type: () -> None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def snapshot_cache(name, directory=DEFAULT_SNAPSHOT_DIR):
+    # type: (str, str) -> SnapshotCache
+    """
+    The SnapshotCache called name in directory.  Give each adapter its own
+    name, even adapters of the same worksheet.
+    """
+    return SnapshotCache(os.path.join(directory, name + '.snapshot'))
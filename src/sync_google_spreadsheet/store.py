@@ -0,0 +1,172 @@
+"""
+Compact in-memory storage for the cells of a sheet.
+
+Values are kept per column as an array of small integer codes into a value
+table shared by all columns, so a value that repeats (a date, a category, an
+empty cell) is stored once no matter how many cells hold it.  Cell objects are
+only created for cells that are written back to the sheet.
+
+Each value in the table also has the code of its normalized form (see
+normalized), given out when the value is first stored.  A row's normalized
+codes over some columns serve as its signature: incoming values change the
+row exactly when their codes differ, so the check compares integers and
+formats nothing already stored.  Unlike a hash of the row, the signature
+can't collide, so equal really means unchanged.
+"""
+from array import array
+
+try:
+    string_types = (str, unicode)  # noqa: F821
+except NameError:
+    string_types = (str,)
+
+# typecode for the per-column code arrays; 4 bytes per cell
+CODE_TYPE = 'i'
+
+
+def normalized(value):
+    # type: (Any) -> str
+    """
+    A value as the sheet would show it, for comparisons: None is empty and
+    a whole float is written without its fraction, so 5, 5.0 and '5' are all
+    u'5'.
+    """
+    if value is None:
+        return u''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return u'%s' % value
+
+
+class Cell(object):
+    """
+    Minimal stand-in for gspread's Cell: 1-based row and col and a value,
+    which is all update_cells and batch writes use.
+    """
+    __slots__ = ('row', 'col', 'value')
+
+    def __init__(self, row, col, value=''):
+        self.row = row
+        self.col = col
+        self.value = value
+
+    def __repr__(self):
+        return '<Cell R%sC%s %r>' % (self.row, self.col, self.value)
+
+
+class ColumnStore(object):
+    """
+    rows x columns grid of values, stored column by column.  A column that
+    has not been loaded is None until load_column() fills it in.
+    """
+
+    def __init__(self, rows, columns):
+        # type: (int, int) -> None
+        self.rows = rows
+        self.table = ['']
+        self.codes = {'': 0}
+        # normalized code of each value in table, and normalized -> code
+        self.normal = [0]
+        self.normal_codes = {u'': 0}
+        self.columns = [None] * columns
+
+    def _code(self, value):
+        # type: (Any) -> int
+        # str and non-str values that compare equal (1 and 1.0 and True)
+        # must not share a slot, so non-strings are keyed with their type
+        key = value if isinstance(value, string_types) \
+            else (type(value), value)
+        code = self.codes.get(key)
+        if code is None:
+            code = len(self.table)
+            self.table.append(value)
+            self.codes[key] = code
+            shown = normalized(value)
+            normal = self.normal_codes.get(shown)
+            if normal is None:
+                normal = self.normal_codes[shown] = len(self.normal_codes)
+            self.normal.append(normal)
+        return code
+
+    def __getstate__(self):
+        # the value -> code lookup is rebuilt from the table on unpickling
+        return {'rows': self.rows, 'table': self.table,
+                'columns': self.columns}
+
+    def __setstate__(self, state):
+        self.rows = state['rows']
+        self.table = []
+        self.codes = {}
+        self.normal = []
+        self.normal_codes = {}
+        self.columns = state['columns']
+        for value in state['table']:
+            self._code(value)
+
+    def loaded(self, col):
+        # type: (int) -> bool
+        return self.columns[col] is not None
+
+    def unload(self, col):
+        # type: (int) -> None
+        """Forget a column, so it is loaded again when next needed."""
+        self.columns[col] = None
+
+    def load_column(self, col, values):
+        # type: (int, Iterable[Any]) -> None
+        """Set a whole column from an iterable of exactly rows values."""
+        codes = array(CODE_TYPE, (self._code(value) for value in values))
+        if len(codes) != self.rows:
+            raise Exception("column %d has %d values, expected %d" %
+                            (col, len(codes), self.rows))
+        self.columns[col] = codes
+
+    def load_rows(self, col, first, values):
+        # type: (int, int, List[Any]) -> None
+        """Set rows first.. of a loaded column from values."""
+        self.columns[col][first:first + len(values)] = \
+            array(CODE_TYPE, (self._code(value) for value in values))
+
+    def grow(self, count):
+        # type: (int) -> None
+        """Add count empty rows at the bottom."""
+        blank = array(CODE_TYPE, [0]) * count
+        for codes in self.columns:
+            if codes is not None:
+                codes.extend(blank)
+        self.rows += count
+
+    def get(self, row, col):
+        # type: (int, int) -> Any
+        return self.table[self.columns[col][row]]
+
+    def set(self, row, col, value):
+        # type: (int, int, Any) -> None
+        self.columns[col][row] = self._code(value)
+
+    def signature(self, row, cols):
+        # type: (int, List[int]) -> List[int]
+        """normalized codes of a row's values in the loaded columns cols"""
+        normal = self.normal
+        return [normal[self.columns[col][row]] for col in cols]
+
+    def differs(self, row, cols, values):
+        # type: (int, List[int], List[Any]) -> List[bool]
+        """
+        For each of the loaded columns cols, whether the value in values
+        would show differently from what row holds.
+        """
+        normal_codes = self.normal_codes
+        # -1 for a value that nothing stored shows as
+        incoming = [normal_codes.get(normalized(value), -1)
+                    for value in values]
+        held = self.signature(row, cols)
+        if incoming == held:
+            return [False] * len(cols)
+        return [code != old for code, old in zip(incoming, held)]
+
+    def column_values(self, col):
+        # type: (int) -> List[Any]
+        """All values of a loaded column, top to bottom."""
+        table = self.table
+        return [table[code] for code in self.columns[col]]
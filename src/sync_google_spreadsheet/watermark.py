@@ -0,0 +1,151 @@
+"""
+Per-sheet, per-source watermarks for incremental syncs.
+
+A watermark is the highest key (a date, a timestamp) of the input a source
+has had synced into a sheet.  The next run skips input up to the watermark
+before anything else is done with it, and moves the watermark up only after
+sync() succeeds, so a failed run is simply repeated::
+
+    state = WatermarkFile('~/.sync-state.json')
+    mark = Watermark(state, 'Checking', 'schwab',
+                     key=lambda row: mdy_dt(row['Date']),
+                     dump=dump_datetime, load=load_datetime)
+    merge(sheet, mark.skip(rows), sync=False)
+    sheet.sync()
+    mark.commit()
+
+All watermarks live in one JSON file, {sheet: {source: value}}.
+"""
+import datetime
+import json
+import os
+import tempfile
+
+# os.rename can't replace an existing file on Windows
+_replace = getattr(os, 'replace', os.rename)
+
+_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def dump_datetime(value):
+    # type: (datetime.datetime) -> str
+    """A naive datetime as a JSON-able string."""
+    return value.strftime(_DATETIME_FORMAT)
+
+
+def load_datetime(value):
+    # type: (str) -> datetime.datetime
+    return datetime.datetime.strptime(value, _DATETIME_FORMAT)
+
+
+class WatermarkFile(object):
+    """The JSON file holding the watermarks."""
+
+    def __init__(self, path):
+        # type: (str) -> None
+        self.path = os.path.expanduser(path)
+
+    def read(self):
+        # type: () -> Dict[str,Dict[str,Any]]
+        """All watermarks; empty if the file is missing or unreadable."""
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(state, dict):
+            return {}
+        return state
+
+    def get(self, sheet, source):
+        # type: (str, str) -> Any
+        return self.read().get(sheet, {}).get(source)
+
+    def set(self, sheet, source, value):
+        # type: (str, str, Any) -> None
+        """Store one watermark, keeping the others in the file."""
+        state = self.read()
+        state.setdefault(sheet, {})[source] = value
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.watermark-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f, indent=2, sort_keys=True)
+            _replace(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+
+class Watermark(object):
+    """
+    The watermark of one source in one sheet.  key(record) gives the
+    position of a record; dump and load convert a key to and from something
+    JSON can hold.
+
+    With inclusive, skip() drops records at the watermark too.  Leave it off
+    when keys aren't unique, e.g. dates: records on the watermark's date are
+    then passed on again, and merge() finds the ones already synced
+    unchanged.
+    """
+
+    def __init__(self, state, sheet, source, key, dump=None, load=None,
+                 inclusive=False):
+        # type: (WatermarkFile, str, str, Callable, Callable, Callable, bool) -> None
+        self.state = state
+        self.sheet = sheet
+        self.source = source
+        self.key = key
+        self.dump = dump
+        self.inclusive = inclusive
+        value = state.get(sheet, source)
+        if value is not None and load is not None:
+            value = load(value)
+        # committed watermark, None if nothing was synced yet
+        self.value = value
+        # highest key passed on by skip() since the last commit
+        self.pending = None
+
+    def passes(self, key):
+        # type: (Any) -> bool
+        """whether a record at key is past the watermark"""
+        if self.value is None:
+            return True
+        if self.inclusive:
+            return key > self.value
+        return key >= self.value
+
+    def skip(self, records):
+        # type: (Iterable[Any]) -> Iterator[Any]
+        """The records past the watermark, remembering the highest key."""
+        key = self.key
+        for record in records:
+            position = key(record)
+            if not self.passes(position):
+                continue
+            self.advance(position)
+            yield record
+
+    def advance(self, position):
+        # type: (Any) -> None
+        """
+        Remember position as synced, for callers that filter with passes()
+        and only know after the merge which records made it to the sheet.
+        """
+        if self.pending is None or position > self.pending:
+            self.pending = position
+
+    def commit(self):
+        # type: () -> None
+        """
+        Move the watermark to the highest key passed on.  Call after the
+        records were synced.
+        """
+        if self.pending is None:
+            return
+        if self.value is None or self.pending > self.value:
+            value = self.pending
+            self.state.set(self.sheet, self.source,
+                           self.dump(value) if self.dump else value)
+            self.value = value
+        self.pending = None
@@ -0,0 +1,22 @@
+import pytest
+
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.backend import QuotaExceeded
+
+
+def make_sheet(**kwargs):
+    return FakeWorksheet([['Date', 'Amount', 'Note'],
+                          ['01/01/2018', '1', ''],
+                          ['01/02/2018', '2', '']], rows=5, **kwargs)
+
+
+def test_fake_worksheet_quota():
+    now = [0.0]
+    sheet = make_sheet(quota_per_minute=2, clock=lambda: now[0])
+    sheet.range(1, 1, 1, 1)
+    sheet.range(1, 1, 1, 1)
+    with pytest.raises(QuotaExceeded):
+        sheet.range(1, 1, 1, 1)
+    now[0] = 61.0
+    assert sheet.range(2, 1, 2, 2)[1].value == '1'
+    assert sheet.stats['rejected'] == 1
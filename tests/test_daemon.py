@@ -0,0 +1,141 @@
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.daemon import Daemon
+from sync_google_spreadsheet.daemon import Job
+from sync_google_spreadsheet.daemon import PollingWatcher
+from sync_google_spreadsheet.sheet_adapter import SheetAdapter
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ScriptedWatcher(object):
+    """Returns the next scripted paths on each wait, taking timeout."""
+
+    def __init__(self, clock, script):
+        self.clock = clock
+        self.script = list(script)
+        self.waits = []
+
+    def watch(self, directory):
+        pass
+
+    def wait(self, timeout):
+        self.waits.append(timeout)
+        step, paths = self.script.pop(0) if self.script else (timeout, [])
+        self.clock.now += min(step, timeout)
+        return paths
+
+
+def make_job(tmpdir, batches):
+    sheet = FakeWorksheet([['Date', 'Amount'], ['01/01/2018', '1']], rows=5)
+    adapter = SheetAdapter(sheet, 1, lambda row: row['Date'],
+                           non_empty_column='Date')
+
+    def process(adapter, paths):
+        batches.append(paths)
+        for path in paths:
+            row = {'Date': path[-14:-4], 'Amount': '2'}
+            if not adapter.has(row):
+                adapter.append(row)
+        adapter.sync()
+    return Job('dates', adapter, process, [str(tmpdir)])
+
+
+def test_debounce_batches_files(tmpdir):
+    batches = []
+    job = make_job(tmpdir, batches)
+    clock = Clock()
+    a = str(tmpdir.join('01-02-2018.csv'))
+    b = str(tmpdir.join('01-03-2018.csv'))
+    watcher = ScriptedWatcher(clock, [(0.5, [a]), (1, [b, 'elsewhere.csv'])])
+    daemon = Daemon([job], watcher, debounce=2, revision_interval=100,
+                    clock=clock)
+
+    daemon.run_once()
+    daemon.run_once()
+    assert batches == []
+    daemon.run_once()
+    assert clock.now == 3.5
+    assert batches == [[a, b]]
+    assert '01-03-2018' in job.adapter.row_for_key
+
+
+def test_reload_after_outside_edit(tmpdir):
+    batches = []
+    job = make_job(tmpdir, batches)
+    clock = Clock()
+    daemon = Daemon([job], ScriptedWatcher(clock, []), revision_interval=10,
+                    clock=clock)
+    daemon.start()
+
+    sheet = job.adapter.sheet
+    sheet.values[2][:2] = ['01/05/2018', '5']
+    sheet.version += 1
+    daemon.run_once()
+    assert clock.now == 10
+    assert job.adapter.row_for_key == {'01/01/2018': 1, '01/05/2018': 2}
+
+
+def test_failed_batch_backs_off_then_parks(tmpdir):
+    batches = []
+    job = make_job(tmpdir, batches)
+    clock = Clock()
+    a = str(tmpdir.join('01-02-2018.csv'))
+    daemon = Daemon([job], ScriptedWatcher(clock, [(0, [a])]), debounce=2,
+                    revision_interval=1000, retry_delay=10, max_attempts=3,
+                    clock=clock)
+    daemon.start()
+    job.adapter.writer.retries = 0
+    job.adapter.sheet.fail_next(3)
+
+    daemon.run_once()
+    daemon.run_once()
+    assert (batches, clock.now) == ([[a]], 2)
+    assert daemon.retrying['dates'].attempts == 1
+    daemon.run_once()
+    assert clock.now == 12
+    assert daemon.retrying['dates'].attempts == 2
+    daemon.run_once()
+    assert clock.now == 32
+    assert daemon.retrying == {}
+    assert daemon.parked == {'dates': set([a])}
+    daemon.run_once()
+    assert clock.now == 1000
+
+    # a parked file is tried again when it changes
+    daemon.add([a])
+    daemon.run_once()
+    assert batches == [[a], [a]]
+    assert daemon.parked == {'dates': set()}
+    assert job.adapter.row_for_key['01-02-2018'] == 2
+
+
+def test_own_writes_dont_reload(tmpdir):
+    batches = []
+    job = make_job(tmpdir, batches)
+    clock = Clock()
+    a = str(tmpdir.join('01-02-2018.csv'))
+    daemon = Daemon([job], ScriptedWatcher(clock, [(0, [a])]), debounce=2,
+                    revision_interval=100, clock=clock)
+    daemon.start()
+    revision = job.revision
+    daemon.run_once()
+    daemon.run_once()
+    assert batches == [[a]]
+    assert job.revision != revision
+    assert not job.stale()
+
+
+def test_polling_watcher(tmpdir):
+    tmpdir.join('old.csv').write('x')
+    watcher = PollingWatcher(interval=0, sleep=lambda seconds: None)
+    watcher.watch(str(tmpdir))
+    assert watcher.wait(0) == []
+    tmpdir.join('new.csv').write('x')
+    assert watcher.wait(0) == [str(tmpdir.join('new.csv'))]
+    assert watcher.wait(0) == []
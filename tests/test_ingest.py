@@ -0,0 +1,42 @@
+import pytest
+
+from sync_google_spreadsheet.ingest import ingest
+from sync_google_spreadsheet.ingest import merge_sorted
+from sync_google_spreadsheet.ingest import sort_items
+
+
+def test_sort_items_spills_and_keeps_order():
+    items = [(i % 3, i) for i in range(10)]
+    assert list(sort_items(items, max_rows=4)) == sorted(items)
+    assert list(sort_items(items, max_rows=100)) == sorted(items)
+
+
+def test_merge_sorted():
+    assert list(merge_sorted([[(1, 'a'), (3, 'c')], [], [(1, 'b'), (2, {})]])) \
+        == [(1, 'a'), (1, 'b'), (2, {}), (3, 'c')]
+
+
+def test_ingest_dedupes_overlapping_files(tmpdir):
+    first = tmpdir.join('jan.csv')
+    first.write('Date,Amount\n'
+                '01/02/2018,5\n'
+                '01/01/2018,1\n'
+                '01/02/2018,5\n')
+    second = tmpdir.join('jan-feb.csv')
+    second.write('Date,Amount\n'
+                 '02/01/2018,null\n'
+                 '01/02/2018,5\n'
+                 '01/02/2018,6\n')
+    rows = ingest([str(first), str(second)],
+                  sort_key=lambda row: (row['Date'][6:], row['Date']),
+                  max_rows=2)
+    assert [(row['Date'], row['Amount']) for row in rows] == \
+        [('01/01/2018', '1'), ('01/02/2018', '5'), ('01/02/2018', '5'),
+         ('01/02/2018', '6'), ('02/01/2018', '')]
+
+
+def test_ingest_reads_files_when_iterated(tmpdir):
+    rows = ingest([str(tmpdir.join('missing.csv'))],
+                  sort_key=lambda row: row['Date'])
+    with pytest.raises((IOError, OSError)):
+        next(rows)
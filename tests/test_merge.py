@@ -0,0 +1,36 @@
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.merge import merge
+from sync_google_spreadsheet.sheet_adapter import SheetAdapter
+
+
+def make_sheet(**kwargs):
+    return FakeWorksheet([['Date', 'Amount', 'Note'],
+                          ['01/01/2018', '1', ''],
+                          ['01/02/2018', '2', '']], rows=5, **kwargs)
+
+
+def make_adapter(sheet, **kwargs):
+    return SheetAdapter(sheet, 1, lambda row: row['Date'],
+                        non_empty_column='Date', **kwargs)
+
+
+def test_merge():
+    sheet = make_sheet()
+    adapter = make_adapter(sheet)
+    adapter.load()
+    stats = merge(adapter, [{'Date': '01/01/2018', 'Amount': '1'},
+                            {'Date': '01/02/2018', 'Amount': '7'},
+                            {'Date': '01/03/2018', 'Amount': '3'},
+                            {'Date': '01/03/2018', 'Amount': '4'}],
+                  update_columns=['Amount'], batch_size=3)
+    assert stats.as_dict() == {'inserted': 1, 'updated': 2, 'unchanged': 1,
+                               'missing': 0, 'merged_duplicates': 0,
+                               'batches': 2, 'changed_columns': {'Amount': 2}}
+    assert [row[:2] for row in sheet.values[1:4]] == \
+        [['01/01/2018', '1'], ['01/02/2018', '7'], ['01/03/2018', '4']]
+
+    stats = merge(adapter, [{'Date': '01/04/2018', 'Amount': '5'},
+                            {'Date': '01/04/2018', 'Amount': '6'}],
+                  update_columns=['Amount'])
+    assert (stats.inserted, stats.merged_duplicates) == (1, 1)
+    assert sheet.values[4][:2] == ['01/04/2018', '6']
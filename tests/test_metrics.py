@@ -0,0 +1,34 @@
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.metrics import MetricsRecorder
+from sync_google_spreadsheet.metrics import PrometheusTextfileSink
+from sync_google_spreadsheet.sheet_adapter import SheetAdapter
+
+
+def make_sheet(**kwargs):
+    return FakeWorksheet([['Date', 'Amount', 'Note'],
+                          ['01/01/2018', '1', ''],
+                          ['01/02/2018', '2', '']], rows=5, **kwargs)
+
+
+def make_adapter(sheet, **kwargs):
+    return SheetAdapter(sheet, 1, lambda row: row['Date'],
+                        non_empty_column='Date', **kwargs)
+
+
+def test_metrics(tmpdir):
+    path = str(tmpdir.join('sync.prom'))
+    metrics = MetricsRecorder([PrometheusTextfileSink(path)])
+    adapter = make_adapter(make_sheet(), metrics=metrics)
+    adapter.load()
+    adapter.append({'Date': '01/03/2018', 'Amount': '3'})
+    adapter.sync()
+    metrics.flush()
+
+    summary = metrics.summary()
+    assert summary['timers']['row_to_key']['count'] == 2
+    assert summary['timers']['backend.range']['count'] == 3
+    assert summary['counters']['cells_fetched'] == 6 + 5 + 6
+    assert summary['counters']['cells_written'] == 2
+    assert summary['gauges']['index_size'] == 2
+    assert 'sync_google_spreadsheet_cells_written_total 2\n' in \
+        tmpdir.join('sync.prom').read()
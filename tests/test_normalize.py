@@ -0,0 +1,75 @@
+import pytest
+
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.normalize import Key
+from sync_google_spreadsheet.normalize import LRUCache
+from sync_google_spreadsheet.normalize import amount
+from sync_google_spreadsheet.normalize import date
+from sync_google_spreadsheet.normalize import timestamp
+from sync_google_spreadsheet.sheet_adapter import SheetAdapter
+
+
+def make_sheet(**kwargs):
+    return FakeWorksheet([['Date', 'Amount', 'Note'],
+                          ['01/01/2018', '1', ''],
+                          ['01/02/2018', '2', '']], rows=5, **kwargs)
+
+
+def make_adapter(sheet, **kwargs):
+    return SheetAdapter(sheet, 1, lambda row: row['Date'],
+                        non_empty_column='Date', **kwargs)
+
+
+def test_columns_to_keys():
+    calls_made = []
+
+    def columns_to_keys(columns):
+        calls_made.append(columns)
+        return [date for date in columns['Date']]
+
+    adapter = make_adapter(make_sheet(), key_columns=['Date'],
+                           columns_to_keys=columns_to_keys)
+    adapter.load(columns=['Amount'])
+    assert calls_made == [{'Date': ['01/01/2018', '01/02/2018']}]
+    assert adapter.row_for_key == {'01/01/2018': 1, '01/02/2018': 2}
+    assert adapter.keys_for([{'Date': '01/03/2018'}]) == ['01/03/2018']
+
+
+def test_typed_key():
+    mdy = date('%m/%d/%Y')
+    key = Key([('Date', mdy), ('Amount', amount)], format='%s-%.2f')
+    sheet = make_sheet()
+    sheet.values[2][0] = '01/01/2018'
+    adapter = SheetAdapter(sheet, 1, key, non_empty_column='Date')
+    adapter.load(columns=['Note'])
+    assert adapter.key_columns == ['Date', 'Amount']
+    assert adapter.row_for_key == {'2018-01-01 00:00:00-1.00': 1,
+                                   '2018-01-01 00:00:00-2.00': 2}
+    assert adapter.has({'Date': '01/01/2018', 'Amount': '$2'})
+    assert mdy.stats()['misses'] == 1
+    assert mdy.stats()['hits'] == 1
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    for key in ['a', 'b', 'a', 'c', 'b']:
+        cache.get(key, str.upper)
+    assert list(cache.data) == ['c', 'b']
+    assert cache.stats() == {'hits': 1, 'misses': 4, 'evictions': 2,
+                             'size': 2, 'maxsize': 2}
+
+
+def test_timestamp_column_matches_values():
+    pytest.importorskip('pandas')
+    values = ['2018-01-02 03:04', '01/03/2018 05:06', '2018-01-02 03:04',
+              '2018-01-04T07:08:00+00:00']
+    column = timestamp('US/Pacific').column(values)
+    assert column == [timestamp('US/Pacific').parse(value)
+                      for value in values]
+
+    values = ['2018-01-02 03:04', '2018-01-03 05:06', '2018-01-02 03:04']
+    parser = timestamp('US/Pacific', format='%Y-%m-%d %H:%M')
+    column = parser.column(values)
+    assert column == [parser.parse(value) for value in values]
+    assert column == [timestamp('US/Pacific').parse(value)
+                      for value in values]
@@ -0,0 +1,25 @@
+from sync_google_spreadsheet.parallel import parallel_map
+
+offset = [0]
+
+
+def set_offset(value):
+    offset[0] = value
+
+
+def add_offset(item):
+    return item + offset[0]
+
+
+def test_parallel_map_keeps_order():
+    items = iter(range(100))
+    assert list(parallel_map(add_offset, items, processes=2, chunk_size=7,
+                             initializer=set_offset, initargs=(1000,),
+                             pending=1)) == list(range(1000, 1100))
+    assert offset == [0]
+
+
+def test_parallel_map_in_process():
+    assert list(parallel_map(add_offset, [1, 2], processes=1,
+                             initializer=set_offset, initargs=(1,))) == [2, 3]
+    set_offset(0)
@@ -0,0 +1,51 @@
+import itertools
+import threading
+
+import pytest
+
+from sync_google_spreadsheet.metrics import MetricsRecorder
+from sync_google_spreadsheet.pipeline import Pipeline
+from sync_google_spreadsheet.pipeline import concurrent
+
+
+def test_pipeline_stages_and_counters():
+    metrics = MetricsRecorder()
+    rows = Pipeline(iter(range(10)), metrics=metrics)
+    rows.map(lambda x: x * 2, 'double', thread=True, queue_size=2)
+    rows.filter(lambda x: x % 3 == 0, 'thirds')
+    rows.apply(lambda stream: (x + 1 for x in stream), 'plus')
+    assert list(rows) == [1, 7, 13, 19]
+    assert rows.stats()['double']['out'] == 10
+    assert rows.stats()['thirds']['out'] == 4
+    assert rows.stats()['plus'] == {'in': 4, 'out': 4, 'seconds': 0.0}
+    assert metrics.counters['pipeline.thirds.in'] == 10
+    with pytest.raises(Exception):
+        list(rows)
+
+
+def test_concurrent_sources():
+    def failing():
+        yield 'x'
+        raise ValueError('source failed')
+
+    assert sorted(concurrent([iter('abc'), range(3)], queue_size=1),
+                  key=str) == [0, 1, 2, 'a', 'b', 'c']
+    with pytest.raises(ValueError):
+        list(concurrent([failing()]))
+
+
+def test_stopping_early_stops_threads():
+    closed = threading.Event()
+
+    def endless():
+        try:
+            for i in itertools.count():
+                yield i
+        finally:
+            closed.set()
+
+    rows = Pipeline(endless()).map(lambda x: x, thread=True, queue_size=1)
+    items = iter(rows)
+    assert [next(items), next(items)] == [0, 1]
+    items.close()
+    assert closed.wait(5)
@@ -0,0 +1,47 @@
+import re
+
+from sync_google_spreadsheet import rules
+from sync_google_spreadsheet.rules import Rule
+from sync_google_spreadsheet.rules import RuleSet
+
+
+def linear_match(rule_list, description, transtype=None):
+    for rule in rule_list:
+        if rule.transtype:
+            if rule.transtype == transtype:
+                return rule
+        elif rule.exact:
+            if rule.exact == description:
+                return rule
+        elif re.search(rule.pattern, description):
+            return rule
+    return None
+
+
+def test_first_match_wins(monkeypatch):
+    monkeypatch.setattr(rules, 'MAX_GROUPS', 4)
+    rule_list = [Rule(pattern='^SAFEWAY'),
+                 Rule(exact='SAFEWAY #1'),
+                 Rule(transtype='ATM'),
+                 Rule(pattern='(?i)costco'),
+                 Rule(pattern=r'(\d+)-\1'),
+                 Rule(pattern='(GAS|FUEL) STATION'),
+                 Rule(pattern='#1$'),
+                 Rule(pattern='WAY')]
+    ruleset = RuleSet(rule_list)
+    assert len(ruleset.combined) == 2
+    assert len(ruleset.separate) == 2
+    for description, transtype in [('SAFEWAY #1', None),
+                                   ('MY SAFEWAY #1', None),
+                                   ('MY SAFEWAY #1', 'ATM'),
+                                   ('Costco', None),
+                                   ('12-12', None),
+                                   ('GAS STATION #1', None),
+                                   ('nothing', None)]:
+        assert ruleset.match(description, transtype) is \
+            linear_match(rule_list, description, transtype)
+
+    assert ruleset.match('SAFEWAY #1',
+                         accept=lambda rule: rule.pattern is None) \
+        is rule_list[1]
+    assert ruleset.cache.stats()['hits'] == 1
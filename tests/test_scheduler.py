@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.backend import QuotaExceeded
+from sync_google_spreadsheet.scheduler import Scheduler
+from sync_google_spreadsheet.scheduler import SharedTokenBucket
+from sync_google_spreadsheet.scheduler import TokenBucket
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_paces_calls():
+    clock = Clock()
+    bucket = TokenBucket(60, burst=2, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.now == 3.0
+
+
+def test_shared_token_bucket(tmpdir):
+    clock = Clock()
+    path = str(tmpdir.join('quota'))
+    first = SharedTokenBucket(path, 60, burst=1, clock=clock,
+                              sleep=clock.sleep)
+    second = SharedTokenBucket(path, 60, burst=1, clock=clock,
+                               sleep=clock.sleep)
+    first.acquire()
+    second.acquire()
+    assert clock.now == 1.0
+
+
+def test_scheduler_retries_throttled_calls():
+    clock = Clock()
+    sheet = FakeWorksheet([['a', 'b'], ['1', '2']], clock=clock)
+    scheduler = Scheduler(TokenBucket(600, clock=clock, sleep=clock.sleep),
+                          sleep=clock.sleep, random=lambda: 0.5)
+    sheet.fail_next(2)
+    wrapped = scheduler.wrap(sheet)
+    assert [cell.value for cell in wrapped.range(2, 1, 2, 2)] == ['1', '2']
+    assert scheduler.throttled == 2
+    # backoff of 0.5s and 1s, during which the drained bucket refills
+    assert clock.now == 1.5
+
+
+def test_scheduled_sheet_does_not_retry_writes():
+    clock = Clock()
+    sheet = FakeWorksheet([['a', 'b'], ['1', '2']], rows=2, clock=clock)
+    scheduler = Scheduler(TokenBucket(600, clock=clock, sleep=clock.sleep),
+                          sleep=clock.sleep, random=lambda: 0.5)
+    sheet.fail_next(1)
+    wrapped = scheduler.wrap(sheet)
+    with pytest.raises(QuotaExceeded):
+        wrapped.add_rows(2)
+    assert sheet.calls == [('add_rows', 2)]
+    assert scheduler.throttled == 1
+    assert scheduler.retried == 0
+
+
+def test_scheduled_sheet_coalesces_overlapping_reads():
+    sheet = FakeWorksheet([['a', 'b', 'c'], ['1', '2', '3']])
+    wrapped = Scheduler(TokenBucket(6000)).wrap(sheet)
+    results = {}
+    with wrapped._fetching:
+        threads = [threading.Thread(
+            target=lambda rect=rect: results.__setitem__(
+                rect, [c.value for c in wrapped.range(*rect)]))
+            for rect in [(1, 1, 2, 2), (2, 2, 2, 3), (1, 2, 1, 3)]]
+        for thread in threads:
+            thread.start()
+        while len(wrapped._reads) < 3:
+            pass
+    for thread in threads:
+        thread.join()
+    assert results == {(1, 1, 2, 2): ['a', 'b', '1', '2'],
+                       (2, 2, 2, 3): ['2', '3'],
+                       (1, 2, 1, 3): ['b', 'c']}
+    assert [detail for name, detail in sheet.calls] == [(1, 1, 2, 3)]
+    assert wrapped.coalesced == 2
@@ -0,0 +1,120 @@
+import datetime
+
+import pytest
+
+from sync_google_spreadsheet.session import Session
+
+
+class Credentials(object):
+    access_token = None
+    token_expiry = None
+
+
+class APIError(Exception):
+    def __init__(self, status_code):
+        super(APIError, self).__init__(status_code)
+        self.status_code = status_code
+
+
+class Worksheet(object):
+    def __init__(self, key, name, calls):
+        self.key = key
+        self.name = name
+        self.calls = calls
+
+    def cell(self, row, col):
+        self.calls.append('cell')
+
+
+class Spreadsheet(object):
+    def __init__(self, key, calls):
+        self.id = key
+        self.calls = calls
+
+    def worksheet(self, name):
+        return Worksheet(self.id, name, self.calls)
+
+
+class Client(object):
+    def __init__(self, credentials, calls, error=None):
+        self.credentials = credentials
+        self.calls = calls
+        self.error = error
+        if credentials.access_token is None:
+            self.login()
+
+    def login(self):
+        self.calls.append('token')
+        self.credentials.access_token = 'token'
+        self.credentials.token_expiry = datetime.datetime(2018, 1, 1, 1)
+
+    def open(self, name):
+        self.calls.append('open')
+        return Spreadsheet('key-' + name, self.calls)
+
+    def open_by_key(self, key):
+        self.calls.append('open_by_key')
+        if self.error is not None:
+            raise self.error
+        return Spreadsheet(key, self.calls)
+
+
+def make_session(tmpdir, calls, now=datetime.datetime(2018, 1, 1),
+                 error=None):
+    return Session('~/service.json', cache_dir=str(tmpdir),
+                   load_credentials=lambda path, scopes: Credentials(),
+                   authorize=lambda credentials: Client(credentials, calls,
+                                                        error),
+                   clock=lambda: now)
+
+
+def test_session_caches_token_and_keys(tmpdir):
+    calls = []
+    session = make_session(tmpdir, calls)
+    sheet = session.worksheet('Finances', 'Checking')
+    assert (sheet.key, sheet.name) == ('key-Finances', 'Checking')
+    assert session.worksheet('Finances', 'Checking') is sheet
+    assert calls == ['token', 'open']
+
+    calls = []
+    session = make_session(tmpdir, calls)
+    session.worksheet('Finances', 'Checking')
+    assert calls == ['open_by_key']
+
+    calls = []
+    session = make_session(tmpdir, calls,
+                           now=datetime.datetime(2018, 1, 1, 0, 58))
+    session.client
+    assert calls == ['token']
+
+
+def test_session_looks_up_only_missing_keys(tmpdir):
+    make_session(tmpdir, []).open('Finances')
+
+    calls = []
+    session = make_session(tmpdir, calls, error=APIError(404))
+    assert session.open('Finances').id == 'key-Finances'
+    assert calls == ['open_by_key', 'open']
+
+    calls = []
+    session = make_session(tmpdir, calls, error=APIError(403))
+    with pytest.raises(APIError):
+        session.open('Finances')
+    assert calls == ['open_by_key']
+
+
+def test_session_refreshes_expiring_token(tmpdir):
+    calls = []
+    now = [datetime.datetime(2018, 1, 1)]
+    session = Session('~/service.json', cache_dir=str(tmpdir),
+                      load_credentials=lambda path, scopes: Credentials(),
+                      authorize=lambda credentials: Client(credentials, calls),
+                      clock=lambda: now[0])
+    sheet = session.worksheet('Finances', 'Checking')
+    sheet.cell(1, 1)
+    assert calls == ['token', 'open', 'cell']
+
+    calls[:] = []
+    now[0] = datetime.datetime(2018, 1, 1, 0, 56)
+    sheet.cell(1, 1)
+    assert calls == ['token', 'cell']
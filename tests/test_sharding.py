@@ -0,0 +1,71 @@
+from sync_google_spreadsheet.backend import FakeSpreadsheet
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.merge import merge
+from sync_google_spreadsheet.sharding import ShardedAdapter
+from sync_google_spreadsheet.sheet_adapter import SheetAdapter
+
+
+def make_adapter(worksheet):
+    return SheetAdapter(worksheet, 1, lambda row: row['Date'],
+                        non_empty_column='Date')
+
+
+def shard(title, *rows):
+    return FakeWorksheet([['Date', 'Amount']] + [list(row) for row in rows],
+                         rows=3, title=title)
+
+
+def test_shard_by_key():
+    spreadsheet = FakeSpreadsheet([
+        shard('Tx 2017', ('2017-01-01', '1'), ('2017-05-01', '2')),
+        shard('Tx 2018', ('2018-01-01', '3'))])
+    table = ShardedAdapter(spreadsheet, make_adapter, 'Tx',
+                           shard_for=lambda key: key[:4])
+
+    stats = merge(table, [{'Date': '2018-01-01', 'Amount': '4'},
+                          {'Date': '2019-02-01', 'Amount': '5'}],
+                  update_columns=['Amount'])
+    assert (stats.inserted, stats.updated) == (1, 1)
+    # 2017 is never read
+    assert spreadsheet.worksheet('Tx 2017').calls == []
+    assert table.loaded == set(['2018', '2019'])
+    assert spreadsheet.worksheet('Tx 2018').values[1] == ['2018-01-01', '4']
+    assert spreadsheet.worksheet('Tx 2019').values[:2] == \
+        [['Date', 'Amount'], ['2019-02-01', '5']]
+    assert table.row_for_key['2019-02-01'] == ('2019', 1)
+
+
+def test_shard_by_size():
+    spreadsheet = FakeSpreadsheet([
+        shard('Tx 1', ('2017-01-01', '1'), ('2017-05-01', '2')),
+        shard('Tx 2', ('2018-01-01', '3'))])
+    table = ShardedAdapter(spreadsheet, make_adapter, 'Tx', max_rows=2)
+
+    table.load(keys=['2018-06-01'])
+    assert table.loaded == set(['2'])
+    merge(table, [{'Date': '2018-06-01', 'Amount': '4'},
+                  {'Date': '2018-07-01', 'Amount': '5'}])
+    assert spreadsheet.worksheet('Tx 2').values[2] == ['2018-06-01', '4']
+    assert spreadsheet.worksheet('Tx 3').values[1] == ['2018-07-01', '5']
+
+    # an old key loads the shard it falls in
+    merge(table, [{'Date': '2017-05-01', 'Amount': '6'}],
+          update_columns=['Amount'])
+    assert table.loaded == set(['1', '2', '3'])
+    assert spreadsheet.worksheet('Tx 1').values[2] == ['2017-05-01', '6']
+
+
+def test_new_shard_reads_only_header_row():
+    spreadsheet = FakeSpreadsheet([
+        shard('Tx 2017', ('2017-01-01', '1')),
+        shard('Tx 2018', ('2018-01-01', '3'))])
+    table = ShardedAdapter(spreadsheet, make_adapter, 'Tx',
+                           shard_for=lambda key: key[:4])
+
+    merge(table, [{'Date': '2019-02-01', 'Amount': '5'}])
+    assert table.loaded == set(['2019'])
+    assert [method for method, _ in
+            spreadsheet.worksheet('Tx 2018').calls] == ['range']
+    assert spreadsheet.worksheet('Tx 2018').stats['cells_read'] == 2
+    assert spreadsheet.worksheet('Tx 2019').values[:2] == \
+        [['Date', 'Amount'], ['2019-02-01', '5']]
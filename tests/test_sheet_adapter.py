@@ -0,0 +1,202 @@
+import pickle
+
+import pytest
+
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.backend import PayloadTooLarge
+from sync_google_spreadsheet.ranges import cell_ranges
+from sync_google_spreadsheet.sheet_adapter import SheetAdapter
+from sync_google_spreadsheet.store import ColumnStore
+
+
+def make_sheet(**kwargs):
+    return FakeWorksheet([['Date', 'Amount', 'Note'],
+                          ['01/01/2018', '1', ''],
+                          ['01/02/2018', '2', '']], rows=5, **kwargs)
+
+
+def make_adapter(sheet, **kwargs):
+    return SheetAdapter(sheet, 1, lambda row: row['Date'],
+                        non_empty_column='Date', **kwargs)
+
+
+def calls(sheet, method):
+    return [detail for name, detail in sheet.calls if name == method]
+
+
+def test_cell_ranges():
+    assert cell_ranges([]) == []
+    assert cell_ranges([(1, 1), (1, 2), (2, 1), (2, 2), (4, 1)]) == \
+        [(1, 1, 2, 2), (4, 1, 4, 1)]
+    assert cell_ranges([(1, 1), (1, 3), (2, 3)]) == \
+        [(1, 1, 1, 1), (1, 3, 2, 3)]
+
+
+def test_sync_writes_only_changed_cells():
+    sheet = make_sheet()
+    adapter = make_adapter(sheet)
+    adapter.load()
+    assert adapter.next_empty_row == 3
+
+    adapter.update_row(1, {'Amount': '1'}, ['Amount'])
+    adapter.append({'Date': '01/03/2018', 'Amount': '3'})
+    adapter.append({'Date': '01/04/2018', 'Amount': '4'})
+    adapter.sync()
+
+    assert calls(sheet, 'batch_update') == [['A4:B5']]
+    assert sheet.values[4] == ['01/04/2018', '4', '']
+    adapter.sync()
+    assert len(calls(sheet, 'batch_update')) == 1
+
+
+def test_sync_batches_and_retries_failed_batch():
+    sheet = make_sheet()
+    adapter = make_adapter(sheet, max_batch_cells=4)
+    adapter.writer.retry_delay = 0
+    adapter.load()
+    adapter.update_row(1, {'Note': 'a'}, ['Note'])
+    adapter.update_row(2, {'Note': 'b'}, ['Note'])
+    adapter.append({'Date': '01/03/2018', 'Amount': '3'})
+    adapter.append({'Date': '01/04/2018', 'Amount': '4'})
+    sheet.fail_next(1)
+    adapter.sync()
+
+    assert calls(sheet, 'batch_update') == [['C2:C3', 'A4:B4'],
+                                            ['C2:C3', 'A4:B4'],
+                                            ['A5:B5']]
+    assert adapter.dirty == set()
+
+
+def test_failed_sync_keeps_unsent_cells():
+    sheet = make_sheet(max_payload_bytes=40)
+    adapter = make_adapter(sheet, max_batch_cells=2)
+    adapter.load()
+    adapter.update_row(1, {'Note': 'a'}, ['Note'])
+    adapter.append({'Date': 'x' * 50, 'Amount': '3'})
+    with pytest.raises(PayloadTooLarge):
+        adapter.sync()
+    assert adapter.dirty == set([(3, 0), (3, 1)])
+    # a request that is too big is not retried
+    assert calls(sheet, 'batch_update') == [['C2:C2'], ['A4:B4']]
+
+
+def test_non_empty_column_must_be_in_sheet():
+    with pytest.raises(Exception, match='Must specify non_empty_column'):
+        SheetAdapter(make_sheet(), 1, lambda row: row['Date'])
+    adapter = SheetAdapter(make_sheet(), 1, lambda row: row['Date'],
+                           non_empty_column='Day')
+    with pytest.raises(Exception, match='No column Day'):
+        adapter.load()
+
+
+def test_projected_load_fetches_other_columns_lazily():
+    sheet = make_sheet()
+    adapter = make_adapter(sheet, key_columns=['Date'])
+    adapter.load(columns=['Amount'])
+    # headers, the Date column to find the end, then Amount down to it
+    assert calls(sheet, 'range') == [(1, 1, 2, 3), (1, 1, 5, 1),
+                                     (1, 2, 3, 2)]
+    assert adapter.row_for_kvhash({'Date': '01/02/2018'}) == 2
+
+    assert adapter.row(2) == {'Date': '01/02/2018', 'Amount': '2',
+                              'Note': ''}
+    assert calls(sheet, 'range')[-1] == (1, 3, 3, 3)
+
+
+def test_cell_at_writes_through_store():
+    sheet = make_sheet()
+    adapter = make_adapter(sheet)
+    adapter.load()
+    cell = adapter.cell_at(2, 2)
+    assert (cell.row, cell.col, cell.value) == (3, 3, '')
+    cell.value = 'x'
+    assert adapter.row_as_dict(2)['Note'] == 'x'
+    adapter.sync()
+    assert calls(sheet, 'batch_update') == [['C3:C3']]
+
+
+def test_rows_for_colval_follows_updates():
+    sheet = make_sheet()
+    sheet.values[2][1] = '1'
+    adapter = make_adapter(sheet, index_columns=['Amount'])
+    adapter.load()
+    assert adapter.rows_for_colval('Amount', '1') == [1, 2]
+    assert adapter.row_for_colval('Amount', '1') == 1
+
+    adapter.update_row(1, {'Amount': '5'}, ['Amount'])
+    adapter.append({'Date': '01/03/2018', 'Amount': '1'})
+    assert adapter.rows_for_colval('Amount', '1') == [2, 3]
+    assert adapter.rows_for_colval('Amount', '5') == [1]
+    assert adapter.rows_for_colval('Amount', '2') == []
+
+
+def test_update_row_drops_unchanged_writes():
+    sheet = make_sheet()
+    adapter = make_adapter(sheet)
+    adapter.load()
+    adapter.update_row(1, {'Amount': 1.0, 'Note': None}, ['Amount', 'Note'])
+    adapter.update_row(2, {'Amount': 2, 'Note': 'x'}, ['Amount', 'Note'])
+    assert adapter.skipped_writes == 3
+    assert adapter.dirty == set([(2, 2)])
+
+    assert adapter.changed_columns(2, {'Amount': '2', 'Note': 'x'},
+                                   ['Amount', 'Note']) == []
+    adapter.sync()
+    adapter.update_row(2, {'Amount': '2', 'Note': 'x'}, ['Amount', 'Note'])
+    adapter.sync()
+    assert calls(sheet, 'batch_update') == [['C3:C3']]
+
+    with pytest.raises(KeyError):
+        adapter.update_row(2, {'Amount': '3'}, ['Amount', 'Note'])
+    assert adapter.skipped_writes == 5
+
+
+def test_store_differs_by_normalized_codes():
+    store = ColumnStore(2, 2)
+    store.load_column(0, ['5', ''])
+    store.load_column(1, [1.0, 'a'])
+    assert store.differs(0, [0, 1], [5.0, '1']) == [False, False]
+    assert store.differs(1, [0, 1], [None, 'b']) == [False, True]
+    store = pickle.loads(pickle.dumps(store))
+    assert store.signature(0, [0, 1]) == [store.normal_codes[u'5'],
+                                          store.normal_codes[u'1']]
+    assert store.differs(0, [1], [1]) == [False]
+
+
+def test_append_grows_full_sheet():
+    sheet = FakeWorksheet([['Date', 'Amount', 'Note'],
+                           ['01/01/2018', '1', ''],
+                           ['01/02/2018', '2', '']])
+    adapter = make_adapter(sheet, min_growth=2)
+    adapter.load()
+    assert adapter.next_empty_row == 3
+    adapter.changed_columns(1, {'Amount': '1'}, ['Amount'])
+
+    for day in range(3, 7):
+        adapter.append({'Date': '01/%02d/2018' % day, 'Amount': str(day)})
+    # 3 rows doubled to 6, then to 12
+    assert calls(sheet, 'add_rows') == [3, 6]
+    assert adapter.rows == sheet.row_count == 12
+    assert adapter.row_for_key['01/06/2018'] == 6
+    assert adapter.changed_columns(6, {'Amount': '6'}, ['Amount']) == []
+    adapter.update_row(6, {'Amount': '7'}, ['Amount'])
+    adapter.sync()
+    assert sheet.values[5] == ['01/05/2018', '5', '']
+    assert sheet.values[6] == ['01/06/2018', '7', '']
+
+
+def test_load_skips_blank_tail():
+    sheet = FakeWorksheet([['Date', 'Amount', 'Note']] +
+                          [['01/%02d/2018' % day, str(day), '']
+                           for day in range(1, 6)], rows=1000)
+    adapter = make_adapter(sheet, probe_rows=2)
+    adapter.load()
+    # the Date column in blocks of 2, 4 then 8 rows, the rest down to row 6
+    assert calls(sheet, 'range') == [(1, 1, 2, 3), (1, 1, 2, 1),
+                                     (3, 1, 6, 1), (7, 1, 14, 1),
+                                     (1, 2, 6, 3)]
+    assert adapter.next_empty_row == 6
+    assert adapter.row(999) == {'Date': '', 'Amount': '', 'Note': ''}
+    adapter.append({'Date': '01/06/2018', 'Amount': '6'})
+    adapter.sync()
+    assert sheet.values[6] == ['01/06/2018', '6', '']
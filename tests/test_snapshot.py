@@ -0,0 +1,89 @@
+from sync_google_spreadsheet.backend import FakeWorksheet
+from sync_google_spreadsheet.sheet_adapter import SheetAdapter
+from sync_google_spreadsheet.snapshot import SnapshotCache
+from sync_google_spreadsheet.snapshot import sheet_revision
+
+
+def make_sheet(**kwargs):
+    return FakeWorksheet([['Date', 'Amount', 'Note'],
+                          ['01/01/2018', '1', ''],
+                          ['01/02/2018', '2', '']], rows=5, **kwargs)
+
+
+def make_adapter(sheet, **kwargs):
+    return SheetAdapter(sheet, 1, lambda row: row['Date'],
+                        non_empty_column='Date', **kwargs)
+
+
+def calls(sheet, method):
+    return [detail for name, detail in sheet.calls if name == method]
+
+
+def test_snapshot_skips_unchanged_and_refreshes_changed_rows(tmpdir):
+    sheet = make_sheet()
+    snapshot = SnapshotCache(str(tmpdir.join('sheet.snap')))
+
+    first = make_adapter(sheet, key_columns=['Date'], snapshot=snapshot)
+    first.load()
+
+    sheet.calls = []
+    second = make_adapter(sheet, key_columns=['Date'], snapshot=snapshot)
+    second.load()
+    assert calls(sheet, 'range') == []
+
+    # after our own sync the snapshot is current
+    second.append({'Date': '01/03/2018', 'Amount': '3'})
+    second.sync()
+    sheet.calls = []
+    third = make_adapter(sheet, key_columns=['Date'], snapshot=snapshot)
+    third.load()
+    assert calls(sheet, 'range') == []
+    assert third.row_for_kvhash({'Date': '01/03/2018'}) == 3
+
+    # someone else appends a row: only the new row is fetched
+    sheet.batch_update([{'range': 'A5:C5',
+                         'values': [['01/04/2018', '4', 'x']]}])
+    sheet.calls = []
+    fourth = make_adapter(sheet, key_columns=['Date'], snapshot=snapshot)
+    fourth.load()
+    assert calls(sheet, 'range') == [(1, 1, 2, 3), (1, 1, 5, 1),
+                                     (5, 2, 5, 3)]
+    assert fourth.row_for_kvhash({'Date': '01/04/2018'}) == 4
+    assert fourth.row(4) == {'Date': '01/04/2018', 'Amount': '4',
+                             'Note': 'x'}
+
+    # and changes a date: rows are fetched from there down
+    sheet.batch_update([{'range': 'A3:B3',
+                         'values': [['01/05/2018', '5']]}])
+    sheet.calls = []
+    fifth = make_adapter(sheet, key_columns=['Date'], snapshot=snapshot)
+    fifth.load()
+    assert calls(sheet, 'range') == [(1, 1, 2, 3), (1, 1, 5, 1),
+                                     (3, 2, 5, 3)]
+    assert fifth.row_for_kvhash({'Date': '01/05/2018'}) == 2
+    assert fifth.row(2)['Amount'] == '5'
+    assert not fifth.has({'Date': '01/02/2018'})
+
+
+def test_snapshot_without_revision_is_logged(tmpdir, caplog):
+    sheet = make_sheet()
+    sheet.revision = None
+    snapshot = SnapshotCache(str(tmpdir.join('sheet.snap')))
+    make_adapter(sheet, snapshot=snapshot).load()
+    assert 'no revision' in caplog.text
+    assert snapshot.read() is None
+
+
+def test_sheet_revision_rereads_gspread_modified_time():
+    class Spreadsheet(object):
+        def __init__(self):
+            self._properties = {'modifiedTime': 'when opened'}
+
+        @property
+        def lastUpdateTime(self):
+            return self._properties.setdefault('modifiedTime', 'now')
+
+    class Worksheet(object):
+        spreadsheet = Spreadsheet()
+
+    assert sheet_revision(Worksheet()) == 'now'
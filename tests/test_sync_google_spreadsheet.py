@@ -1,12 +1,40 @@
 
+import click
 from click.testing import CliRunner
 
+from sync_google_spreadsheet.cli import JobGroup
 from sync_google_spreadsheet.cli import main
 
 
+@click.command()
+@click.argument('names', nargs=-1)
+def echo(names):
+    click.echo(repr(names))
+
+
 def test_main():
     runner = CliRunner()
-    result = runner.invoke(main, [])
+    result = runner.invoke(main, ['--help'])
+
+    assert 'jobs' in result.output
+    assert result.exit_code == 0
+
+
+def test_jobs_load_lazily():
+    cli = JobGroup(jobs={'echo': 'test_sync_google_spreadsheet:echo',
+                         'broken': 'no_such_module:main'})
+    runner = CliRunner()
 
-    assert result.output == '()\n'
+    # help lists jobs without importing them
+    result = runner.invoke(cli, ['--help'])
     assert result.exit_code == 0
+    assert 'no_such_module:main' in result.output
+    assert 'broken' not in cli.commands
+
+    result = runner.invoke(cli, ['echo', 'a', 'b'])
+    assert result.output == "('a', 'b')\n"
+    assert result.exit_code == 0
+
+    result = runner.invoke(cli, ['broken'])
+    assert result.exit_code != 0
+    assert "Can't load job broken" in result.output
@@ -0,0 +1,47 @@
+import datetime
+
+from sync_google_spreadsheet.watermark import Watermark
+from sync_google_spreadsheet.watermark import WatermarkFile
+from sync_google_spreadsheet.watermark import dump_datetime
+from sync_google_spreadsheet.watermark import load_datetime
+
+
+def day(n):
+    return datetime.datetime(2018, 1, n)
+
+
+def make_mark(state, inclusive=False):
+    return Watermark(state, 'Checking', 'schwab', key=lambda row: row[0],
+                     dump=dump_datetime, load=load_datetime,
+                     inclusive=inclusive)
+
+
+def test_watermark_skips_synced_input(tmpdir):
+    state = WatermarkFile(str(tmpdir.join('state.json')))
+    mark = make_mark(state)
+    assert list(mark.skip([(day(2), 'a'), (day(1), 'b')])) == \
+        [(day(2), 'a'), (day(1), 'b')]
+    # not synced: nothing stored
+    assert make_mark(state).value is None
+    mark.commit()
+    assert state.read() == {'Checking': {'schwab': '2018-01-02T00:00:00.000000'}}
+
+    rows = [(day(1), 'b'), (day(2), 'c'), (day(3), 'd')]
+    assert list(make_mark(state).skip(rows)) == rows[1:]
+    assert list(make_mark(state, inclusive=True).skip(rows)) == rows[2:]
+
+    state.set('Checking', 'chase', 1)
+    mark = make_mark(state)
+    list(mark.skip(rows))
+    mark.commit()
+    assert state.read()['Checking'] == {
+        'schwab': '2018-01-03T00:00:00.000000', 'chase': 1}
+
+
+def test_watermark_advance(tmpdir):
+    state = WatermarkFile(str(tmpdir.join('state.json')))
+    mark = make_mark(state)
+    mark.advance(day(3))
+    mark.advance(day(2))
+    mark.commit()
+    assert make_mark(state).value == day(3)